@@ -1,53 +1,83 @@
-from nearai.agents.environment import Environment
 import json
-import requests
 import time
 from datetime import datetime, timedelta
 import hashlib
-from typing import List, Dict, Any
-import re
+import itertools
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from urllib.parse import quote
 import os
+import threading
+try:
+    from nearai.agents.environment import Environment
+except ImportError:
+    # Outside the NEAR AI runtime (e.g. pipeline_bench.py) the functions are imported directly
+    Environment = Any
+
+from article import Article
+from minhash_grouping import cluster_articles, grouping_config_from_env
+from concurrency import concurrency_config_from_env, get_rate_limiter, process_concurrently
+from llm_cache import completion_cache_key, get_llm_cache, llm_cache_config_from_env
+from seen_index import SeenIndex, open_seen_index, seen_index_config_from_env
+from daemon import PipelineDaemon, daemon_config_from_env
+from outbox import get_outbox, outbox_config_from_env
+from vector_index import open_vector_index, vector_index_config_from_env
+from feeds import (
+    DEFAULT_FEED, ArticleDeduper, due_feeds, fan_out, feed_interval, feeds_config_from_env, parse_feeds, record_poll
+)
+from event_store import event_key, event_store_config_from_env, get_event_store
+from prompt_packing import (
+    chunk_bodies, count_tokens, pack_bodies, packing_totals, prompt_budget_config_from_env, record_packing
+)
+from map_reduce import map_reduce_config_from_env, map_reduce_stats, merge_analyses, record_latency
+from structured_output import (
+    parse_and_validate, parse_stats, reask_messages, record_parse, validate_analysis, validate_groups
+)
+import fast_json
+import http_client
+import tracing
 
 def run(env: Environment):
-    """Run the NEAR AI agent."""
+    """Run the NEAR AI agent, traced as one "agent.run" span when tracing is enabled."""
+    tracing.configure(tracing.tracing_config_from_env(env.env_vars))
+    try:
+        with tracing.span("agent.run"):
+            run_once(env)
+    finally:
+        tracing.flush()
+
+def run_once(env: Environment):
+    """Fetch, group, analyze and deliver the new articles once."""
     env.add_system_log("Starting NEAR AI agent")
+    http_client.configure(http_client.http_config_from_env(env.env_vars))
     
     # Get API key from environment variables
     api_key = env.env_vars.get("EVENT_REGISTRY_API_KEY", "b379ca7a-9d5c-45ab-8f5a-e561c7f06597")
     
-    # Fetch and process articles
-    articles, pre_grouped, remaining = fetch_articles(env, api_key)
-    
-    # Debug log the number of articles
-    env.add_system_log(f"Processing {len(articles)} articles, with {len(pre_grouped)} pre-grouped sets")
-    
-    if not articles:
-        env.add_reply("No new articles found.")
-        env.request_user_input()
-        return
-    
-    # Load already processed articles
-    processed_file_path = "processed_articles.json"
-    
-    # Load already processed articles from the file
-    try:
-        already_processed_content = env.read_file(processed_file_path)
-        already_processed = json.loads(already_processed_content)
-    except:
-        env.add_system_log("No processed articles file found, creating a new one")
-        already_processed = []
-    
+    # Load the index of already processed article URIs
+    already_processed = load_processed_index(env)
     env.add_system_log(f"Found {len(already_processed)} already processed articles")
     
-    # Filter out articles already processed
-    new_articles = []
-    for article in articles:
-        if article.get("uri") not in already_processed:
-            new_articles.append(article)
+    # Articles of earlier runs that did not form a group yet are grouped again with the new ones
+    pending, pending_since = load_pending_articles(env)
+    pending = [article for article in pending if article.uri not in already_processed]
+    pending_uris = {article.uri for article in pending}
+    env.add_system_log(f"Carrying over {len(pending)} ungrouped articles from earlier runs")
+    
+    # Stream the articles of every due feed from the API, dropping already processed ones as they arrive
+    cursor = load_stream_cursor(env)
+    new_stream = itertools.chain(pending, iter_feed_articles(
+        env, api_key, cursor, lambda uri: uri in already_processed or uri in pending_uris
+    ))
+    with tracing.span("fetch_articles"):
+        new_articles, pre_grouped, remaining = split_event_groups(env, new_stream)
+        tracing.set_attributes(articles=len(new_articles), pre_grouped=len(pre_grouped))
     
-    env.add_system_log(f"Found {len(new_articles)} new articles")
+    env.add_system_log(f"Found {len(new_articles)} new articles, with {len(pre_grouped)} pre-grouped sets")
     
     if not new_articles:
+        save_pending_articles(env, [], {})
+        save_stream_cursor(env, cursor)
+        deliver_outbox(env)
         env.add_reply("No new articles to process.")
         env.request_user_input()
         return
@@ -56,33 +86,57 @@ def run(env: Environment):
     article_groups = group_similar_articles(env, new_articles, pre_grouped)
     env.add_system_log(f"Grouped articles into {len(article_groups)} groups")
     
-    # Process each group
+    # Process the groups with at least 2 sources, or new articles of known events, concurrently
+    eligible_groups = [group for group in article_groups if is_eligible_group(env, group)]
+    concurrency_config = concurrency_config_from_env(env.env_vars)
+    env.add_system_log(
+        f"Processing {len(eligible_groups)} groups with {concurrency_config['max_workers']} "
+        f"{concurrency_config['mode']} workers"
+    )
+    
+    start_time = time.monotonic()
+    outcomes = process_concurrently(
+        lambda group: process_article_group(env, group), eligible_groups, concurrency_config
+    )
+    wall_time = time.monotonic() - start_time
+    
     results = []
-    for group in article_groups:
-        if len(group) >= 2:  # Only process groups with at least 2 sources
-            env.add_system_log(f"Processing group with {len(group)} articles")
-            
-            # Process the article group
-            result = process_article_group(env, group)
-            results.append(result)
-            
-            # Add processed article IDs
-            for article in group:
-                if article.get("uri") not in already_processed:
-                    already_processed.append(article.get("uri"))
+    for i, (group, outcome) in enumerate(zip(eligible_groups, outcomes)):
+        if not outcome["ok"]:
+            # Leave the URIs unprocessed and rewind the stream cursor so the group is retried on the next run
+            env.add_system_log(f"Group {i+1} ({len(group)} articles) failed after {outcome['latency']:.2f}s: {outcome['error']}")
+            rewind_stream_cursor(cursor, group)
+            continue
+        
+        env.add_system_log(f"Group {i+1} ({len(group)} articles) processed in {outcome['latency']:.2f}s")
+        if outcome["result"] is not None:
+            results.append(outcome["result"])
+        
+        # Add processed article IDs
+        already_processed.update(article.uri for article in group)
     
-    # Save processed article IDs
-    # Only keep the last 1000 processed articles to avoid the file growing too large
-    if len(already_processed) > 1000:
-        already_processed = already_processed[-1000:]
+    sequential_time = sum(outcome["latency"] for outcome in outcomes)
+    env.add_system_log(
+        f"Processed {len(results)}/{len(eligible_groups)} groups in {wall_time:.2f}s "
+        f"(sequential estimate {sequential_time:.2f}s)"
+    )
+    for model, kinds in parse_stats().items():
+        env.add_system_log(f"Structured output from {model}: {kinds}")
+    
+    # Put the results in the outbox before their article IDs are appended to the index log,
+    # then keep the ungrouped articles and move the stream cursor on
+    if results:
+        queue_results(env, results)
+    already_processed.flush()
+    pending = carry_over_articles(env, new_articles, eligible_groups, pending_since)
+    env.add_system_log(f"Keeping {len(pending)} ungrouped articles for the next run")
+    save_pending_articles(env, pending, pending_since)
+    save_stream_cursor(env, cursor)
     
-    env.write_file(processed_file_path, json.dumps(already_processed))
+    # Send everything in the outbox to the API, including batches left over from earlier runs
+    deliver_outbox(env)
     
-    # Send the results to the API
     if results:
-        env.add_system_log(f"Sending {len(results)} results to API")
-        send_to_api(env, results)
-        
         # Provide a summary to the user
         env.add_reply(f"Processed {len(results)} article groups with similar content.")
         for i, result in enumerate(results):
@@ -95,9 +149,212 @@ def run(env: Environment):
     else:
         env.add_reply("No article groups with multiple sources were found. Try adjusting the search criteria or checking back later.")
     
+    cache = get_llm_cache(llm_cache_config_from_env(env.env_vars))
+    if cache:
+        env.add_system_log(f"LLM cache stats: {cache.stats()}")
+    event_store = get_event_store(event_store_config_from_env(env.env_vars))
+    if event_store:
+        env.add_system_log(f"Event store stats: {event_store.stats()}")
+    log_packing_totals(env)
+    log_map_reduce_stats(env)
+    env.add_system_log(f"HTTP latency by endpoint: {http_client.latency_stats()}")
+    
     env.add_system_log("NEAR AI agent finished successfully")
     env.request_user_input()
 
+def run_daemon(env: Environment):
+    """Run the agent as a long-lived service that polls on an interval with warm state."""
+    env.add_system_log("Starting NEAR AI agent in daemon mode")
+    tracing.configure(tracing.tracing_config_from_env(env.env_vars))
+    http_client.configure(http_client.http_config_from_env(env.env_vars))
+    
+    api_key = env.env_vars.get("EVENT_REGISTRY_API_KEY", "b379ca7a-9d5c-45ab-8f5a-e561c7f06597")
+    config = daemon_config_from_env(env.env_vars)
+    
+    # State that stays warm across cycles
+    already_processed = load_processed_index(env)
+    cursor = load_stream_cursor(env)
+    pending, pending_since = load_pending_articles(env)
+    in_flight = set()
+    failed_groups = []
+    cycle_cursors = {}
+    cycle_pending = {}
+    state_lock = threading.Lock()
+    
+    def group_uris(group):
+        return [article.uri for article in group]
+    
+    def fetch(cycle):
+        # Retry outbox batches whose earlier delivery failed
+        deliver_outbox(env)
+        
+        with state_lock:
+            # Re-fetch the articles of groups that failed since the last cycle
+            for group in failed_groups:
+                rewind_stream_cursor(cursor, group)
+            failed_groups.clear()
+            skip = set(in_flight)
+            carried = [article for article in pending if article.uri not in already_processed and article.uri not in skip]
+            skip.update(article.uri for article in carried)
+        
+        new_stream = itertools.chain(carried, iter_feed_articles(
+            env, api_key, cursor, lambda uri: uri in already_processed or uri in skip
+        ))
+        with tracing.span("fetch_articles", cycle=cycle):
+            new_articles, pre_grouped, _ = split_event_groups(env, new_stream)
+            tracing.set_attributes(articles=len(new_articles), pre_grouped=len(pre_grouped))
+        groups = [group for group in group_similar_articles(env, new_articles, pre_grouped) if is_eligible_group(env, group)]
+        
+        with state_lock:
+            for group in groups:
+                in_flight.update(group_uris(group))
+            cycle_cursors[cycle] = {name: dict(state) for name, state in cursor.items()}
+            pending[:] = carry_over_articles(env, new_articles, groups, pending_since)
+            cycle_pending[cycle] = (list(pending), dict(pending_since))
+        return groups
+    
+    def deliver(pairs):
+        # Unchanged events have no result to deliver, but their articles are still processed
+        results = [result for _, result in pairs if result is not None]
+        if results:
+            queue_results(env, results)
+        with state_lock:
+            for group, _ in pairs:
+                already_processed.update(group_uris(group))
+                in_flight.difference_update(group_uris(group))
+            # The index stays loaded for the daemon's lifetime, so its TTL is applied here
+            already_processed.expire()
+            already_processed.flush()
+        deliver_outbox(env)
+        # Each cycle's spans are written once its results are delivered
+        tracing.flush()
+    
+    def on_failure(group, error):
+        with state_lock:
+            in_flight.difference_update(group_uris(group))
+            failed_groups.append(group)
+            # Cursors of unfinished cycles must not be saved past the failed articles
+            for pending_cursor in cycle_cursors.values():
+                rewind_stream_cursor(pending_cursor, group)
+    
+    def on_cycle_complete(cycle):
+        with state_lock:
+            completed_cursor = cycle_cursors.pop(cycle, None)
+            completed_pending = cycle_pending.pop(cycle, None)
+        if completed_pending:
+            save_pending_articles(env, *completed_pending)
+        if completed_cursor:
+            save_stream_cursor(env, completed_cursor)
+    
+    daemon = PipelineDaemon(
+        config,
+        fetch_fn=fetch,
+        analyze_fn=lambda group: process_article_group(env, group),
+        deliver_fn=deliver,
+        on_failure=on_failure,
+        on_cycle_complete=on_cycle_complete,
+        log=env.add_system_log,
+    )
+    try:
+        daemon.run_forever()
+    finally:
+        tracing.flush()
+    event_store = get_event_store(event_store_config_from_env(env.env_vars))
+    if event_store:
+        env.add_system_log(f"Event store stats: {event_store.stats()}")
+    log_packing_totals(env)
+    log_map_reduce_stats(env)
+    env.add_system_log(f"HTTP latency by endpoint: {http_client.latency_stats()}")
+    env.add_system_log("NEAR AI agent daemon stopped")
+
+def log_packing_totals(env: Environment):
+    """Log the prompt tokens saved by packing over every group this process analyzed."""
+    totals = packing_totals()
+    if totals["groups"]:
+        saved = totals["tokens_saved"] / totals["tokens_full"] if totals["tokens_full"] else 0.0
+        env.add_system_log(f"Prompt packing totals: {totals} ({saved:.1%} of the tokens saved)")
+
+def log_map_reduce_stats(env: Environment):
+    """Log the map, chunk and reduce latencies of the groups that were analyzed in chunks."""
+    stats = map_reduce_stats()
+    if any(stage["count"] for stage in stats.values()):
+        env.add_system_log(f"Map-reduce latency by stage: {stats}")
+
+def load_processed_index(env: Environment) -> SeenIndex:
+    """Open the processed-article index, importing the legacy processed_articles.json once."""
+    index = open_seen_index(seen_index_config_from_env(env.env_vars))
+    if len(index) == 0 and not os.path.exists(index.path):
+        try:
+            legacy = json.loads(env.read_file("processed_articles.json"))
+            index.update(legacy)
+            index.flush()
+            env.add_system_log(f"Imported {len(legacy)} URIs from processed_articles.json")
+        except:
+            env.add_system_log("No processed articles file found, creating a new one")
+    return index
+
+# Prompt key -> key of the cached entry that answered it with a near hit, so that an unusable
+# response is invalidated at the entry it came from. Oldest keys are dropped past the bound.
+near_hit_keys: Dict[str, str] = {}
+near_hit_keys_lock = threading.Lock()
+MAX_NEAR_HIT_KEYS = 1000
+
+def llm_completion(env: Environment, messages: List[Dict], cache_uris: List[str] = None) -> str:
+    """
+    Call the LLM through the response cache, waiting on the provider's shared rate limiter
+    before any real completion.
+    
+    `cache_uris` tags the cached response with the article URIs it was generated from, which
+    enables near-hit reuse for groups that only gained a few articles.
+    """
+    cache = get_llm_cache(llm_cache_config_from_env(env.env_vars))
+    cache_key = None
+    if cache:
+        model = env.env_vars.get("LLM_MODEL", "llama-v3p1-70b-instruct")
+        temperature = float(env.env_vars.get("LLM_TEMPERATURE", 0.3))
+        cache_key = completion_cache_key(model, temperature, messages)
+        cached = cache.lookup(cache_key, cache_uris)
+        if cached is not None:
+            matched_key, response = cached
+            with near_hit_keys_lock:
+                near_hit_keys.pop(cache_key, None)
+                if matched_key != cache_key:
+                    near_hit_keys[cache_key] = matched_key
+                    if len(near_hit_keys) > MAX_NEAR_HIT_KEYS:
+                        del near_hit_keys[next(iter(near_hit_keys))]
+            env.add_system_log("LLM cache hit")
+            tracing.increment("llm.cache_hits")
+            return response
+    
+    config = concurrency_config_from_env(env.env_vars)
+    provider = env.env_vars.get("LLM_PROVIDER", "fireworks")
+    limiter = get_rate_limiter(provider, config["rate_limit_per_min"], config["burst"])
+    tracing.increment("llm.calls")
+    prompt_chars = sum(len(message.get("content", "")) for message in messages)
+    with tracing.span("llm.completion", provider=provider, prompt_chars=prompt_chars) as span:
+        if limiter:
+            limiter.acquire()
+        result = env.completion(messages)
+        if span is not None:
+            span.attributes["response_chars"] = len(result or "")
+    
+    if cache and result:
+        with near_hit_keys_lock:
+            near_hit_keys.pop(cache_key, None)
+        cache.put(cache_key, result, cache_uris)
+    return result
+
+def invalidate_llm_completion(env: Environment, messages: List[Dict]):
+    """Remove a cached completion whose response could not be used."""
+    cache = get_llm_cache(llm_cache_config_from_env(env.env_vars))
+    if cache:
+        model = env.env_vars.get("LLM_MODEL", "llama-v3p1-70b-instruct")
+        temperature = float(env.env_vars.get("LLM_TEMPERATURE", 0.3))
+        cache_key = completion_cache_key(model, temperature, messages)
+        with near_hit_keys_lock:
+            matched_key = near_hit_keys.pop(cache_key, None)
+        cache.invalidate(matched_key or cache_key)
+
 def load_cache(env: Environment) -> Dict:
     """Load the cache from a file or initialize a new one."""
     try:
@@ -111,32 +368,28 @@ def save_cache(env: Environment, cache: Dict):
     """Save the cache to a file."""
     env.write_file("cache.json", json.dumps(cache, indent=2))
 
-def cache_article(article: Dict, cache: Dict):
+def cache_article(article: Article, cache: Dict):
     """Add an article to the cache with a unique identifier."""
-    article_id = article.get("uri", "")
+    article_id = article.uri
     if not article_id:
         # Generate a unique ID based on title and content
-        title = article.get("title", "")
-        content = article.get("body", "")
-        article_id = hashlib.md5((title + content).encode()).hexdigest()
+        article_id = hashlib.md5((article.title + article.body).encode()).hexdigest()
     
     cache["articles"][article_id] = {
-        "title": article.get("title", ""),
+        "title": article.title,
         "date_processed": datetime.utcnow().isoformat(),
-        "summary": article.get("summary", "")
+        "summary": ""
     }
 
-def filter_new_articles(articles: List[Dict], cache: Dict) -> List[Dict]:
+def filter_new_articles(articles: List[Article], cache: Dict) -> List[Article]:
     """Filter out articles that have already been processed."""
     new_articles = []
     
     for article in articles:
-        article_id = article.get("uri", "")
+        article_id = article.uri
         if not article_id:
             # Generate a unique ID based on title and content
-            title = article.get("title", "")
-            content = article.get("body", "")
-            article_id = hashlib.md5((title + content).encode()).hexdigest()
+            article_id = hashlib.md5((article.title + article.body).encode()).hexdigest()
         
         # Check if the article is in the cache
         if article_id not in cache["articles"]:
@@ -144,92 +397,299 @@ def filter_new_articles(articles: List[Dict], cache: Dict) -> List[Dict]:
     
     return new_articles
 
-def fetch_articles(env: Environment, api_key: str) -> List[Dict]:
-    """Fetch articles from the EventRegistry API."""
-    env.add_system_log("Fetching articles from EventRegistry API")
-    
-    url = (
-        "https://eventregistry.org/api/v1/minuteStreamArticles"
-        "?query=%7B%22%24query%22%3A%7B%22%24and%22%3A%5B%7B%22%24or%22%3A%5B%7B%22categoryUri%22%3A%22dmoz%2FBusiness%22%7D%2C%7B%22categoryUri%22%3A%22dmoz%2FSociety%2FGovernment%22%7D%2C%7B%22categoryUri%22%3A%22dmoz%2FComputers%22%7D%5D%7D%2C%7B%22locationUri%22%3A%22http%3A%2F%2Fen.wikipedia.org%2Fwiki%2FUnited_States%22%7D%2C%7B%22lang%22%3A%22eng%22%7D%5D%7D%2C%22%24filter%22%3A%7B%22startSourceRankPercentile%22%3A0%2C%22endSourceRankPercentile%22%3A10%7D%7D"
-        f"&recentActivityArticlesUpdatesAfterMinsAgo=9000"  # Look back further to get more articles
-        f"&apiKey={api_key}"
-        "&callback=JSON_CALLBACK"
-    )
+def load_stream_cursor(env: Environment) -> Dict:
+    """
+    Load the stream cursors and scheduling state of every feed saved by the previous run.
     
+    A cursor saved before feeds existed becomes the cursor of the default feed.
+    """
+    try:
+        cursor = json.loads(env.read_file("stream_cursor.json"))
+    except:
+        return {}
+    if "updated_after" in cursor:
+        return {DEFAULT_FEED["name"]: cursor}
+    return cursor
+
+def save_stream_cursor(env: Environment, cursor: Dict):
+    """Persist the feed cursors for the next run."""
+    env.write_file("stream_cursor.json", json.dumps(cursor))
+
+def rewind_stream_cursor(cursor: Dict, articles: List[Article]):
+    """Move the cursors of their feeds back so that `articles` are fetched again on the next run."""
+    oldest_by_feed = {}
+    for article in articles:
+        if article.date_time and article.feed in cursor:
+            oldest_by_feed[article.feed] = min(oldest_by_feed.get(article.feed, article.date_time), article.date_time)
+    for feed_name, oldest in oldest_by_feed.items():
+        feed_cursor = cursor[feed_name]
+        if oldest <= feed_cursor.get("updated_after", oldest):
+            # The time filter is exclusive, so step back one second
+            moved = datetime.strptime(oldest[:19], "%Y-%m-%dT%H:%M:%S") - timedelta(seconds=1)
+            feed_cursor["updated_after"] = moved.strftime("%Y-%m-%dT%H:%M:%SZ")
+            # Poll the feed on the next run even if its interval has not passed
+            feed_cursor.pop("last_polled", None)
+
+def load_pending_articles(env: Environment) -> Tuple[List[Article], Dict[str, float]]:
+    """Load the articles carried over by earlier runs, with the time each was first carried over."""
+    try:
+        saved = json.loads(env.read_file("pending_articles.json"))
+        return [Article.from_dict(record) for record in saved["articles"]], saved["since"]
+    except:
+        return [], {}
+
+def save_pending_articles(env: Environment, articles: List[Article], since: Dict[str, float]):
+    """Persist the carried-over articles next to the stream cursor."""
+    env.write_file("pending_articles.json", fast_json.dumps_text({
+        "articles": [article.to_dict() for article in articles],
+        "since": {article.uri: since[article.uri] for article in articles},
+    }))
+
+def carry_over_articles(env: Environment, articles: List[Article], groups: List[List[Article]],
+                        since: Dict[str, float]) -> List[Article]:
+    """
+    The articles to fetch again on the next run: those that are not part of any analyzed group.
+    
+    The stream cursor moves past every article it saw, so a story whose sources arrive one per
+    poll would otherwise never form a group. Articles stay pending for PENDING_MAX_AGE_MINUTES
+    (the look-back window by default), and only the PENDING_MAX_ARTICLES most recently carried
+    ones are kept. `since` maps uris to when they were first carried over and is updated in place.
+    """
+    max_age = 60 * float(env.env_vars.get("PENDING_MAX_AGE_MINUTES", env.env_vars.get("STREAM_LOOKBACK_MINUTES", 9000)))
+    max_articles = int(env.env_vars.get("PENDING_MAX_ARTICLES", 2000))
+    now = time.time()
+    grouped = {article.uri for group in groups for article in group}
+    pending = []
+    for article in articles:
+        if article.uri not in grouped and now - since.setdefault(article.uri, now) <= max_age:
+            pending.append(article)
+    pending.sort(key=lambda article: since[article.uri], reverse=True)
+    del pending[max(max_articles, 0):]
+    kept = {article.uri for article in pending}
+    for uri in [uri for uri in since if uri not in kept]:
+        del since[uri]
+    return pending
+
+def load_feeds(env: Environment) -> List[Dict[str, Any]]:
+    """The declared feeds, from the FEEDS env var or the feeds file, else the default feed."""
+    text = env.env_vars.get("FEEDS")
+    if not text:
+        try:
+            text = env.read_file(feeds_config_from_env(env.env_vars)["path"])
+        except:
+            text = None
+    if not text:
+        return [dict(DEFAULT_FEED)]
+    try:
+        return parse_feeds(text)
+    except ValueError as e:
+        env.add_system_log(f"Invalid feed declarations: {e}")
+        raise
+
+def iter_feed_articles(env: Environment, api_key: str, cursor: Dict, is_known=None) -> Iterator[Article]:
+    """
+    Yield the new articles of every due feed, fetched concurrently, each article once.
+    
+    `cursor` maps feed names to their stream cursor and scheduling state and is updated in
+    place; `is_known(uri)` filters out articles that were already processed. A feed's yield is
+    the number of articles it delivered that passed both filters and no other feed delivered
+    first.
+    """
+    config = feeds_config_from_env(env.env_vars)
+    feeds = load_feeds(env)
+    now = time.time()
+    due = due_feeds(feeds, cursor, config, now)
+    env.add_system_log(f"Polling {len(due)} of {len(feeds)} feeds: {', '.join(feed['name'] for feed in due)}")
+    for feed in due:
+        cursor.setdefault(feed["name"], {})
+    
+    deduper = ArticleDeduper()
+    new_counts = {feed["name"]: 0 for feed in due}
+    completed = []
+    
+    def fetch(feed):
+        with tracing.span("fetch_feed", kind=tracing.KIND_CLIENT, feed=feed["name"]):
+            yield from iter_articles(env, api_key, cursor[feed["name"]], feed)
+    
+    def on_done(feed, error):
+        if error is not None:
+            env.add_system_log(f"Feed {feed['name']} failed: {error}")
+        else:
+            completed.append(feed)
+    
+    for feed, article in fan_out(due, fetch, config["max_workers"], config["queue_size"], on_done):
+        if is_known and is_known(article.uri):
+            continue
+        if not deduper.add(article):
+            continue
+        new_counts[feed["name"]] += 1
+        yield article
+    
+    for feed in completed:
+        state = cursor[feed["name"]]
+        record_poll(state, new_counts[feed["name"]], config, now)
+        state["interval"] = round(feed_interval(feed, state, config), 1)
+    env.add_system_log(
+        f"New articles by feed: {new_counts}; {deduper.repeated} delivered by several feeds, "
+        f"{deduper.copies} re-published copies dropped"
+    )
+
+def fetch_stream_page(env: Environment, url: str) -> Dict:
+    """Request one page of the minute stream and decode the JSONP response."""
     env.add_system_log(f"Making request to URL: {url}")
     
     try:
-        response = requests.get(url)
+        response = http_client.get(url)
         env.add_system_log(f"API Response status code: {response.status_code}")
         
+        # Work on the raw bytes: every `response.text` access decodes a copy of the whole body
+        body = response.content
+        tracing.increment("http.response_bytes", len(body))
+        
         # Log the first part of the response for debugging
-        response_preview = response.text[:200]
+        response_preview = body[:200].decode("utf-8", errors="replace")
         env.add_system_log(f"Response preview: {response_preview}")
         
-        # Extract JSON from the callback wrapper
-        json_str = response.text
-        
-        # Remove the JSONP callback wrapper
-        if json_str.startswith("JSON_CALLBACK(") and json_str.endswith(")"):
-            json_str = json_str[len("JSON_CALLBACK("):-1]
+        # Remove the JSONP callback wrapper without copying the body
+        json_bytes = fast_json.strip_jsonp(body, "JSON_CALLBACK")
+        if json_bytes is not None:
             env.add_system_log("Removed JSON_CALLBACK wrapper")
         else:
-            env.add_system_log(f"Warning: Expected JSON_CALLBACK wrapper not found. Start: {json_str[:15]}, End: {json_str[-15:]}")
+            env.add_system_log(f"Warning: Expected JSON_CALLBACK wrapper not found. Start: {body[:15]!r}, End: {body[-15:]!r}")
+            json_bytes = body
         
         # Parse the JSON
         try:
-            data = json.loads(json_str)
+            with tracing.span("json.decode", bytes=len(json_bytes), backend=fast_json.BACKEND):
+                data = fast_json.loads(json_bytes)
             env.add_system_log("Successfully parsed JSON response")
-            
-            # Extract the articles from the response
-            articles = data.get("recentActivityArticles", {}).get("activity", [])
-            
-            # Filter for valid articles with title and body
-            valid_articles = []
-            for article in articles:
-                if "title" in article and "body" in article and "uri" in article:
-                    valid_articles.append(article)
-            
-            env.add_system_log(f"Found {len(articles)} total articles, {len(valid_articles)} valid articles")
-            
-            # Group by eventUri - articles about the same event already have the same eventUri
-            # This is more reliable than our own grouping
-            event_groups = {}
-            for article in valid_articles:
-                event_uri = article.get("eventUri")
-                if event_uri and event_uri != "null":
-                    if event_uri not in event_groups:
-                        event_groups[event_uri] = []
-                    event_groups[event_uri].append(article)
-            
-            # Add all non-event articles as individual items
-            pre_grouped_articles = []
-            for event_uri, group in event_groups.items():
-                if len(group) >= 2:  # Only include groups with at least 2 articles
-                    pre_grouped_articles.append(group)
-                    env.add_system_log(f"Found event group with {len(group)} articles for event {event_uri}")
-            
-            # Also include articles without eventUri for further grouping
-            remaining_articles = [a for a in valid_articles if not a.get("eventUri") or a.get("eventUri") == "null"]
-            
-            env.add_system_log(f"Articles pre-grouped by eventUri: {len(pre_grouped_articles)} groups")
-            env.add_system_log(f"Remaining articles for content grouping: {len(remaining_articles)}")
-            
-            return valid_articles, pre_grouped_articles, remaining_articles
-        except json.JSONDecodeError as json_error:
+            return data
+        except ValueError as json_error:
             env.add_system_log(f"JSON parsing error: {str(json_error)}")
-            env.add_system_log(f"Failed JSON snippet: {json_str[:100]}...{json_str[-100:]}")
-            return [], [], []
+            env.add_system_log(f"Failed JSON snippet: {bytes(json_bytes[:100])!r}...{bytes(json_bytes[-100:])!r}")
+            return None
     except Exception as e:
         env.add_system_log(f"Error fetching articles: {str(e)}")
         try:
-            env.add_system_log(f"Response content: {response.text[:500]}...")
+            env.add_system_log(f"Response content: {response.content[:500].decode('utf-8', errors='replace')}...")
         except:
             env.add_system_log("Could not access response content")
-        return [], [], []
+        return None
+
+def iter_articles(env: Environment, api_key: str, cursor: Dict, feed: Dict[str, Any] = DEFAULT_FEED) -> Iterator[Article]:
+    """
+    Yield valid articles (with title, body and uri) of one feed from the EventRegistry minute stream.
+    
+    In incremental mode only articles updated after `cursor["updated_after"]` are requested,
+    and the stream is paged until a short page comes back. `cursor` is advanced in place to
+    the newest article seen; the caller decides when to persist it. Articles are yielded as
+    `Article` records and each page is dropped once they have been yielded, so memory does not
+    grow with the size of the window or of the unused fields.
+    """
+    env.add_system_log(f"Fetching articles of feed {feed['name']} from EventRegistry API")
+    
+    base_url = env.env_vars.get("EVENT_REGISTRY_BASE_URL", "https://eventregistry.org")
+    incremental = env.env_vars.get("FETCH_MODE", "incremental") == "incremental"
+    lookback_minutes = int(env.env_vars.get("STREAM_LOOKBACK_MINUTES", 9000))
+    page_size = int(feed.get("page_size") or env.env_vars.get("STREAM_PAGE_SIZE", 100))
+    max_pages = int(feed.get("max_pages") or env.env_vars.get("STREAM_MAX_PAGES", 20))
+    query = quote(json.dumps(feed["query"], separators=(",", ":")), safe="")
+    
+    yielded_uris = set()
+    total = 0
+    valid = 0
+    for page in range(max_pages):
+        updated_after = cursor.get("updated_after") if incremental else None
+        if updated_after:
+            window_param = f"&recentActivityArticlesUpdatesAfterTm={quote(updated_after)}"
+        else:
+            window_param = f"&recentActivityArticlesUpdatesAfterMinsAgo={lookback_minutes}"
+        
+        url = (
+            f"{base_url}/api/v1/minuteStreamArticles"
+            f"?query={query}"
+            f"{window_param}"
+            f"&recentActivityArticlesMaxArticleCount={page_size}"
+            f"&apiKey={api_key}"
+            "&callback=JSON_CALLBACK"
+        )
+        
+        data = fetch_stream_page(env, url)
+        if data is None:
+            return
+        
+        # Extract the articles from the response
+        activity = data.get("recentActivityArticles", {}).get("activity", [])
+        total += len(activity)
+        tracing.increment("pages")
+        tracing.increment("stream_articles", len(activity))
+        
+        newest = updated_after or ""
+        for article in activity:
+            newest = max(newest, article.get("dateTime") or "")
+            
+            # Only pass on valid articles with title and body, once per run
+            if "title" in article and "body" in article and "uri" in article and article["uri"] not in yielded_uris:
+                yielded_uris.add(article["uri"])
+                valid += 1
+                yield Article.from_api(article, feed["name"])
+        del data, activity
+        
+        if newest:
+            cursor["updated_after"] = newest
+        
+        # Stop on a short page, or when the cursor cannot move any further
+        if not incremental or page_size <= 0 or total < (page + 1) * page_size or newest == updated_after:
+            break
+    
+    env.add_system_log(f"Feed {feed['name']}: {total} total articles, {valid} valid articles")
 
-def group_similar_articles(env: Environment, articles: List[Dict], pre_grouped: List[List[Dict]]) -> List[List[Dict]]:
+def split_event_groups(env: Environment, articles: Iterable[Article]) -> Tuple[List[Article], List[List[Article]], List[Article]]:
+    """Split a stream of articles into eventUri groups and articles that still need grouping."""
+    valid_articles = []
+    
+    # Group by eventUri - articles about the same event already have the same eventUri
+    # This is more reliable than our own grouping
+    event_groups = {}
+    remaining_articles = []
+    for article in articles:
+        valid_articles.append(article)
+        if article.event_uri:
+            event_groups.setdefault(article.event_uri, []).append(article)
+        else:
+            # Also include articles without eventUri for further grouping
+            remaining_articles.append(article)
+    
+    # Add all non-event articles as individual items
+    event_store = get_event_store(event_store_config_from_env(env.env_vars))
+    pre_grouped_articles = []
+    for event_uri, group in event_groups.items():
+        if len(group) >= 2:  # Only include groups with at least 2 articles
+            pre_grouped_articles.append(group)
+            env.add_system_log(f"Found event group with {len(group)} articles for event {event_uri}")
+        elif event_store and f"event:{event_uri}" in event_store:
+            # A single new article still updates an event analyzed in an earlier run
+            pre_grouped_articles.append(group)
+            env.add_system_log(f"Found a new article for known event {event_uri}")
+    
+    env.add_system_log(f"Articles pre-grouped by eventUri: {len(pre_grouped_articles)} groups")
+    env.add_system_log(f"Remaining articles for content grouping: {len(remaining_articles)}")
+    
+    return valid_articles, pre_grouped_articles, remaining_articles
+
+def fetch_articles(env: Environment, api_key: str) -> Tuple[List[Article], List[List[Article]], List[Article]]:
+    """Fetch articles from the EventRegistry API."""
+    cursor = load_stream_cursor(env)
+    return split_event_groups(env, iter_feed_articles(env, api_key, cursor))
+
+def group_similar_articles(env: Environment, articles: List[Article], pre_grouped: List[List[Article]]) -> List[List[Article]]:
     """Group similar articles together based on their content."""
+    with tracing.span("group_similar_articles", articles=len(articles), pre_grouped=len(pre_grouped)):
+        article_groups = _group_similar_articles(env, articles, pre_grouped)
+        tracing.set_attributes(groups=len(article_groups))
+        return article_groups
+
+def _group_similar_articles(env: Environment, articles: List[Article], pre_grouped: List[List[Article]]) -> List[List[Article]]:
     env.add_system_log("Grouping similar articles")
     
     # Start with our pre-grouped articles (already grouped by eventUri)
@@ -238,60 +698,96 @@ def group_similar_articles(env: Environment, articles: List[Dict], pre_grouped:
     if not articles:
         return article_groups
     
-    # Step 1: Try to group by duplicate flag and title similarity
-    title_groups = {}
-    for article in articles:
-        # Normalize the title - lowercase, remove punctuation
-        title = article.get("title", "").lower()
-        title = re.sub(r'[^\w\s]', '', title)
-        
-        # Create a simple hash from the first few words of the title
-        words = title.split()
-        if len(words) >= 3:
-            title_hash = " ".join(words[:3])  # First 3 words as a basic hash
-            if title_hash not in title_groups:
-                title_groups[title_hash] = []
-            title_groups[title_hash].append(article)
-    
-    # Add groups that have at least 2 articles
-    for title_hash, group in title_groups.items():
-        if len(group) >= 2:
-            article_groups.append(group)
-            env.add_system_log(f"Found title-based group with {len(group)} articles: {title_hash}")
-    
-    # If we already have enough groups, just return them
-    if len(article_groups) >= 3:
-        env.add_system_log(f"Found {len(article_groups)} groups - skipping AI-based grouping")
-        return article_groups
-    
-    # For remaining articles, use AI to find semantic similarity
-    # Collect articles that weren't grouped by title
-    remaining_articles = []
+    # Only articles that are not already part of an eventUri group need grouping
     grouped_uris = set()
     for group in article_groups:
         for article in group:
-            grouped_uris.add(article.get("uri"))
+            grouped_uris.add(article.uri)
+    remaining_articles = [article for article in articles if article.uri not in grouped_uris]
     
-    for article in articles:
-        if article.get("uri") not in grouped_uris:
-            remaining_articles.append(article)
+    # Step 1: Local clustering, semantic with the vector index or near-duplicate with MinHash + LSH
+    vector_config = vector_index_config_from_env(env.env_vars)
+    config = vector_config if vector_config["enabled"] else grouping_config_from_env(env.env_vars)
+    # A single article can still join a known event through the vector index
+    if len(remaining_articles) < (1 if vector_config["enabled"] else 2):
+        return article_groups
+    start_time = time.time()
+    if vector_config["enabled"]:
+        method = "Vector"
+        event_store = get_event_store(event_store_config_from_env(env.env_vars))
+        clusters, borderline = cluster_with_vector_index(vector_config, remaining_articles, event_store)
+    else:
+        method = "MinHash"
+        clusters, borderline = cluster_articles(remaining_articles, config)
+    tracing.set_attributes(method=method, clusters=len(clusters), borderline=len(borderline))
+    env.add_system_log(
+        f"{method} grouping of {len(remaining_articles)} articles took {time.time() - start_time:.3f}s: "
+        f"{len(clusters)} groups, {len(borderline)} borderline clusters"
+    )
+    
+    for cluster in clusters:
+        group = [remaining_articles[idx] for idx in cluster]
+        article_groups.append(group)
+        env.add_system_log(f"Found content-based group with {len(group)} articles: {group[0].title[:80]}")
     
-    if not remaining_articles or len(remaining_articles) < 2:
+    # Step 2: Only ask the AI about the ambiguous clusters, one small prompt each
+    if not config["llm_borderline"] or not borderline:
         return article_groups
     
-    env.add_system_log(f"Using AI to group remaining {len(remaining_articles)} articles")
+    for cluster in borderline[:config["max_llm_clusters"]]:
+        cluster_articles_list = [remaining_articles[idx] for idx in cluster]
+        article_groups.extend(confirm_borderline_group(env, cluster_articles_list))
     
-    # Using AI to group remaining articles
-    article_titles = [article.get("title", "") for article in remaining_articles]
-    article_bodies = [article.get("body", "")[:500] for article in remaining_articles]  # Use first 500 chars of body for comparison
+    return article_groups
+
+def cluster_with_vector_index(config: Dict[str, Any], articles: List[Article], event_store=None) -> Tuple[List[List[int]], List[List[int]]]:
+    """
+    Assign articles to clusters in the persistent vector index, setting each one's `cluster_id`.
+    
+    Returns (groups, borderline groups) as lists of article indexes, like `cluster_articles`.
+    Single articles are returned as a group when their cluster is a known event.
+    """
+    index = open_vector_index(config)
+    cluster_ids, borderline = index.assign(articles)
+    index.save()
+    
+    members = {}
+    for idx, cluster_id in enumerate(cluster_ids):
+        articles[idx].cluster_id = cluster_id
+        members.setdefault(cluster_id, []).append(idx)
+    groups = [
+        group for cluster_id, group in members.items()
+        if len(group) >= 2 or (event_store and f"cluster:{cluster_id}" in event_store)
+    ]
+    # Borderline candidates must not include articles that already form a group
+    grouped = {idx for group in groups for idx in group}
+    borderline = [[idx for idx in group if idx not in grouped] for group in borderline]
+    return groups, [group for group in borderline if len(group) >= 2]
+
+def is_eligible_group(env: Environment, group: List[Article]) -> bool:
+    """A group is analyzed when it has at least 2 sources or extends an already analyzed event."""
+    if len(group) >= 2:
+        return True
+    event_store = get_event_store(event_store_config_from_env(env.env_vars))
+    key = event_key(group)
+    return bool(event_store and key and key in event_store)
+
+GROUPING_INSTRUCTIONS = """
+        Return a JSON array where each element is an array of article IDs that belong to the same group.
+        Example: [[0, 3, 7], [1, 5], [2], [4, 6, 8, 9]]
+        """
+
+def confirm_borderline_group(env: Environment, candidates: List[Article]) -> List[List[Article]]:
+    """Ask the AI which of a small set of borderline-similar articles cover the same event."""
+    env.add_system_log(f"Using AI to check a borderline cluster of {len(candidates)} articles")
     
     # Prepare data for grouping
     grouping_data = []
-    for i, (title, body) in enumerate(zip(article_titles, article_bodies)):
+    for i, article in enumerate(candidates):
         grouping_data.append({
             "id": i,
-            "title": title,
-            "snippet": body
+            "title": article.title,
+            "snippet": article.body[:300]
         })
     
     # Use AI to group similar articles
@@ -310,57 +806,233 @@ def group_similar_articles(env: Environment, articles: List[Dict], pre_grouped:
         """
     }
     
-    # Convert grouping_data to a well-formatted string for the AI prompt
-    articles_formatted = json.dumps(grouping_data, indent=2)
-    
     user_prompt = f"""
     Group these news articles by similarity (same event/topic):
     
-    {articles_formatted}
+    {json.dumps(grouping_data)}
     
     Return ONLY a JSON array of arrays, where each inner array contains the IDs of similar articles.
     Example: [[0, 3, 7], [1, 5], [2], [4, 6, 8, 9]]
     """
     
     # Call the AI to group the articles
-    result = env.completion([prompt, {"role": "user", "content": user_prompt}])
-    
+    messages = [prompt, {"role": "user", "content": user_prompt}]
     try:
-        # Extract JSON from the result
-        json_result = re.search(r'\[\[.*\]\]', result, re.DOTALL)
-        if json_result:
-            groups_ids = json.loads(json_result.group(0))
-            
-            # Convert groups of IDs to groups of articles
-            for group in groups_ids:
-                article_group = [remaining_articles[idx] for idx in group if idx < len(remaining_articles)]
-                if len(article_group) >= 2:  # Only include groups with at least 2 articles
-                    article_groups.append(article_group)
-            
-            env.add_system_log(f"AI found {len(article_groups)} groups of similar articles")
-        else:
-            env.add_system_log("Could not extract groups from AI response")
+        result = llm_completion(env, messages)
     except Exception as e:
-        env.add_system_log(f"Error parsing AI grouping: {str(e)}")
+        # Leave the cluster unconfirmed rather than failing the whole run
+        env.add_system_log(f"AI check of the borderline cluster failed: {e}")
+        return []
     
-    return article_groups
+    groups_ids = parse_llm_json(env, result, "grouping", validate_groups, GROUPING_INSTRUCTIONS, "[")
+    if groups_ids is None:
+        invalidate_llm_completion(env, messages)
+        return []
+    
+    # Convert groups of IDs to groups of articles
+    groups = []
+    for group in groups_ids:
+        article_group = [candidates[idx] for idx in group if 0 <= idx < len(candidates)]
+        if len(article_group) >= 2:  # Only include groups with at least 2 articles
+            groups.append(article_group)
+    
+    env.add_system_log(f"AI confirmed {len(groups)} groups in the borderline cluster")
+    return groups
+
+ANALYSIS_INSTRUCTIONS = """
+        Format your response as JSON with the following structure:
+        {
+          "summary": "Comprehensive summary...",
+          "sentiment": "positive/negative/neutral",
+          "sentiment_explanation": "Brief explanation of the sentiment...",
+          "trading_recommendations": {
+            "buy": [
+              {"symbol": "TICKER", "reason": "Reason for buying"}
+            ],
+            "sell": [
+              {"symbol": "TICKER", "reason": "Reason for selling"}
+            ]
+          },
+          "sources": ["Source1", "Source2", ...]
+        }
+        """
 
-def process_article_group(env: Environment, article_group: List[Dict]) -> Dict:
+def process_article_group(env: Environment, article_group: List[Article]) -> Optional[Dict]:
     """
     Process a group of similar articles to create a comprehensive summary with sentiment and trading recommendations.
+    
+    If the group belongs to an event analyzed in an earlier run, only the articles added since
+    are sent, together with the previous analysis, and the AI revises that analysis. Analyses of
+    known events carry their `event_key` and `revision`; None is returned when nothing changed.
     """
-    env.add_system_log(f"Processing a group of {len(article_group)} similar articles")
+    with tracing.span("process_article_group", articles=len(article_group)):
+        return _process_article_group(env, article_group)
+
+def _process_article_group(env: Environment, article_group: List[Article]) -> Optional[Dict]:
+    event_store = get_event_store(event_store_config_from_env(env.env_vars))
+    key = event_key(article_group) if event_store else None
+    previous = event_store.get(key) if key else None
+    if key:
+        tracing.set_attributes(event=key, revision=previous["revision"] if previous else 0)
+    
+    new_articles = article_group
+    if previous:
+        known_uris = set(previous["uris"])
+        new_articles = [article for article in article_group if article.uri not in known_uris]
+        tracing.set_attributes(new_articles=len(new_articles))
+        if not new_articles:
+            # The API already has this revision, so there is nothing to deliver
+            env.add_system_log(f"No new articles for event {key}, its analysis is unchanged")
+            return None
+        env.add_system_log(
+            f"Updating event {key} (revision {previous['revision']}) with {len(new_articles)} new articles"
+        )
+    else:
+        env.add_system_log(f"Processing a group of {len(article_group)} similar articles")
     
     # Prepare data for processing
-    titles = [article.get("title", "") for article in article_group]
-    bodies = [article.get("body", "") for article in article_group]
-    sources = [article.get("source", {}).get("title", "Unknown") for article in article_group]
+    titles = [article.title for article in new_articles]
+    bodies = [article.body for article in new_articles]
+    sources = [article.source for article in new_articles]
+    
+    # Fit the bodies into the prompt's token budget, sending syndicated paragraphs only once;
+    # groups that are too large even then are summarized in chunks (map-reduce)
+    budget_config = prompt_budget_config_from_env(env.env_vars)
+    map_reduce_config = map_reduce_config_from_env(env.env_vars)
+    packing = None
+    chunks = None
+    if budget_config["enabled"]:
+        packed_bodies, packing = pack_bodies(titles, bodies, budget_config)
+        unique_tokens = packing["tokens_unique"]
+    else:
+        packed_bodies = bodies
+        unique_tokens = count_tokens("\n".join(titles + bodies), budget_config["encoding"])
+    if map_reduce_config["enabled"] and unique_tokens > map_reduce_config["threshold_tokens"]:
+        chunks, packing = chunk_bodies(titles, bodies, budget_config, map_reduce_config["chunk_tokens"])
+    bodies = packed_bodies
+    if packing:
+        record_packing(packing)
+        tracing.set_attributes(**{
+            "tokens.full": packing["tokens_full"],
+            "tokens.packed": packing["tokens_packed"],
+            "tokens.saved": packing["tokens_saved"],
+        })
+        env.add_system_log(
+            f"Prompt packing: {packing['tokens_packed']} of {packing['tokens_full']} tokens "
+            f"(saved {packing['tokens_saved']}, {packing['duplicate_paragraphs']} duplicate and "
+            f"{packing['dropped_paragraphs']} low-novelty paragraphs dropped)"
+        )
     
-    # Combine titles and bodies for processing
-    titles_text = "\n".join([f"{i+1}. {title}" for i, title in enumerate(titles)])
-    bodies_text = "\n\n".join([f"SOURCE {i+1} ({source}):\n{body}" for i, (body, source) in enumerate(zip(bodies, sources))])
+    # The titles and sources of the analysis cover every article of the event
+    all_titles = previous["titles"] + titles if previous else titles
+    all_sources = previous["sources"] + sources if previous else sources
+    uris = [article.uri for article in new_articles]
     
-    # Use AI to create a summary, sentiment analysis, and trading recommendations
+    if chunks:
+        tracing.set_attributes(chunks=len(chunks))
+        processed_result, ok = map_reduce_analysis(
+            env, titles, sources, chunks, previous, all_titles, all_sources, map_reduce_config
+        )
+        body_chars = sum(len(body) for _, chunk in chunks for body in chunk)
+    else:
+        # Sources whose paragraphs were all dropped are left out
+        titles_text = format_titles(titles)
+        bodies_text = format_bodies(bodies, sources)
+        
+        if previous:
+            messages = update_analysis_messages(previous, titles_text, bodies_text)
+        else:
+            messages = full_analysis_messages(titles_text, bodies_text)
+        
+        # Call the AI to process the article group
+        result = llm_completion(env, messages, cache_uris=uris)
+        processed_result, ok = parse_analysis(env, result, messages, all_titles, all_sources)
+        body_chars = sum(len(body) for body in bodies)
+    tracing.set_attributes(body_chars=body_chars, parsed=ok)
+    
+    if ok and key:
+        all_uris = (previous["uris"] if previous else []) + uris
+        total_chars = body_chars + (previous["body_chars"] if previous else 0)
+        revision = previous["revision"] + 1 if previous else 1
+        if previous:
+            env.add_system_log(
+                f"Incremental update of {key} sent {body_chars} of {total_chars} body characters"
+            )
+        # The API replaces the event's earlier revision instead of counting it again. The new
+        # revision is only saved once the result is queued (see queue_results), so a result that
+        # is abandoned after a timeout does not hide the event's articles from the next run.
+        event_record = {
+            "key": key, "analysis": processed_result, "uris": all_uris, "titles": all_titles,
+            "sources": all_sources, "body_chars": total_chars, "revision": revision,
+        }
+        processed_result = dict(processed_result, event_key=key, revision=revision, event_record=event_record)
+    return processed_result
+
+def format_titles(titles: List[str]) -> str:
+    return "\n".join([f"{i+1}. {title}" for i, title in enumerate(titles)])
+
+def format_bodies(bodies: List[str], sources: List[str]) -> str:
+    return "\n\n".join([f"SOURCE {i+1} ({source}):\n{body}" for i, (body, source) in enumerate(zip(bodies, sources)) if body])
+
+def map_reduce_analysis(env: Environment, titles: List[str], sources: List[str],
+                        chunks: List[Tuple[List[int], List[str]]], previous: Dict[str, Any],
+                        all_titles: List[str], all_sources: List[str],
+                        config: Dict[str, Any]) -> Tuple[Dict, bool]:
+    """
+    Analyze each chunk of a large group in parallel, then merge the partial analyses.
+    
+    The previous analysis of an updated event is merged as one more partial. Raises when a
+    chunk cannot be analyzed, so the group is retried on the next run.
+    """
+    def analyze_chunk(chunk):
+        indexes, chunk_bodies = chunk
+        chunk_titles = [titles[i] for i in indexes]
+        chunk_sources = [sources[i] for i in indexes]
+        messages = full_analysis_messages(format_titles(chunk_titles), format_bodies(chunk_bodies, chunk_sources))
+        start = time.monotonic()
+        result = llm_completion(env, messages)
+        record_latency("chunk", time.monotonic() - start)
+        partial, ok = parse_analysis(env, result, messages, chunk_titles, chunk_sources)
+        if not ok:
+            raise ValueError("could not parse the chunk analysis")
+        return partial, len(indexes)
+    
+    # Map
+    start_time = time.monotonic()
+    outcomes = process_concurrently(analyze_chunk, chunks, {
+        "max_workers": config["max_workers"], "mode": "thread", "batch_timeout": config["timeout"],
+    })
+    map_time = time.monotonic() - start_time
+    record_latency("map", map_time)
+    failed = [outcome["error"] for outcome in outcomes if not outcome["ok"]]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(chunks)} chunks failed: {failed[0]}")
+    partials = [outcome["result"] for outcome in outcomes]
+    if previous:
+        partials.insert(0, (previous["analysis"], len(previous["uris"])))
+    
+    # Reduce
+    start_time = time.monotonic()
+    messages = reduce_analysis_messages(partials)
+    result = llm_completion(env, messages)
+    merged, ok = parse_analysis(env, result, messages, all_titles, all_sources)
+    if not ok:
+        env.add_system_log("Merging the partial analyses without the AI")
+        merged = merge_analyses(partials)
+        merged["sources"] = all_sources
+        merged["original_titles"] = all_titles
+        merged["original_sources"] = all_sources
+    reduce_time = time.monotonic() - start_time
+    record_latency("reduce", reduce_time)
+    
+    env.add_system_log(
+        f"Map-reduce of {len(titles)} articles: {len(chunks)} chunks mapped in {map_time:.2f}s "
+        f"(slowest chunk {max(outcome['latency'] for outcome in outcomes):.2f}s), reduced in {reduce_time:.2f}s"
+    )
+    return merged, True
+
+def full_analysis_messages(titles_text: str, bodies_text: str) -> List[Dict[str, str]]:
+    """Prompt for analyzing a new group of articles from scratch."""
     prompt = {
         "role": "system", 
         "content": """
@@ -372,23 +1044,7 @@ def process_article_group(env: Environment, article_group: List[Dict]) -> Dict:
            - Which specific stocks might benefit (BUY recommendation)
            - Which specific stocks might suffer (SELL recommendation)
            - Why these stocks would be affected
-        
-        Format your response as JSON with the following structure:
-        {
-          "summary": "Comprehensive summary...",
-          "sentiment": "positive/negative/neutral",
-          "sentiment_explanation": "Brief explanation of the sentiment...",
-          "trading_recommendations": {
-            "buy": [
-              {"symbol": "TICKER", "reason": "Reason for buying"}
-            ],
-            "sell": [
-              {"symbol": "TICKER", "reason": "Reason for selling"}
-            ]
-          },
-          "sources": ["Source1", "Source2", ...]
-        }
-        """
+        """ + ANALYSIS_INSTRUCTIONS
     }
     
     user_prompt = f"""
@@ -401,63 +1057,167 @@ def process_article_group(env: Environment, article_group: List[Dict]) -> Dict:
     Create a comprehensive summary, sentiment analysis, and trading recommendations based on these articles.
     Return ONLY a JSON object with the structure specified in the instructions.
     """
+    return [prompt, {"role": "user", "content": user_prompt}]
+
+def update_analysis_messages(previous: Dict[str, Any], titles_text: str, bodies_text: str) -> List[Dict[str, str]]:
+    """Prompt for revising an event's previous analysis with newly published articles."""
+    analysis = previous["analysis"]
+    previous_analysis = json.dumps({
+        "summary": analysis.get("summary", ""),
+        "sentiment": analysis.get("sentiment", ""),
+        "sentiment_explanation": analysis.get("sentiment_explanation", ""),
+        "trading_recommendations": analysis.get("trading_recommendations", {"buy": [], "sell": []}),
+    }, ensure_ascii=False, indent=2)
     
-    # Call the AI to process the article group
-    result = env.completion([prompt, {"role": "user", "content": user_prompt}])
+    prompt = {
+        "role": "system", 
+        "content": """
+        You are a financial news analyst expert. You are given your earlier analysis of a developing
+        news story and the articles published about it since:
+        
+        1. Revise the summary so it covers the whole story, including the new developments.
+        2. Re-assess the sentiment (positive, negative, or neutral) in light of the new articles.
+        3. Update the trading recommendations: keep those that still hold, change or drop those
+           the new articles contradict, and add new ones they support.
+        """ + ANALYSIS_INSTRUCTIONS
+    }
     
-    try:
-        # Extract JSON from the result
-        json_match = re.search(r'({.*})', result, re.DOTALL)
-        if json_match:
-            processed_result = json.loads(json_match.group(0))
-            
-            # Add original titles and sources
-            processed_result["original_titles"] = titles
-            processed_result["original_sources"] = sources
-            
-            return processed_result
-        else:
-            env.add_system_log("Could not extract JSON from AI response")
-            # Create a default response
-            return {
-                "summary": "Failed to generate summary.",
-                "sentiment": "neutral",
-                "sentiment_explanation": "Could not determine sentiment.",
-                "trading_recommendations": {"buy": [], "sell": []},
-                "sources": sources,
-                "original_titles": titles
-            }
-    except Exception as e:
-        env.add_system_log(f"Error parsing AI processing result: {str(e)}")
+    user_prompt = f"""
+    PREVIOUS ANALYSIS (covering {len(previous["uris"])} articles):
+    {previous_analysis}
+    
+    NEW TITLES:
+    {titles_text}
+    
+    NEW ARTICLES:
+    {bodies_text}
+    
+    Revise the analysis based on these new articles.
+    Return ONLY a JSON object with the structure specified in the instructions.
+    """
+    return [prompt, {"role": "user", "content": user_prompt}]
+
+def reduce_analysis_messages(partials: List[Tuple[Dict[str, Any], int]]) -> List[Dict[str, str]]:
+    """Prompt for merging partial analyses of one large group, each covering some of its articles."""
+    partials_text = "\n\n".join(
+        f"PARTIAL ANALYSIS {i+1} (covering {count} articles):\n" + json.dumps({
+            "summary": analysis.get("summary", ""),
+            "sentiment": analysis.get("sentiment", ""),
+            "sentiment_explanation": analysis.get("sentiment_explanation", ""),
+            "trading_recommendations": analysis.get("trading_recommendations", {"buy": [], "sell": []}),
+        }, ensure_ascii=False, indent=2)
+        for i, (analysis, count) in enumerate(partials)
+    )
+    
+    prompt = {
+        "role": "system", 
+        "content": """
+        You are a financial news analyst expert. You are given partial analyses of one news story,
+        each written from a different subset of the articles about it:
+        
+        1. Merge the summaries into one comprehensive, brief, and easy-to-understand summary.
+        2. Decide the overall sentiment (positive, negative, or neutral), giving more weight to
+           partial analyses that cover more articles.
+        3. Merge the trading recommendations: list each stock once, and where the partial analyses
+           disagree on a stock, keep the recommendation that is better supported or drop it.
+        """ + ANALYSIS_INSTRUCTIONS
+    }
+    
+    user_prompt = f"""
+    {partials_text}
+    
+    Merge these partial analyses into one analysis of the whole story.
+    Return ONLY a JSON object with the structure specified in the instructions.
+    """
+    return [prompt, {"role": "user", "content": user_prompt}]
+
+def parse_analysis(env: Environment, result: str, messages: List[Dict[str, str]],
+                   titles: List[str], sources: List[str]) -> Tuple[Dict, bool]:
+    """Parse the AI's analysis; returns (analysis, ok), with a default analysis when parsing fails."""
+    processed_result = parse_llm_json(env, result, "analysis", validate_analysis, ANALYSIS_INSTRUCTIONS, "{")
+    if processed_result is None:
+        invalidate_llm_completion(env, messages)
         # Create a default response
         return {
-            "summary": "Failed to generate summary due to error.",
+            "summary": "Failed to generate summary.",
             "sentiment": "neutral",
-            "sentiment_explanation": "Could not determine sentiment due to error.",
+            "sentiment_explanation": "Could not determine sentiment.",
             "trading_recommendations": {"buy": [], "sell": []},
             "sources": sources,
             "original_titles": titles
-        }
+        }, False
+    
+    # Add original titles and sources
+    processed_result.setdefault("sources", sources)
+    processed_result["original_titles"] = titles
+    processed_result["original_sources"] = sources
+    return processed_result, True
+
+def parse_llm_json(env: Environment, result: str, kind: str, validate, schema_hint: str, expect: str = None):
+    """
+    Extract and validate the JSON value of an AI response.
+    
+    When the value is missing or invalid, the model is asked once to correct its reply (without
+    the articles, so the re-ask is cheap). Returns None if that fails too. Outcomes are counted
+    per model in `parse_stats`.
+    """
+    model = env.env_vars.get("LLM_MODEL", "llama-v3p1-70b-instruct")
+    value, errors, repaired = parse_and_validate(result, validate, expect)
+    if not errors:
+        record_parse(model, kind, "repaired" if repaired else "ok")
+        return value
+    
+    env.add_system_log(f"Invalid {kind} from the AI ({'; '.join(errors)}), asking for a correction")
+    reask = reask_messages(result or "", errors, schema_hint)
+    try:
+        corrected = llm_completion(env, reask)
+    except Exception as e:
+        # The original, unparsed reply stands
+        env.add_system_log(f"Could not ask the AI for a corrected {kind}: {e}")
+        record_parse(model, kind, "failed")
+        return None
+    value, errors, _ = parse_and_validate(corrected, validate, expect)
+    if not errors:
+        record_parse(model, kind, "reasked")
+        return value
+    
+    env.add_system_log(f"Could not get a valid {kind} from the AI: {'; '.join(errors)}")
+    invalidate_llm_completion(env, reask)
+    record_parse(model, kind, "failed")
+    return None
 
-def send_to_api(env: Environment, results: List[Dict]):
-    """Send the processed results to the API endpoint."""
-    env.add_system_log("Sending results to API endpoint")
+def queue_results(env: Environment, results: List[Dict]):
+    """Store the processed results in the durable outbox, in batches, then save their event revisions."""
+    event_records = [result.pop("event_record") for result in results if "event_record" in result]
+    outbox = get_outbox(outbox_config_from_env(env.env_vars))
+    with tracing.span("queue_results", results=len(results)):
+        batches = outbox.enqueue(results)
+        tracing.set_attributes(batches=batches)
+    env.add_system_log(f"Queued {len(results)} results for the API in {batches} batches")
     
+    if event_records:
+        get_event_store(event_store_config_from_env(env.env_vars)).put_many(event_records)
+
+def deliver_outbox(env: Environment):
+    """Send the outbox batches that are due to the API endpoint."""
     # Get the API endpoint from environment variables
     api_endpoint = env.env_vars.get("API_ENDPOINT", "http://localhost:8000/api/news")
+    outbox = get_outbox(outbox_config_from_env(env.env_vars))
     
-    # Prepare the payload
-    payload = {
-        "timestamp": datetime.utcnow().isoformat(),
-        "article_groups": results
-    }
-    
-    try:
-        # Send the results to the API
-        response = requests.post(api_endpoint, json=payload)
+    def post_batch(body, headers):
+        response = http_client.post(api_endpoint, data=body, headers=headers)
         env.add_system_log(f"API response status: {response.status_code}")
-    except Exception as e:
-        env.add_system_log(f"Error sending to API: {str(e)}")
+        return response.status_code
+    
+    with tracing.span("deliver_outbox"):
+        counts = outbox.deliver(post_batch, log=env.add_system_log)
+        tracing.set_attributes(**counts)
+    if any(counts.values()):
+        env.add_system_log(f"Outbox delivery: {counts}, now {outbox.stats()}")
 
-# Run the agent
-run(env) 
\ No newline at end of file
+# Run the agent; the NEAR AI runtime provides `env`
+if "env" in globals():
+    if env.env_vars.get("AGENT_MODE") == "daemon":
+        run_daemon(env)
+    else:
+        run(env)
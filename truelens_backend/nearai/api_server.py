@@ -1,13 +1,80 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Header, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import uvicorn
 import json
-from datetime import datetime
+import base64
+import hashlib
+import zlib
 import os
 
+from news_storage import NewsStorage, create_storage, import_legacy_files
+from news_stream import NewsBroadcaster, sse_frames, stream_config_from_env
+from write_behind import WriteBehindQueue, writer_config_from_env
+from ticker_index import TickerIndex, DEFAULT_TICKER_WINDOWS, parse_windows, rebuild_from_storage
+import fast_json
+from metrics import CONTENT_TYPE, REQUEST_BUCKETS, Histogram, RequestMetricsMiddleware, render
+import tracing
+
+# Largest request body accepted after gzip decompression
+MAX_DECOMPRESSED_BYTES = 50 * 1024 * 1024
+
+class GzipRequest(Request):
+    """
+    Request whose body is transparently decompressed when sent with Content-Encoding: gzip,
+    and decoded with the fast JSON backend.
+    """
+    
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            if "gzip" in self.headers.get("content-encoding", "").lower():
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                try:
+                    body = decompressor.decompress(body, MAX_DECOMPRESSED_BYTES)
+                except zlib.error:
+                    raise HTTPException(status_code=400, detail="Invalid gzip body")
+                if decompressor.unconsumed_tail:
+                    raise HTTPException(status_code=413, detail="Decompressed body too large")
+            self._body = body
+        return self._body
+    
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = fast_json.loads(await self.body())
+        return self._json
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with the fast JSON backend."""
+    
+    def render(self, content: Any) -> bytes:
+        return fast_json.dumps(content)
+
+class GzipRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        
+        async def gzip_handler(request: Request) -> Response:
+            return await handler(GzipRequest(request.scope, request.receive))
+        
+        return gzip_handler
+
 # Create the FastAPI app
-app = FastAPI(title="News Analyzer API", description="API to receive processed news articles")
+app = FastAPI(
+    title="News Analyzer API", description="API to receive processed news articles",
+    default_response_class=FastJSONResponse,
+)
+app.router.route_class = GzipRoute
+
+# Latency of every request by route, served on /metrics; requests are traced when TRACING_ENABLED is set
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time until the response started, by route.",
+    ("method", "route", "status"), REQUEST_BUCKETS,
+)
+app.add_middleware(RequestMetricsMiddleware, histogram=REQUEST_LATENCY)
 
 # Define the data models
 class TradingRecommendation(BaseModel):
@@ -26,51 +93,240 @@ class ArticleGroup(BaseModel):
     sources: List[str]
     original_titles: List[str]
     original_sources: Optional[List[str]] = None
+    # Set for analyses of a tracked event; a newer revision replaces the stored one
+    event_key: Optional[str] = None
+    revision: Optional[int] = None
 
 class NewsPayload(BaseModel):
     timestamp: str
     article_groups: List[ArticleGroup]
 
-# In-memory storage for received data (would use a database in production)
-received_data = []
+# Storage backend for received data, opened on startup
+STORAGE_URL = os.environ.get("NEWS_STORAGE_URL", "sqlite:///data/news.db")
+storage: NewsStorage = None
+
+# Received payloads are written to storage in batches by a background task
+WRITER_CONFIG = writer_config_from_env(os.environ)
+writer: WriteBehindQueue = None
 
-# Ensure the data directory exists
-os.makedirs("data", exist_ok=True)
+# Fan-out of newly received payloads to /api/news/stream subscribers
+STREAM_CONFIG = stream_config_from_env(os.environ)
+broadcaster = NewsBroadcaster(
+    history_size=STREAM_CONFIG["history_size"],
+    queue_size=STREAM_CONFIG["queue_size"],
+    slow_policy=STREAM_CONFIG["slow_policy"],
+)
+
+# Rolling per-ticker recommendation counts, rebuilt from storage on startup
+TICKER_WINDOWS = parse_windows(os.environ.get("TICKER_WINDOWS", DEFAULT_TICKER_WINDOWS))
+ticker_index: TickerIndex = None
+
+@app.on_event("startup")
+async def open_storage():
+    """
+    Open the storage backend, importing any data/news_*.json files from earlier versions.
+    """
+    global storage, ticker_index, writer
+    tracing.configure(tracing.tracing_config_from_env(os.environ, service_name="truelens-api"))
+    storage = create_storage(STORAGE_URL, WRITER_CONFIG["fsync"])
+    imported = import_legacy_files(storage)
+    if imported:
+        print(f"Imported {imported} legacy payloads from data/")
+    ticker_index = TickerIndex(TICKER_WINDOWS)
+    indexed = rebuild_from_storage(ticker_index, storage)
+    print(f"Indexed recommendations from {indexed} recent article groups")
+    writer = WriteBehindQueue(storage, WRITER_CONFIG)
+    writer.start()
+
+@app.on_event("shutdown")
+async def close_storage():
+    # Flush queued payloads before closing storage
+    await writer.close()
+    storage.close()
+    tracing.flush()
 
 @app.post("/api/news")
-async def receive_news(payload: NewsPayload = Body(...)):
+async def receive_news(payload: NewsPayload = Body(...), idempotency_key: Optional[str] = Header(None)):
     """
     Receive processed news articles from the NEAR AI agent.
+    
+    Bodies may be gzip-compressed. A request with an Idempotency-Key header is acknowledged only
+    once the payload is stored, and a repeated key is acknowledged without storing it again. A
+    repeat that arrives while the first payload is still being written gets 409, since that
+    write can still fail, and should be retried.
     """
-    # Add the payload to our in-memory storage
-    received_data.append(payload.dict())
+    if idempotency_key:
+        claim = await writer.claim(idempotency_key)
+        if claim == "stored":
+            return {"status": "success", "message": "Duplicate delivery ignored", "duplicate": True}
+        if claim == "pending":
+            raise HTTPException(
+                status_code=409,
+                detail="A delivery with this Idempotency-Key is still being stored",
+                headers={"Retry-After": "1"},
+            )
     
-    # Save to disk as well for persistence
-    try:
-        timestamp = datetime.fromisoformat(payload.timestamp).strftime("%Y%m%d_%H%M%S")
-        with open(f"data/news_{timestamp}.json", "w") as f:
-            json.dump(payload.dict(), f, indent=2)
-    except Exception as e:
-        print(f"Error saving data to disk: {e}")
+    # Queue the payload for the background writer, then update the ticker index and push it
+    # to live subscribers
+    data = payload.dict()
+    if not await writer.put(data, idempotency_key, wait=bool(idempotency_key)):
+        raise HTTPException(status_code=503, detail="Could not store payload")
+    ticker_index.add_payload(data)
+    broadcaster.publish(data)
     
     return {"status": "success", "message": f"Received {len(payload.article_groups)} article groups"}
 
+def encode_cursor(group_id: int) -> str:
+    """Opaque pagination cursor pointing just below a group id."""
+    return base64.urlsafe_b64encode(json.dumps({"before": group_id}).encode()).decode()
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["before"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/api/news")
-async def get_news():
+async def get_news(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    ticker: Optional[str] = None,
+    source: Optional[str] = None,
+):
+    """
+    Get processed article groups, newest first, one page at a time.
+    
+    Filters: `since`/`until` (ISO timestamps, inclusive), `sentiment`, `ticker` and `source`.
+    Pass `next_cursor` from a response as `cursor` to get the next page. Responses carry an
+    ETag; a poll with a matching If-None-Match gets an empty 304 when nothing new arrived.
+    """
+    # New and revised groups always get a higher id, so the newest group id plus the query identifies the result.
+    # Storage is read on the threadpool so the event loop never waits on the disk.
+    latest_group_id = await run_in_threadpool(storage.latest_group_id)
+    etag_source = f"{latest_group_id}|{sorted(request.query_params.multi_items())}"
+    etag = '"' + hashlib.sha1(etag_source.encode()).hexdigest() + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    before_id = decode_cursor(cursor) if cursor else None
+    
+    # Ask for one extra row to know whether there is another page
+    groups = await run_in_threadpool(
+        storage.query_groups, before_id=before_id, limit=limit + 1, since=since, until=until,
+        sentiment=sentiment, ticker=ticker, source=source,
+    )
+    next_cursor = encode_cursor(groups[limit - 1]["id"]) if len(groups) > limit else None
+    
+    return FastJSONResponse({"items": groups[:limit], "next_cursor": next_cursor}, headers={"ETag": etag})
+
+@app.get("/api/news/stream")
+async def stream_news(request: Request, last_event_id: Optional[int] = None):
+    """
+    Stream newly received payloads as Server-Sent Events ("news" events).
+    
+    Reconnecting clients resume from the Last-Event-ID header (or `last_event_id`) and get
+    any payloads they missed that are still buffered.
+    """
+    header = request.headers.get("last-event-id")
+    if header and header.isdigit():
+        last_event_id = int(header)
+    subscriber = broadcaster.subscribe(last_event_id)
+    return StreamingResponse(
+        sse_frames(broadcaster, subscriber, request.is_disconnected, STREAM_CONFIG["keepalive"]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/news/stream/stats")
+async def stream_stats():
+    """
+    Subscriber count and drop counters of the news stream.
+    """
+    return broadcaster.stats()
+
+@app.get("/api/news/writer/stats")
+async def writer_stats():
+    """
+    Queue depth, batch counts and write latency (seconds) of the background writer.
+    """
+    return writer.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics: request latency per route plus the writer, stream and ticker index stats.
+    """
+    writer_stats = writer.stats()
+    stream_stats = broadcaster.stats()
+    latest_group_id = await run_in_threadpool(storage.latest_group_id)
+    samples = [
+        ("news_writer_queue_depth", "gauge", "Payloads waiting for the background writer.",
+         [({}, writer_stats["queue_depth"])]),
+        ("news_writer_max_queue_depth", "gauge", "Largest writer queue depth seen.",
+         [({}, writer_stats["max_queue_depth"])]),
+        ("news_writer_payloads_written_total", "counter", "Payloads stored by the writer.",
+         [({}, writer_stats["written"])]),
+        ("news_writer_batches_total", "counter", "Write transactions committed by the writer.",
+         [({}, writer_stats["batches"])]),
+        ("news_writer_payloads_dropped_total", "counter", "Payloads dropped after failed writes.",
+         [({}, writer_stats["dropped"])]),
+        ("news_writer_batch_latency_seconds", "gauge", "Recent batch write latency quantiles.",
+         [({"quantile": q}, writer_stats["write_latency"][key]) for q, key in (("0.5", "p50"), ("0.95", "p95"), ("1", "max"))]),
+        ("news_stream_subscribers", "gauge", "Connected stream clients.",
+         [({}, stream_stats["subscribers"])]),
+        ("news_stream_published_total", "counter", "Events published to the stream.",
+         [({}, stream_stats["published"])]),
+        ("news_stream_dropped_frames_total", "counter", "Events dropped for slow stream clients.",
+         [({}, stream_stats["dropped_frames"])]),
+        ("news_stream_disconnected_slow_consumers_total", "counter", "Stream clients disconnected for being slow.",
+         [({}, stream_stats["disconnected_slow_consumers"])]),
+        ("ticker_index_symbols", "gauge", "Symbols with recommendations in the ticker index.",
+         [({}, ticker_index.symbols())]),
+        ("news_latest_group_id", "gauge", "Id of the newest stored article group.",
+         [({}, latest_group_id)]),
+    ]
+    return Response(render([REQUEST_LATENCY], samples), media_type=CONTENT_TYPE)
+
+@app.get("/api/tickers/movers")
+async def get_movers(
+    window: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    direction: str = "abs",
+):
+    """
+    Get the tickers with the largest sentiment-weighted scores in a window.
+    
+    `direction` is "up" (most bullish), "down" (most bearish) or "abs" (largest either way).
+    `window` is one of the configured TICKER_WINDOWS and defaults to the shortest.
+    """
+    if direction not in ("up", "down", "abs"):
+        raise HTTPException(status_code=400, detail="direction must be up, down or abs")
+    window = (window or next(iter(ticker_index.windows))).lower()
+    if window not in ticker_index.windows:
+        raise HTTPException(status_code=400, detail=f"Unknown window, expected one of {list(ticker_index.windows)}")
+    return {"window": window, "direction": direction, "items": ticker_index.movers(window, limit, direction)}
+
+@app.get("/api/tickers/{symbol}")
+async def get_ticker(symbol: str):
     """
-    Get all processed news articles.
+    Get rolling buy/sell counts and scores for a ticker, plus its most recent recommendations.
     """
-    return received_data
+    return ticker_index.ticker(symbol)
 
 @app.get("/api/news/latest")
 async def get_latest_news():
     """
     Get the most recently processed news articles.
     """
-    if not received_data:
+    latest = await run_in_threadpool(storage.latest_payload)
+    if latest is None:
         return {"message": "No news data available"}
     
-    return received_data[-1]
+    return latest
 
 def start_server():
     """
@@ -0,0 +1,70 @@
+"""
+The article record passed through the agent's pipeline.
+
+EventRegistry sends about twenty fields per article (image, concepts, sim and wgt scores,
+authors, ...), and fetch, dedup, grouping and prompt building read six of them. `Article`
+keeps only those, in a slotted object without a per-instance dict, and is built once when an
+article arrives from the stream so the raw API dicts are dropped page by page. The source is
+kept as its title, and an eventUri of "null" is stored as None.
+
+`fingerprint` is computed on first use from the lower-cased title and body with whitespace
+collapsed, so copies of an article that only differ in case or whitespace share it.
+"""
+import hashlib
+from typing import Any, Dict, Optional
+
+
+class Article:
+    __slots__ = ("uri", "event_uri", "title", "body", "source", "date_time", "feed", "cluster_id", "_fingerprint")
+
+    def __init__(self, uri: str, title: str, body: str, source: str = "Unknown",
+                 event_uri: Optional[str] = None, date_time: str = "", feed: Optional[str] = None,
+                 cluster_id: Optional[int] = None):
+        self.uri = uri
+        self.event_uri = event_uri
+        self.title = title
+        self.body = body
+        self.source = source
+        self.date_time = date_time
+        self.feed = feed  # Name of the feed that delivered the article
+        self.cluster_id = cluster_id  # Set by the vector index during grouping
+        self._fingerprint = None
+
+    @classmethod
+    def from_api(cls, article: Dict[str, Any], feed: Optional[str] = None) -> "Article":
+        """Build the record from an EventRegistry article dict."""
+        source = article.get("source")
+        event_uri = article.get("eventUri")
+        return cls(
+            uri=article["uri"],
+            title=article.get("title") or "",
+            body=article.get("body") or "",
+            source=(source.get("title") if isinstance(source, dict) else None) or "Unknown",
+            event_uri=event_uri if event_uri and event_uri != "null" else None,
+            date_time=article.get("dateTime") or "",
+            feed=feed,
+        )
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any]) -> "Article":
+        """Rebuild a record saved with `to_dict`."""
+        return cls(**record)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The fields needed to rebuild the record, for articles kept between runs."""
+        return {
+            "uri": self.uri, "title": self.title, "body": self.body, "source": self.source,
+            "event_uri": self.event_uri, "date_time": self.date_time, "feed": self.feed,
+        }
+
+    @property
+    def fingerprint(self) -> int:
+        """64-bit hash of the normalized title and body."""
+        if self._fingerprint is None:
+            words = f"{self.title}\n{self.body}".lower().split()
+            digest = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=8).digest()
+            self._fingerprint = int.from_bytes(digest, "big")
+        return self._fingerprint
+
+    def __repr__(self) -> str:
+        return f"Article(uri={self.uri!r}, source={self.source!r}, title={self.title[:60]!r})"
@@ -0,0 +1,174 @@
+"""
+Concurrent processing helpers for the agent: a token-bucket rate limiter per LLM provider and a
+bounded worker pool (thread pool or asyncio) that runs one job per article group.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Callable, Optional
+
+DEFAULT_CONCURRENCY_CONFIG = {
+    "max_workers": 4,           # Groups processed at the same time
+    "mode": "thread",           # "thread" or "asyncio"
+    "rate_limit_per_min": 0,    # Completions per minute per provider, 0 = unlimited
+    "burst": 4,                 # Token bucket capacity
+    "batch_timeout": 600.0,     # Seconds before unfinished groups are abandoned for this run
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `acquire` blocks until a token is available."""
+
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate = rate_per_sec
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available. Returns 0 on success, otherwise the seconds to wait."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` can be taken from the bucket."""
+        if self.rate <= 0:
+            return
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: float = 1.0):
+        """Asyncio version of `acquire`."""
+        if self.rate <= 0:
+            return
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+
+# One bucket per provider, shared by every worker in the process
+_provider_buckets: Dict[str, TokenBucket] = {}
+_provider_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, rate_limit_per_min: float, burst: float) -> Optional[TokenBucket]:
+    """Return the shared token bucket for a provider, or None when throttling is disabled."""
+    if rate_limit_per_min <= 0:
+        return None
+    with _provider_lock:
+        bucket = _provider_buckets.get(provider)
+        if bucket is None:
+            bucket = TokenBucket(rate_limit_per_min / 60.0, burst)
+            _provider_buckets[provider] = bucket
+        return bucket
+
+
+def concurrency_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the concurrency config from defaults plus LLM_* env var overrides."""
+    config = dict(DEFAULT_CONCURRENCY_CONFIG)
+    overrides = {
+        "max_workers": "LLM_CONCURRENCY",
+        "mode": "LLM_CONCURRENCY_MODE",
+        "rate_limit_per_min": "LLM_RATE_LIMIT_PER_MIN",
+        "burst": "LLM_RATE_LIMIT_BURST",
+        "batch_timeout": "LLM_BATCH_TIMEOUT",
+    }
+    for key, var in overrides.items():
+        raw = env_vars.get(var)
+        if raw is None:
+            continue
+        try:
+            config[key] = type(DEFAULT_CONCURRENCY_CONFIG[key])(raw)
+        except ValueError:
+            pass
+    config["max_workers"] = max(int(config["max_workers"]), 1)
+    return config
+
+
+def _timed_call(fn: Callable, item: Any) -> Dict[str, Any]:
+    start = time.monotonic()
+    try:
+        result = fn(item)
+        return {"ok": True, "result": result, "error": None, "latency": time.monotonic() - start}
+    except Exception as e:
+        return {"ok": False, "result": None, "error": str(e), "latency": time.monotonic() - start}
+
+
+def _run_threads(fn: Callable, items: List[Any], config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    outcomes = [None] * len(items)
+    executor = ThreadPoolExecutor(max_workers=config["max_workers"])
+    # Each job runs in a copy of the caller's context so tracing spans nest under the caller's
+    futures = {
+        executor.submit(contextvars.copy_context().run, _timed_call, fn, item): idx
+        for idx, item in enumerate(items)
+    }
+    deadline = time.monotonic() + config["batch_timeout"]
+
+    pending = set(futures)
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            outcomes[futures[future]] = future.result()
+
+    # Do not wait for stragglers: their groups are retried on the next run
+    executor.shutdown(wait=False, cancel_futures=True)
+    return outcomes
+
+
+async def _run_asyncio(fn: Callable, items: List[Any], config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(config["max_workers"])
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=config["max_workers"])
+
+    async def run_one(item):
+        async with semaphore:
+            # The completion API is blocking, so it runs in a worker thread
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(executor, context.run, _timed_call, fn, item)
+
+    tasks = [asyncio.ensure_future(run_one(item)) for item in items]
+    done, pending = await asyncio.wait(tasks, timeout=config["batch_timeout"])
+    for task in pending:
+        task.cancel()
+    executor.shutdown(wait=False, cancel_futures=True)
+    return [task.result() if task in done else None for task in tasks]
+
+
+def process_concurrently(fn: Callable, items: List[Any], config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Run `fn` over `items` with at most `max_workers` running at once.
+
+    Returns one outcome per item, in input order: a dict with "ok", "result", "error" and
+    "latency", or a timed-out outcome for items that did not finish within `batch_timeout`.
+    A failing or slow item never prevents the other outcomes from being returned.
+    """
+    if not items:
+        return []
+
+    if config.get("mode") == "asyncio":
+        outcomes = asyncio.run(_run_asyncio(fn, items, config))
+    else:
+        outcomes = _run_threads(fn, items, config)
+
+    timed_out = {"ok": False, "result": None, "error": "timed out", "latency": config["batch_timeout"]}
+    return [outcome if outcome is not None else dict(timed_out) for outcome in outcomes]
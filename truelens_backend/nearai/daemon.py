@@ -0,0 +1,224 @@
+"""
+Long-running pipeline for the agent's daemon mode.
+
+Fetch, analysis and delivery run as separate stages connected by bounded queues, so a new
+fetch can overlap with the analysis of the previous batch and with delivery of finished
+results. The fetch stage runs on a fixed interval and skips a cycle when the analysis queue is
+backed up, and a full queue blocks the producer, which keeps memory bounded when the LLM stage
+falls behind.
+
+Work items are tagged with the cycle that produced them. A cycle is complete once every item
+from it has been delivered or has failed. Completion is reported in cycle order, so callers can
+safely persist fetch cursors from there.
+
+On stop, items already queued are analyzed and delivered before the stages shut down. Items of
+a cycle that were not queued yet are reported to `on_failure`, so no item is dropped silently.
+"""
+import queue
+import threading
+import time
+from typing import List, Dict, Any, Callable
+
+DEFAULT_DAEMON_CONFIG = {
+    "interval": 3600.0,          # Seconds between fetch cycles
+    "analysis_workers": 4,       # Parallel analysis threads
+    "queue_size": 50,            # Bound on groups waiting for analysis
+    "backpressure_ratio": 0.5,   # Skip a fetch when the analysis queue is fuller than this
+    "delivery_batch_size": 10,   # Results sent per delivery call
+    "delivery_max_wait": 5.0,    # Seconds a partial batch waits before being sent
+    "max_cycles": 0,             # Stop after this many fetch cycles, 0 = run forever
+}
+
+_STOP = object()
+
+
+def daemon_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the daemon config from defaults plus DAEMON_* env var overrides."""
+    config = dict(DEFAULT_DAEMON_CONFIG)
+    for key, default in DEFAULT_DAEMON_CONFIG.items():
+        raw = env_vars.get(f"DAEMON_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+class PipelineDaemon:
+    """
+    Scheduler plus fetch -> analyze -> deliver stages.
+
+    Args:
+        fetch_fn: Called once per cycle; returns the work items (article groups) to analyze.
+        analyze_fn: Called for one work item; returns its result or raises.
+        deliver_fn: Called with a list of (item, result) pairs; raises if delivery failed.
+        on_failure: Called with (item, error) when analysis or delivery of an item failed.
+        on_cycle_complete: Called with the cycle number once all its items are settled.
+        log: Logging callable.
+    """
+
+    def __init__(self, config: Dict[str, Any], fetch_fn: Callable, analyze_fn: Callable, deliver_fn: Callable,
+                 on_failure: Callable = None, on_cycle_complete: Callable = None, log: Callable = print):
+        self.config = config
+        self.fetch_fn = fetch_fn
+        self.analyze_fn = analyze_fn
+        self.deliver_fn = deliver_fn
+        self.on_failure = on_failure or (lambda item, error: None)
+        self.on_cycle_complete = on_cycle_complete or (lambda cycle: None)
+        self.log = log
+
+        self.analysis_queue = queue.Queue(maxsize=max(config["queue_size"], 1))
+        self.delivery_queue = queue.Queue(maxsize=max(config["queue_size"], 1))
+        self.stop_event = threading.Event()
+
+        self.lock = threading.Lock()
+        self.outstanding: Dict[int, int] = {}
+        self.next_completed = 1
+
+    # Cycle bookkeeping
+
+    def _settle(self, cycle: int, count: int = 1):
+        completed = []
+        with self.lock:
+            self.outstanding[cycle] -= count
+            while self.next_completed in self.outstanding and self.outstanding[self.next_completed] <= 0:
+                del self.outstanding[self.next_completed]
+                completed.append(self.next_completed)
+                self.next_completed += 1
+        for done in completed:
+            try:
+                self.on_cycle_complete(done)
+            except Exception as e:
+                self.log(f"Daemon: cycle {done} completion hook failed: {str(e)}")
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        # Blocking put that still notices a stop request
+        while not self.stop_event.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # Stages
+
+    def _fetch_cycle(self, cycle: int):
+        backlog = self.analysis_queue.qsize()
+        if backlog >= self.analysis_queue.maxsize * self.config["backpressure_ratio"]:
+            self.log(f"Daemon: skipping fetch for cycle {cycle}, {backlog} groups still waiting for analysis")
+            items = []
+        else:
+            start = time.monotonic()
+            try:
+                items = list(self.fetch_fn(cycle))
+            except Exception as e:
+                self.log(f"Daemon: fetch for cycle {cycle} failed: {str(e)}")
+                items = []
+            self.log(f"Daemon: cycle {cycle} fetched {len(items)} groups in {time.monotonic() - start:.2f}s")
+
+        with self.lock:
+            self.outstanding[cycle] = len(items)
+        if not items:
+            self._settle(cycle, 0)
+            return
+
+        for position, item in enumerate(items):
+            if not self._put(self.analysis_queue, (cycle, item)):
+                unqueued = items[position:]
+                self.log(f"Daemon: stopped before {len(unqueued)} groups of cycle {cycle} were queued")
+                error = RuntimeError("daemon stopped before the group was analyzed")
+                for skipped in unqueued:
+                    self.on_failure(skipped, error)
+                self._settle(cycle, len(unqueued))
+                return
+
+    def _analysis_worker(self):
+        while True:
+            entry = self.analysis_queue.get()
+            if entry is _STOP:
+                return
+            cycle, item = entry
+            start = time.monotonic()
+            try:
+                result = self.analyze_fn(item)
+            except Exception as e:
+                self.log(f"Daemon: analysis failed after {time.monotonic() - start:.2f}s: {str(e)}")
+                self.on_failure(item, e)
+                self._settle(cycle)
+                continue
+            self.log(f"Daemon: analyzed group of {len(item)} in {time.monotonic() - start:.2f}s")
+            # Blocks even after stop: the deliverer keeps draining until every analyst has exited
+            self.delivery_queue.put((cycle, item, result))
+
+    def _delivery_worker(self):
+        batch = []
+        deadline = None
+        stopping = False
+        while not (stopping and not batch):
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                entry = self.delivery_queue.get(timeout=timeout)
+                if entry is _STOP:
+                    stopping = True
+                else:
+                    batch.append(entry)
+                    deadline = deadline or time.monotonic() + self.config["delivery_max_wait"]
+            except queue.Empty:
+                pass
+
+            full = len(batch) >= self.config["delivery_batch_size"]
+            expired = deadline is not None and time.monotonic() >= deadline
+            if batch and (full or expired or stopping):
+                self._deliver(batch)
+                batch = []
+                deadline = None
+
+    def _deliver(self, batch: List[tuple]):
+        start = time.monotonic()
+        try:
+            self.deliver_fn([(item, result) for _, item, result in batch])
+            self.log(f"Daemon: delivered {len(batch)} results in {time.monotonic() - start:.2f}s")
+        except Exception as e:
+            self.log(f"Daemon: delivery of {len(batch)} results failed: {str(e)}")
+            for _, item, _ in batch:
+                self.on_failure(item, e)
+        for cycle, _, _ in batch:
+            self._settle(cycle)
+
+    # Lifecycle
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run_forever(self):
+        """Run cycles until stopped or `max_cycles` is reached, then drain the pipeline."""
+        analysts = [
+            threading.Thread(target=self._analysis_worker, name=f"analysis-{i}", daemon=True)
+            for i in range(max(self.config["analysis_workers"], 1))
+        ]
+        deliverer = threading.Thread(target=self._delivery_worker, name="delivery", daemon=True)
+        for thread in analysts + [deliverer]:
+            thread.start()
+
+        cycle = 0
+        try:
+            while not self.stop_event.is_set():
+                cycle += 1
+                started = time.monotonic()
+                self._fetch_cycle(cycle)
+                if self.config["max_cycles"] and cycle >= self.config["max_cycles"]:
+                    break
+                self.stop_event.wait(max(self.config["interval"] - (time.monotonic() - started), 0))
+        except KeyboardInterrupt:
+            self.log("Daemon: interrupted, draining pipeline")
+        finally:
+            # Let queued work finish before shutting down the stages
+            for _ in analysts:
+                self.analysis_queue.put(_STOP)
+            for thread in analysts:
+                thread.join()
+            self.delivery_queue.put(_STOP)
+            deliverer.join()
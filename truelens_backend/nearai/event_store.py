@@ -0,0 +1,168 @@
+"""
+Persistent record of every analyzed event, so a story that keeps growing keeps one analysis.
+
+Events are keyed by EventRegistry's eventUri ("event:<uri>") or, for articles grouped locally,
+by their vector-index cluster ("cluster:<id>"). Each entry holds the latest analysis, the URIs,
+titles and sources it covers, how many body characters went into it and how often it has been
+updated. When new articles of a known event arrive, the agent sends the LLM only the previous
+analysis plus the new articles instead of re-reading every body.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+from article import Article
+
+DEFAULT_EVENT_STORE_CONFIG = {
+    "enabled": True,
+    "path": "event_store.sqlite",
+    "retention_days": 7.0,   # Events not updated for this long are forgotten
+}
+
+
+def event_store_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the event store config from defaults plus EVENT_STORE_* env var overrides."""
+    config = dict(DEFAULT_EVENT_STORE_CONFIG)
+    for key, default in DEFAULT_EVENT_STORE_CONFIG.items():
+        raw = env_vars.get(f"EVENT_STORE_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            if isinstance(default, bool):
+                config[key] = str(raw).lower() in ("1", "true", "yes", "on")
+            else:
+                config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+def event_key(articles: List[Article]) -> Optional[str]:
+    """
+    Key of the event a group of articles belongs to: their shared eventUri, else the lowest
+    vector-index cluster id among them, else None.
+    """
+    event_uris = {article.event_uri for article in articles}
+    if len(event_uris) == 1:
+        event_uri = event_uris.pop()
+        if event_uri:
+            return f"event:{event_uri}"
+    cluster_ids = [article.cluster_id for article in articles if article.cluster_id]
+    if cluster_ids and len(cluster_ids) == len(articles):
+        return f"cluster:{min(cluster_ids)}"
+    return None
+
+
+class EventStore:
+    """SQLite-backed map of event key -> latest analysis and the articles it covers."""
+
+    def __init__(self, path: str, retention_days: float = 7.0):
+        self.path = path
+        self.retention = retention_days * 86400
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                key TEXT PRIMARY KEY,
+                analysis TEXT NOT NULL,
+                uris TEXT NOT NULL,
+                titles TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                body_chars INTEGER NOT NULL,
+                revision INTEGER NOT NULL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_events_updated ON events(updated);
+            """
+        )
+        self.conn.execute("DELETE FROM events WHERE updated < ?", (time.time() - self.retention,))
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT analysis, uris, titles, sources, body_chars, revision, created FROM events "
+                "WHERE key = ? AND updated >= ?",
+                (key, time.time() - self.retention),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "key": key,
+            "analysis": json.loads(row[0]),
+            "uris": json.loads(row[1]),
+            "titles": json.loads(row[2]),
+            "sources": json.loads(row[3]),
+            "body_chars": row[4],
+            "revision": row[5],
+            "created": row[6],
+        }
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def put(self, key: str, analysis: Dict[str, Any], uris: List[str], titles: List[str],
+            sources: List[str], body_chars: int, revision: int):
+        """Store the latest analysis of an event, replacing the previous one."""
+        self.put_many([{
+            "key": key, "analysis": analysis, "uris": uris, "titles": titles,
+            "sources": sources, "body_chars": body_chars, "revision": revision,
+        }])
+
+    def put_many(self, records: List[Dict[str, Any]]):
+        """Store several events (dicts with the arguments of `put`) in one transaction."""
+        now = time.time()
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    """
+                    INSERT INTO events (key, analysis, uris, titles, sources, body_chars, revision, created, updated)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        analysis = excluded.analysis, uris = excluded.uris, titles = excluded.titles,
+                        sources = excluded.sources, body_chars = excluded.body_chars,
+                        revision = excluded.revision, updated = excluded.updated
+                    """,
+                    [
+                        (
+                            record["key"],
+                            json.dumps(record["analysis"], ensure_ascii=False),
+                            json.dumps(record["uris"]),
+                            json.dumps(record["titles"], ensure_ascii=False),
+                            json.dumps(record["sources"], ensure_ascii=False),
+                            record["body_chars"],
+                            record["revision"],
+                            now,
+                            now,
+                        )
+                        for record in records
+                    ],
+                )
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            events, updated = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(revision > 1), 0) FROM events"
+            ).fetchone()
+        return {"events": events, "updated_events": updated}
+
+
+_stores: Dict[str, EventStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_event_store(config: Dict[str, Any]) -> Optional[EventStore]:
+    """Return the shared event store for the configured path, or None when it is disabled."""
+    if not config["enabled"]:
+        return None
+    with _stores_lock:
+        store = _stores.get(config["path"])
+        if store is None:
+            store = _stores[config["path"]] = EventStore(config["path"], config["retention_days"])
+        return store
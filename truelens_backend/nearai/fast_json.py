@@ -0,0 +1,75 @@
+"""
+Fast JSON decoding and encoding for the multi-megabyte EventRegistry responses and the API
+server's payloads.
+
+orjson is used when it is installed, then msgspec, and the standard library `json` module
+otherwise; every backend reads and writes the same values. `loads` accepts bytes and
+memoryviews, so a JSONP response can be unwrapped with `strip_jsonp` and decoded without
+first being decoded to `str` and sliced (which keeps three copies of the body in memory).
+`dumps` returns compact UTF-8 bytes.
+"""
+import json
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif msgspec is not None:
+    BACKEND = "msgspec"
+    _decoder = msgspec.json.Decoder()
+    _encoder = msgspec.json.Encoder()
+else:
+    BACKEND = "json"
+
+_JSONP_TRAILER = b" \t\r\n;"
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode a JSON document; raises ValueError when it is invalid."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        try:
+            return _decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    if isinstance(data, memoryview):
+        data = str(data, "utf-8")  # The json module does not read buffers; decode without a bytes copy
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """Encode a value as compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    if msgspec is not None:
+        return _encoder.encode(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps_text(value: Any) -> str:
+    """`dumps` as a str, for text columns and SSE frames."""
+    return dumps(value).decode("utf-8")
+
+
+def strip_jsonp(body: bytes, callback: str) -> Optional[memoryview]:
+    """
+    The JSON inside `callback(...)` as a view of `body` (no copy), or None when the body is not
+    wrapped in that callback.
+    """
+    prefix = callback.encode("ascii") + b"("
+    end = len(body)
+    while end and body[end - 1] in _JSONP_TRAILER:
+        end -= 1
+    if not body.startswith(prefix) or end <= len(prefix) or body[end - 1] != ord(")"):
+        return None
+    return memoryview(body)[len(prefix):end - 1]
@@ -0,0 +1,216 @@
+"""
+Declarative news feeds for the agent, fetched concurrently and polled as often as they pay off.
+
+A feed is one EventRegistry minute-stream query. Feeds are declared as a JSON list, in the
+FEEDS env var or in the agent's `feeds.json` file (see feeds.example.json):
+
+    [{"name": "us-business", "query": {"$query": {...}, "$filter": {...}},
+      "poll_interval": 900, "priority": 1, "page_size": 100, "max_pages": 20}]
+
+`query` uses EventRegistry's query language as JSON (it is URL-encoded when the request is
+built); `poll_interval` is the base number of seconds between polls, `priority` orders feeds
+when not all of them can be polled in one cycle, and `page_size`/`max_pages` override the
+STREAM_* settings. Without a declaration the agent watches DEFAULT_FEED, the query it always
+used, on every run.
+
+`fan_out` runs one fetch per due feed in a bounded thread pool (all of them share the pooled
+HTTP session) and hands the articles to the caller through a bounded queue, so grouping
+starts while the slower feeds are still paging. `ArticleDeduper` drops an article when another
+feed already delivered it, or when its source re-published it under a new uri.
+
+Each feed's state (stream cursor, last poll, yield) is kept in the stream cursor file. The yield
+is an exponential moving average of the new articles a poll brought in; a feed's interval is
+its `poll_interval` scaled by target_new_per_poll / yield, within [min_factor, max_factor], so
+busy feeds are polled more often and quiet ones back off.
+"""
+import contextvars
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+DEFAULT_FEEDS_CONFIG = {
+    "path": "feeds.json",          # Feed declarations, when FEEDS is not set
+    "max_workers": 4,              # Feeds fetched at the same time
+    "queue_size": 500,             # Articles fetched ahead of grouping
+    "max_per_cycle": 0,            # Feeds polled per run or cycle, 0 = every due feed
+    "target_new_per_poll": 20.0,   # Yield at which a feed is polled at its base interval
+    "yield_alpha": 0.3,            # Weight of the latest poll in the yield average
+    "min_factor": 0.25,            # Shortest interval, as a factor of poll_interval
+    "max_factor": 8.0,             # Longest interval, as a factor of poll_interval
+}
+
+# Business, government and computing news about the United States from the top 10% of sources
+DEFAULT_FEED = {
+    "name": "us-business",
+    "query": {
+        "$query": {
+            "$and": [
+                {"$or": [
+                    {"categoryUri": "dmoz/Business"},
+                    {"categoryUri": "dmoz/Society/Government"},
+                    {"categoryUri": "dmoz/Computers"},
+                ]},
+                {"locationUri": "http://en.wikipedia.org/wiki/United_States"},
+                {"lang": "eng"},
+            ]
+        },
+        "$filter": {"startSourceRankPercentile": 0, "endSourceRankPercentile": 10},
+    },
+    "poll_interval": 0.0,  # Every run
+    "priority": 0,
+    "page_size": None,
+    "max_pages": None,
+}
+
+_FEED_DEFAULTS = {"poll_interval": 900.0, "priority": 0, "page_size": None, "max_pages": None}
+
+
+def feeds_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the feeds config from defaults plus FEEDS_* env var overrides."""
+    config = dict(DEFAULT_FEEDS_CONFIG)
+    for key, default in DEFAULT_FEEDS_CONFIG.items():
+        raw = env_vars.get(f"FEEDS_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    config["max_workers"] = max(int(config["max_workers"]), 1)
+    config["queue_size"] = max(int(config["queue_size"]), 1)
+    return config
+
+
+def parse_feeds(text: str) -> List[Dict[str, Any]]:
+    """Validate a JSON list of feed declarations and fill in the defaults; raises ValueError."""
+    declared = json.loads(text)
+    if not isinstance(declared, list) or not declared:
+        raise ValueError("feeds must be a non-empty JSON list")
+    feeds = []
+    names = set()
+    for i, spec in enumerate(declared):
+        if not isinstance(spec, dict) or not isinstance(spec.get("name"), str) or not spec["name"]:
+            raise ValueError(f"feed {i} needs a name")
+        if spec["name"] in names:
+            raise ValueError(f"feed {spec['name']!r} is declared twice")
+        if not isinstance(spec.get("query"), dict):
+            raise ValueError(f"feed {spec['name']!r} needs a query object")
+        names.add(spec["name"])
+        feed = dict(_FEED_DEFAULTS, **spec)
+        feed["poll_interval"] = max(float(feed["poll_interval"]), 0.0)
+        feed["priority"] = int(feed["priority"])
+        feeds.append(feed)
+    return feeds
+
+
+def feed_interval(feed: Dict[str, Any], state: Dict[str, Any], config: Dict[str, Any]) -> float:
+    """Seconds between polls of a feed, from its base interval and average yield."""
+    if "new_per_poll" not in state:
+        return feed["poll_interval"]
+    factor = config["target_new_per_poll"] / max(state["new_per_poll"], 0.1)
+    return feed["poll_interval"] * min(max(factor, config["min_factor"]), config["max_factor"])
+
+
+def due_feeds(feeds: List[Dict[str, Any]], states: Dict[str, Dict[str, Any]],
+              config: Dict[str, Any], now: float) -> List[Dict[str, Any]]:
+    """Feeds whose interval has passed, highest priority (then longest waiting) first."""
+    due = []
+    for feed in feeds:
+        state = states.get(feed["name"], {})
+        if now - state.get("last_polled", 0.0) >= feed_interval(feed, state, config):
+            due.append(feed)
+    due.sort(key=lambda feed: (-feed["priority"], states.get(feed["name"], {}).get("last_polled", 0.0)))
+    if config["max_per_cycle"] > 0:
+        due = due[:config["max_per_cycle"]]
+    return due
+
+
+def record_poll(state: Dict[str, Any], new_articles: int, config: Dict[str, Any], now: float):
+    """Update a feed's yield average after a completed poll."""
+    if "new_per_poll" in state:
+        alpha = config["yield_alpha"]
+        state["new_per_poll"] = round(alpha * new_articles + (1 - alpha) * state["new_per_poll"], 3)
+    else:
+        state["new_per_poll"] = float(new_articles)
+    state["last_polled"] = now
+
+
+class ArticleDeduper:
+    """
+    Remembers the articles of one fetch across feeds.
+
+    Fingerprints are only compared between articles with the same source and title, so they
+    are computed for few articles.
+    """
+
+    def __init__(self):
+        self.uris = set()
+        self.by_title: Dict[Tuple[str, str], List[Any]] = {}
+        self.repeated = 0  # Delivered by more than one feed
+        self.copies = 0    # Re-published by their source under a new uri
+
+    def add(self, article) -> bool:
+        """Return True when the article is new to this fetch."""
+        if article.uri in self.uris:
+            self.repeated += 1
+            return False
+        self.uris.add(article.uri)
+        same_title = self.by_title.setdefault((article.source, article.title.strip().lower()), [])
+        if any(other.fingerprint == article.fingerprint for other in same_title):
+            self.copies += 1
+            return False
+        same_title.append(article)
+        return True
+
+
+def fan_out(feeds: List[Dict[str, Any]], fetch: Callable[[Dict[str, Any]], Iterable[Any]],
+            max_workers: int, queue_size: int,
+            on_done: Callable[[Dict[str, Any], Optional[Exception]], None]) -> Iterator[Tuple[Dict[str, Any], Any]]:
+    """
+    Run `fetch(feed)` for every feed in a thread pool and yield (feed, item) as items arrive.
+
+    Feeds start in the given order. `on_done(feed, error)` is called from the consuming thread
+    once a feed is exhausted or has failed. Closing the generator stops the fetches at their
+    next item.
+    """
+    messages = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    done = object()
+
+    def put(message) -> bool:
+        while not stop.is_set():
+            try:
+                messages.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(feed):
+        error = None
+        try:
+            for item in fetch(feed):
+                if not put((feed, item)):
+                    return
+        except Exception as e:
+            error = e
+        put((feed, (done, error)))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        # Each fetch runs in a copy of the caller's context so tracing spans nest under the caller's
+        for feed in feeds:
+            executor.submit(contextvars.copy_context().run, drain, feed)
+        remaining = len(feeds)
+        while remaining:
+            feed, item = messages.get()
+            if isinstance(item, tuple) and len(item) == 2 and item[0] is done:
+                remaining -= 1
+                on_done(feed, item[1])
+                continue
+            yield feed, item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,212 @@
+"""
+Shared HTTP client for every outbound call (EventRegistry fetches and API delivery).
+
+All requests go through one pooled `requests.Session` so connections are kept alive between
+calls, with gzip (and brotli, when the `brotli` package is installed) response compression,
+separate connect/read timeouts, and retries with jittered exponential backoff on connection
+errors, timeouts, 429 and 5xx responses. Per-endpoint latency histograms are kept in memory,
+and each call is recorded as a client span (status, attempts, bytes) when tracing is enabled.
+
+`newsapi/http_session.py` is a copy of this module (without tracing) for the EventRegistry
+scripts, which cannot import the agent's code; keep the two in step.
+"""
+import random
+import threading
+import time
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+try:
+    import brotli  # noqa: F401  (lets urllib3 decode "br" responses)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+DEFAULT_HTTP_CONFIG = {
+    "connect_timeout": 5.0,
+    "read_timeout": 60.0,
+    "max_retries": 3,
+    "backoff_base": 0.5,     # Seconds; attempt n waits up to base * 2**n
+    "backoff_max": 30.0,
+    "pool_size": 20,         # Connections kept per host
+}
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_config = dict(DEFAULT_HTTP_CONFIG)
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def http_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the HTTP client config from defaults plus HTTP_* env var overrides."""
+    config = dict(DEFAULT_HTTP_CONFIG)
+    for key, default in DEFAULT_HTTP_CONFIG.items():
+        raw = env_vars.get(f"HTTP_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+def configure(config: Dict[str, Any]):
+    """Apply a new config. The pooled session is rebuilt if the pool size changed."""
+    global _session
+    with _session_lock:
+        if _session is not None and config["pool_size"] != _config["pool_size"]:
+            _session.close()
+            _session = None
+        _config.update(config)
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=_config["pool_size"], pool_maxsize=_config["pool_size"])
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            _session = session
+        return _session
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram for one endpoint."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile: the upper bound of the bucket holding it."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf")
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.buckets)),
+        }
+
+
+_histograms: Dict[str, LatencyHistogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def endpoint_key(method: str, url: str) -> str:
+    """Histogram key: method, host and path, without the query string (which holds API keys)."""
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.netloc}{parts.path}"
+
+
+def _observe(key: str, seconds: float, error: bool):
+    with _histograms_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = LatencyHistogram()
+        histogram.observe(seconds, error)
+
+
+def latency_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of the per-endpoint latency histograms."""
+    with _histograms_lock:
+        return {key: histogram.snapshot() for key, histogram in _histograms.items()}
+
+
+def _backoff_delay(attempt: int, response: Optional[requests.Response]) -> float:
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        return min(float(response.headers["Retry-After"]), _config["backoff_max"])
+    # "Full jitter": a random wait between 0 and the exponential cap
+    return random.uniform(0, min(_config["backoff_max"], _config["backoff_base"] * (2 ** attempt)))
+
+
+def request(method: str, url: str, max_retries: int = None, **kwargs) -> requests.Response:
+    """
+    Send a request over the pooled session, retrying transient failures.
+
+    Accepts the same keyword arguments as `requests.request`. Returns the final response (which
+    may still carry an error status once retries are exhausted) or raises the last
+    connection/timeout error.
+    """
+    kwargs.setdefault("timeout", (_config["connect_timeout"], _config["read_timeout"]))
+    retries = _config["max_retries"] if max_retries is None else max_retries
+    key = endpoint_key(method, url)
+    session = get_session()
+
+    with tracing.span(key, kind=tracing.KIND_CLIENT, **{"http.method": method.upper(), "http.url": key}) as span:
+        if span is not None:
+            data = kwargs.get("data")
+            span.attributes["http.request_bytes"] = len(data) if isinstance(data, (bytes, str)) else 0
+            encoding = (kwargs.get("headers") or {}).get("Content-Encoding")
+            if encoding:
+                span.attributes["http.request_encoding"] = encoding
+        for attempt in range(retries + 1):
+            if span is not None:
+                span.attributes["http.attempts"] = attempt + 1
+            start = time.monotonic()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                _observe(key, time.monotonic() - start, error=True)
+                if attempt >= retries:
+                    raise
+                time.sleep(_backoff_delay(attempt, None))
+                continue
+
+            retryable = response.status_code in RETRY_STATUS_CODES
+            _observe(key, time.monotonic() - start, error=response.status_code >= 400)
+            if not retryable or attempt >= retries:
+                if span is not None:
+                    span.attributes["http.status_code"] = response.status_code
+                    span.attributes["http.response_bytes"] = len(response.content)
+                return response
+            delay = _backoff_delay(attempt, response)
+            response.close()
+            time.sleep(delay)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
@@ -0,0 +1,108 @@
+"""
+Benchmark of decoding one minute-stream response, the old way against `fast_json`.
+
+Builds a JSONP response from the recorded EventRegistry articles (scaled up with rewritten
+copies, as in pipeline_bench.py) and decodes it:
+- "str slice": `response.text`, slicing off the JSON_CALLBACK wrapper and `json.loads`, keeping
+  the full articles (the agent's previous path)
+- "bytes view (json)": `strip_jsonp` on the bytes, the standard library decoder and `Article`
+  records
+- "bytes view (<backend>)": the same with the installed fast backend, when there is one
+
+Reports the best decode time, the peak memory allocated while decoding (on top of the response
+body) and the memory still held by the decoded articles.
+
+Usage:
+    python json_bench.py [--articles 2000] [--repeat 5]
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import List, Dict, Any, Callable
+
+import fast_json
+from article import Article
+from pipeline_bench import DEFAULT_CORPUS, load_recorded_articles, scale_corpus
+
+CALLBACK = "JSON_CALLBACK"
+MB = 1024 * 1024
+
+
+def build_response(articles: List[Dict]) -> bytes:
+    body = json.dumps({"recentActivityArticles": {"activity": articles}})
+    return f"{CALLBACK}({body})".encode("utf-8")
+
+
+def decode_str_slice(body: bytes) -> List[Dict]:
+    text = body.decode("utf-8")
+    if text.startswith(CALLBACK + "(") and text.endswith(")"):
+        text = text[len(CALLBACK) + 1:-1]
+    return json.loads(text)["recentActivityArticles"]["activity"]
+
+
+def decode_view(loads: Callable) -> Callable[[bytes], List[Dict]]:
+    def decode(body: bytes) -> List[Dict]:
+        data = loads(fast_json.strip_jsonp(body, CALLBACK))
+        return [Article.from_api(article) for article in data["recentActivityArticles"]["activity"]]
+    return decode
+
+
+def measure(decode: Callable[[bytes], List[Dict]], body: bytes, repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        articles = decode(body)
+        times.append(time.perf_counter() - start)
+        del articles
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    articles = decode(body)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": min(times),
+        "articles": len(articles),
+        "peak_mb": (peak - before) / MB,
+        "retained_mb": (current - before) / MB,
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark of decoding a minute-stream response.")
+    parser.add_argument("--corpus", action="append", help="Recorded EventRegistry response (repeatable)")
+    parser.add_argument("--articles", type=int, default=2000, help="Articles in the response")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed decodes per path")
+    args = parser.parse_args(argv)
+
+    base = load_recorded_articles(args.corpus or [DEFAULT_CORPUS])
+    body = build_response(scale_corpus(base, args.articles, 0.1))
+    print(f"Response: {args.articles} articles, {len(body) / MB:.1f} MB")
+
+    paths = [
+        ("str slice", decode_str_slice),
+        ("bytes view (json)", decode_view(lambda view: json.loads(str(view, "utf-8")))),
+    ]
+    if fast_json.BACKEND != "json":
+        paths.append((f"bytes view ({fast_json.BACKEND})", decode_view(fast_json.loads)))
+
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'path':<22} {'seconds':>8} {'peak MB':>8} {'kept MB':>8}")
+    for name, decode in paths:
+        results[name] = result = measure(decode, body, args.repeat)
+        print(f"{name:<22} {result['seconds']:>8.4f} {result['peak_mb']:>8.1f} {result['retained_mb']:>8.1f}")
+
+    old = results["str slice"]
+    new = results[paths[-1][0]]
+    print(
+        f"{paths[-1][0]}: {old['seconds'] / new['seconds']:.1f}x faster, "
+        f"{old['peak_mb'] - new['peak_mb']:.1f} MB lower peak, "
+        f"{old['retained_mb'] - new['retained_mb']:.1f} MB less kept"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Persistent, content-addressed cache for LLM completions.
+
+Responses are stored in a local SQLite file keyed by a stable hash of (model, temperature,
+messages), so a re-run after a crash or a repeated event group does not pay for the same
+completion twice. Entries expire after a TTL and the least recently used entries are evicted
+once the cache holds more than `max_entries`.
+
+Entries can also be tagged with the set of article URIs they were generated from. In near-hit
+mode a lookup for a group whose URIs are a superset of a cached group's URIs, differing by at
+most `near_hit_delta` articles, reuses the cached analysis. `lookup` returns the key of the
+entry that was actually served, so a near-hit response that turns out to be unusable can be
+invalidated under its own key rather than the key of the prompt that matched it.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+DEFAULT_LLM_CACHE_CONFIG = {
+    "enabled": True,
+    "path": "llm_cache.sqlite",
+    "ttl": 86400.0,          # Seconds a cached response stays valid
+    "max_entries": 2000,     # LRU bound
+    "near_hit_delta": 0,     # Extra articles allowed for a near hit, 0 disables near hits
+}
+
+
+def llm_cache_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the cache config from defaults plus LLM_CACHE_* env var overrides."""
+    config = dict(DEFAULT_LLM_CACHE_CONFIG)
+    for key, default in DEFAULT_LLM_CACHE_CONFIG.items():
+        raw = env_vars.get(f"LLM_CACHE_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            if isinstance(default, bool):
+                config[key] = str(raw).lower() in ("1", "true", "yes", "on")
+            else:
+                config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+def completion_cache_key(model: str, temperature: float, messages: List[Dict]) -> str:
+    """Stable hash of everything that determines a completion."""
+    canonical = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed LRU cache of completion responses with TTL and hit/miss counters."""
+
+    def __init__(self, path: str, ttl: float = 86400.0, max_entries: int = 2000, near_hit_delta: int = 0):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.near_hit_delta = near_hit_delta
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                uri_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions(last_used);
+            CREATE TABLE IF NOT EXISTS completion_uris (
+                key TEXT NOT NULL,
+                uri TEXT NOT NULL,
+                PRIMARY KEY (key, uri)
+            );
+            CREATE INDEX IF NOT EXISTS idx_completion_uris_uri ON completion_uris(uri);
+            """
+        )
+        self.conn.commit()
+
+    def lookup(self, key: str, uris: Optional[List[str]] = None) -> Optional[Tuple[str, str]]:
+        """Return (matched key, response) for `key`, falling back to a near hit on `uris` if enabled."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self.conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+                self.hits += 1
+                return key, row[0]
+
+            if uris and self.near_hit_delta > 0:
+                match = self._near_hit(set(uris), now)
+                if match is not None:
+                    self.near_hits += 1
+                    return match
+
+            self.misses += 1
+            return None
+
+    def _near_hit(self, uris: set, now: float) -> Optional[Tuple[str, str]]:
+        # Count, per cached entry, how many of its URIs are in the current group. The entry is a
+        # subset of the group exactly when that count equals its own URI count.
+        placeholders = ",".join("?" * len(uris))
+        rows = self.conn.execute(
+            f"""
+            SELECT c.key, c.response, c.uri_count
+            FROM completion_uris u JOIN completions c ON c.key = u.key
+            WHERE u.uri IN ({placeholders}) AND c.created >= ?
+            GROUP BY c.key
+            HAVING COUNT(*) = c.uri_count AND c.uri_count >= ?
+            ORDER BY c.uri_count DESC
+            LIMIT 1
+            """,
+            list(uris) + [now - self.ttl, len(uris) - self.near_hit_delta],
+        ).fetchall()
+        if not rows:
+            return None
+        key, response, _ = rows[0]
+        self.conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+        return key, response
+
+    def put(self, key: str, response: str, uris: Optional[List[str]] = None):
+        """Store a response, tagging it with the article URIs it was generated from."""
+        now = time.time()
+        uri_set = sorted(set(uris or []))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completions (key, response, created, last_used, uri_count) VALUES (?, ?, ?, ?, ?)",
+                (key, response, now, now, len(uri_set)),
+            )
+            self.conn.execute("DELETE FROM completion_uris WHERE key = ?", (key,))
+            self.conn.executemany(
+                "INSERT INTO completion_uris (key, uri) VALUES (?, ?)", [(key, uri) for uri in uri_set]
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def invalidate(self, key: str):
+        """Drop an entry, e.g. when its response turned out to be unusable."""
+        with self.lock:
+            self.conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            self.conn.execute("DELETE FROM completion_uris WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def _evict(self, now: float):
+        # Expired entries first, then the least recently used beyond the size bound
+        self.conn.execute("DELETE FROM completions WHERE created < ?", (now - self.ttl,))
+        self.conn.execute(
+            """
+            DELETE FROM completions WHERE key IN (
+                SELECT key FROM completions ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+        self.conn.execute("DELETE FROM completion_uris WHERE key NOT IN (SELECT key FROM completions)")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters since this cache was opened."""
+        lookups = self.hits + self.near_hits + self.misses
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+# Caches are shared by all workers in the process, one per file
+_caches: Dict[str, LLMCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_llm_cache(config: Dict[str, Any]) -> Optional[LLMCache]:
+    """Return the shared cache for the configured path, or None when caching is disabled."""
+    if not config["enabled"]:
+        return None
+    with _caches_lock:
+        cache = _caches.get(config["path"])
+        if cache is None:
+            cache = LLMCache(config["path"], config["ttl"], config["max_entries"], config["near_hit_delta"])
+            _caches[config["path"]] = cache
+        return cache
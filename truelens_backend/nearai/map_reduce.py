@@ -0,0 +1,104 @@
+"""
+Map-reduce summarization for article groups too large for one prompt.
+
+A group whose bodies still exceed `threshold_tokens` after de-duplication is split into
+chunks of at most `chunk_tokens` (see `prompt_packing.chunk_bodies`). Every chunk is analyzed
+on its own, in parallel (map), and the partial analyses are merged into one by a final
+completion (reduce). If the reduce completion cannot be parsed, `merge_analyses` combines the
+partials without the model: sentiment by article-weighted vote and recommendations by
+article-weighted net buy/sell per symbol.
+
+Latencies of the map and reduce stages are kept per process (`map_reduce_stats`).
+"""
+import threading
+from collections import deque
+from typing import List, Dict, Any, Tuple
+
+DEFAULT_MAP_REDUCE_CONFIG = {
+    "enabled": True,
+    "threshold_tokens": 12000,  # Groups with more unique tokens than this are summarized in chunks
+    "chunk_tokens": 5000,       # Tokens of titles and bodies per map prompt
+    "max_workers": 4,           # Chunks analyzed at the same time
+    "timeout": 300.0,           # Seconds before unfinished chunks fail the group
+}
+
+_STAGES = ("map", "chunk", "reduce")
+_latencies = {stage: deque(maxlen=500) for stage in _STAGES}
+_latencies_lock = threading.Lock()
+
+
+def map_reduce_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the map-reduce config from defaults plus MAP_REDUCE_* env var overrides."""
+    config = dict(DEFAULT_MAP_REDUCE_CONFIG)
+    for key, default in DEFAULT_MAP_REDUCE_CONFIG.items():
+        raw = env_vars.get(f"MAP_REDUCE_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            if isinstance(default, bool):
+                config[key] = str(raw).lower() in ("1", "true", "yes", "on")
+            else:
+                config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    config["max_workers"] = max(int(config["max_workers"]), 1)
+    return config
+
+
+def merge_analyses(partials: List[Tuple[Dict[str, Any], int]]) -> Dict[str, Any]:
+    """
+    Combine partial analyses without the model; `partials` are (analysis, article count) pairs.
+
+    The sentiment with the most articles behind it wins (neutral on a tie). A symbol is a buy
+    or a sell by the article-weighted balance of the partials recommending it, and dropped
+    when they cancel out.
+    """
+    votes: Dict[str, int] = {}
+    balance: Dict[str, int] = {}
+    reasons: Dict[Tuple[str, str], str] = {}
+    for analysis, weight in partials:
+        sentiment = str(analysis.get("sentiment", "neutral")).lower()
+        votes[sentiment] = votes.get(sentiment, 0) + weight
+        recommendations = analysis.get("trading_recommendations") or {}
+        for action, direction in (("buy", 1), ("sell", -1)):
+            for rec in recommendations.get(action, []):
+                symbol = str(rec.get("symbol", "")).upper()
+                if not symbol:
+                    continue
+                balance[symbol] = balance.get(symbol, 0) + direction * weight
+                reasons.setdefault((symbol, action), rec.get("reason", ""))
+
+    ranked = sorted(votes.items(), key=lambda item: -item[1])
+    sentiment = "neutral"
+    if ranked and (len(ranked) == 1 or ranked[0][1] > ranked[1][1]):
+        sentiment = ranked[0][0]
+
+    largest = max(partials, key=lambda partial: partial[1])[0] if partials else {}
+    return {
+        "summary": " ".join(analysis.get("summary", "") for analysis, _ in partials if analysis.get("summary")),
+        "sentiment": sentiment,
+        "sentiment_explanation": largest.get("sentiment_explanation", ""),
+        "trading_recommendations": {
+            "buy": [{"symbol": s, "reason": reasons[(s, "buy")]} for s, net in balance.items() if net > 0],
+            "sell": [{"symbol": s, "reason": reasons[(s, "sell")]} for s, net in balance.items() if net < 0],
+        },
+    }
+
+
+def record_latency(stage: str, seconds: float):
+    with _latencies_lock:
+        _latencies[stage].append(seconds)
+
+
+def map_reduce_stats() -> Dict[str, Dict[str, float]]:
+    """Count, p50 and max latency in seconds of each stage ("chunk" is one map completion)."""
+    stats = {}
+    with _latencies_lock:
+        for stage, values in _latencies.items():
+            ordered = sorted(values)
+            stats[stage] = {
+                "count": len(ordered),
+                "p50": round(ordered[len(ordered) // 2], 4) if ordered else 0.0,
+                "max": round(ordered[-1], 4) if ordered else 0.0,
+            }
+    return stats
@@ -0,0 +1,130 @@
+"""
+Prometheus metrics for the API server.
+
+`RequestMetricsMiddleware` is a plain ASGI middleware that records the latency of every
+request in a histogram labelled by method, route template (e.g. "/api/tickers/{symbol}", so
+paths with ids do not create new series) and status code. The latency is measured until the
+response starts, so long-lived streams such as /api/news/stream count their time to first
+byte. When tracing is enabled, each request is also recorded as a server span.
+
+`render` formats the histograms plus any gauges and counters collected at scrape time from
+the existing stats (writer, stream, ticker index, storage) in the Prometheus text exposition
+format served on GET /metrics.
+"""
+import threading
+import time
+from typing import List, Dict, Any, Iterable, Tuple
+
+import tracing
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (seconds) of the request latency buckets
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative Prometheus histogram with one series per label set."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], List] = {}  # labels -> [bucket counts, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            label_text = _labels(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def render(histograms: List[Histogram], samples: List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]) -> str:
+    """
+    Prometheus text for the histograms plus `samples`, given as
+    (name, type, help, [(labels, value)]) with type "gauge" or "counter".
+    """
+    lines = []
+    for histogram in histograms:
+        lines.extend(histogram.render())
+    for name, metric_type, help_text, values in samples:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in values:
+            label_text = _labels(labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware observing request latency per route into `histogram`."""
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope: Dict[str, Any], receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+        observed = False
+        request_span = None
+
+        def observe():
+            nonlocal observed
+            if observed:
+                return
+            observed = True
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.histogram.observe((scope["method"], path, str(status["code"])), time.perf_counter() - start)
+            if request_span is not None:
+                request_span.name = f"{scope['method']} {path}"
+                request_span.attributes.update({"http.route": path, "http.status_code": status["code"]})
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                observe()
+            await send(message)
+
+        with tracing.span(scope["method"], kind=tracing.KIND_SERVER,
+                          **{"http.method": scope["method"], "http.target": scope["path"]}) as request_span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                observe()
@@ -0,0 +1,217 @@
+"""
+Local near-duplicate grouping for news articles using MinHash signatures and LSH banding.
+
+This replaces the big "group everything" LLM prompt in `group_similar_articles`. Articles are
+turned into word shingles, each shingle set is summarised with a one-permutation MinHash
+signature, and locality-sensitive hashing bands are used to find candidate pairs without
+comparing every article against every other one. Only clusters whose similarity falls in a
+configurable borderline band are left for the LLM to decide.
+"""
+import json
+import re
+import sys
+import time
+import zlib
+from typing import List, Dict, Any, Tuple
+
+from article import Article
+
+# Default grouping settings. Every value can be overridden through the agent's env vars
+# (see `grouping_config_from_env`).
+DEFAULT_GROUPING_CONFIG = {
+    "num_perm": 128,              # Signature length (number of MinHash slots)
+    "bands": 32,                  # LSH bands; rows per band = num_perm / bands
+    "shingle_size": 3,            # Words per shingle
+    "body_chars": 1500,           # Only the lead of the body is shingled
+    "similarity_threshold": 0.45, # Estimated Jaccard needed to group two articles
+    "borderline_threshold": 0.25, # Pairs between this and the threshold are "ambiguous"
+    "llm_borderline": True,       # Ask the LLM about ambiguous clusters
+    "max_llm_clusters": 5,        # Upper bound on LLM calls per run
+}
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def grouping_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the grouping config from defaults plus any MINHASH_* overrides."""
+    config = dict(DEFAULT_GROUPING_CONFIG)
+    for key, default in DEFAULT_GROUPING_CONFIG.items():
+        raw = env_vars.get(f"MINHASH_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            if isinstance(default, bool):
+                config[key] = str(raw).lower() in ("1", "true", "yes", "on")
+            else:
+                config[key] = type(default)(raw)
+        except ValueError:
+            pass
+
+    # Keep the band layout valid: rows must divide the signature evenly
+    if config["bands"] <= 0 or config["num_perm"] % config["bands"] != 0:
+        config["bands"] = DEFAULT_GROUPING_CONFIG["bands"]
+        config["num_perm"] = DEFAULT_GROUPING_CONFIG["num_perm"]
+    return config
+
+
+def article_text(article: Article, body_chars: int) -> str:
+    """Return the title plus the lead of the body, which is what gets shingled."""
+    return article.title + " " + article.body[:body_chars]
+
+
+def shingle_hashes(text: str, shingle_size: int) -> set:
+    """Hash every run of `shingle_size` normalized words into a 64-bit value."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < shingle_size:
+        words = words + [""] * (shingle_size - len(words)) if words else []
+    hashes = set()
+    for i in range(max(len(words) - shingle_size + 1, 0)):
+        crc = zlib.crc32(" ".join(words[i:i + shingle_size]).encode())
+        # Spread the 32-bit CRC over 64 bits so the top bits pick the slot
+        hashes.add((crc * _GOLDEN) & _MASK64)
+    return hashes
+
+
+def minhash_signature(hashes: set, num_perm: int) -> List[int]:
+    """
+    Compute a one-permutation MinHash signature.
+
+    Each shingle hash is hashed once: its top bits choose a slot and the remaining bits are
+    the value, keeping the minimum per slot. Empty slots are filled by rotation from the next
+    non-empty slot so that similar sets still agree slot by slot.
+    """
+    slot_bits = max(num_perm.bit_length() - 1, 1)
+    value_mask = (1 << (64 - slot_bits)) - 1
+    empty = value_mask + 1
+    signature = [empty] * num_perm
+
+    for h in hashes:
+        slot = (h >> (64 - slot_bits)) % num_perm
+        value = h & value_mask
+        if value < signature[slot]:
+            signature[slot] = value
+
+    if not hashes:
+        return signature
+
+    # Densify: an empty slot borrows from the nearest non-empty slot to its right, offset by
+    # the distance so borrowed values do not collide with real ones.
+    filled = list(signature)
+    for slot in range(num_perm):
+        if signature[slot] != empty:
+            continue
+        distance = 1
+        while signature[(slot + distance) % num_perm] == empty:
+            distance += 1
+        filled[slot] = signature[(slot + distance) % num_perm] + distance * empty
+    return filled
+
+
+def estimate_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimate Jaccard similarity as the fraction of matching signature slots."""
+    matches = sum(1 for a, b in zip(sig_a, sig_b) if a == b)
+    return matches / len(sig_a) if sig_a else 0.0
+
+
+def lsh_candidate_pairs(signatures: List[List[int]], bands: int) -> set:
+    """Return index pairs that share at least one LSH band bucket."""
+    if not signatures:
+        return set()
+    rows = len(signatures[0]) // bands
+    candidates = set()
+    for band in range(bands):
+        buckets = {}
+        start = band * rows
+        for idx, signature in enumerate(signatures):
+            key = tuple(signature[start:start + rows])
+            buckets.setdefault(key, []).append(idx)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    candidates.add((members[i], members[j]))
+    return candidates
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _union(parent: List[int], a: int, b: int):
+    root_a, root_b = _find(parent, a), _find(parent, b)
+    if root_a != root_b:
+        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def _components(size: int, pairs) -> List[List[int]]:
+    parent = list(range(size))
+    for a, b in pairs:
+        _union(parent, a, b)
+    components = {}
+    for idx in range(size):
+        components.setdefault(_find(parent, idx), []).append(idx)
+    return [members for members in components.values() if len(members) >= 2]
+
+
+def cluster_articles(articles: List[Article], config: Dict[str, Any] = None) -> Tuple[List[List[int]], List[List[int]]]:
+    """
+    Cluster articles by near-duplicate content.
+
+    Returns:
+        tuple: (confident clusters, borderline clusters) as lists of article indexes. Borderline
+        clusters only contain articles that were not already placed in a confident cluster.
+    """
+    config = config or DEFAULT_GROUPING_CONFIG
+
+    signatures = [
+        minhash_signature(
+            shingle_hashes(article_text(article, config["body_chars"]), config["shingle_size"]),
+            config["num_perm"],
+        )
+        for article in articles
+    ]
+
+    confident_pairs = []
+    borderline_pairs = []
+    for a, b in lsh_candidate_pairs(signatures, config["bands"]):
+        similarity = estimate_similarity(signatures[a], signatures[b])
+        if similarity >= config["similarity_threshold"]:
+            confident_pairs.append((a, b))
+        elif similarity >= config["borderline_threshold"]:
+            borderline_pairs.append((a, b))
+
+    confident = _components(len(articles), confident_pairs)
+
+    # Ambiguous pairs only matter for articles that did not land in a confident cluster
+    grouped = {idx for cluster in confident for idx in cluster}
+    borderline = _components(
+        len(articles),
+        [(a, b) for a, b in borderline_pairs if a not in grouped and b not in grouped],
+    )
+    return confident, borderline
+
+
+if __name__ == "__main__":
+    # Quick check against a saved EventRegistry response, e.g.
+    #   python minhash_grouping.py ../newsapi/trump_tariff_articles.json [scale]
+    path = sys.argv[1] if len(sys.argv) > 1 else "../newsapi/trump_tariff_articles.json"
+    scale = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    with open(path, "r", encoding="utf-8") as f:
+        corpus = [Article.from_api(article) for article in json.load(f)["articles"]["results"]]
+    corpus = corpus * scale
+
+    start = time.perf_counter()
+    clusters, ambiguous = cluster_articles(corpus)
+    elapsed = time.perf_counter() - start
+
+    print(f"Clustered {len(corpus)} articles in {elapsed:.3f}s")
+    print(f"{len(clusters)} confident clusters, {len(ambiguous)} borderline clusters")
+    for cluster in sorted(clusters, key=len, reverse=True)[:10]:
+        print(f"- {len(cluster)} articles: {corpus[cluster[0]].title[:80]}")
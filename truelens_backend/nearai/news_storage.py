@@ -0,0 +1,414 @@
+"""
+Storage backends for the API server.
+
+`create_storage` picks a backend from a URL:
+- "sqlite:///path/to/news.db" (default): durable SQLite database in WAL mode, with indexes on
+  payload timestamp, group sentiment, recommended ticker symbol and source.
+- "memory://": process-local lists, the server's original behaviour.
+
+Every payload is stored whole, and its article groups and trading recommendations are also
+broken out into their own indexed tables so the read endpoints can filter on them.
+
+A group with an `event_key` is a revision of an event's analysis: it replaces the stored group
+of that event (which then no longer appears in queries), and a revision that is not newer than
+the stored one is ignored, so re-analyzed events are not counted twice.
+
+SQLite reads use one connection per reading thread and do not take the write lock, so in WAL
+mode they see the last committed batch instead of waiting for a batch write and its fsync.
+"""
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import fast_json
+
+# fsync policy -> SQLite synchronous mode. In WAL mode "normal" fsyncs only at checkpoints,
+# which survives a process crash but may lose the last commits on power loss.
+SQLITE_SYNC_POLICIES = {
+    "always": "FULL",
+    "normal": "NORMAL",
+    "off": "OFF",
+}
+
+class NewsStorage:
+    """Interface implemented by every storage backend."""
+
+    def add_payloads(self, payloads: List[Dict[str, Any]], idempotency_keys: List[Optional[str]] = None) -> List[int]:
+        """
+        Store payloads in one batch and return their ids.
+
+        `idempotency_keys` (aligned with `payloads`, None for no key) are recorded in the same
+        transaction, so a key is known exactly when its payload is stored.
+        """
+        raise NotImplementedError
+
+    def has_idempotency_key(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def latest_payload(self) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def list_payloads(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def count_payloads(self) -> int:
+        raise NotImplementedError
+
+    def latest_group_id(self) -> int:
+        """Id of the newest stored article group, 0 when empty."""
+        raise NotImplementedError
+
+    def query_groups(self, before_id: int = None, limit: int = 50, since: str = None, until: str = None,
+                     sentiment: str = None, ticker: str = None, source: str = None) -> List[Dict[str, Any]]:
+        """
+        Return flattened article groups, newest first, with ids below `before_id`.
+
+        Each group carries its own "id", the "payload_id" it arrived in and the payload
+        "timestamp". `since`/`until` bound the payload timestamp (ISO strings, inclusive).
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def _flatten_group(group_id: int, payload_id: int, timestamp: str, group: Dict[str, Any]) -> Dict[str, Any]:
+    flattened = {"id": group_id, "payload_id": payload_id, "timestamp": timestamp}
+    flattened.update(group)
+    return flattened
+
+
+def _group_sources(group: Dict[str, Any]) -> set:
+    return {source.lower() for source in (group.get("sources") or []) + (group.get("original_sources") or [])}
+
+
+class MemoryNewsStorage(NewsStorage):
+    """Keeps payloads in a list; everything is lost on restart."""
+
+    def __init__(self):
+        self.payloads: List[Dict[str, Any]] = []
+        self.groups: List[Dict[str, Any]] = []
+        self.idempotency_keys = set()
+        self.event_groups: Dict[str, Dict[str, Any]] = {}  # event key -> its current group
+        self.superseded = set()  # Ids of groups replaced by a newer revision
+        self.lock = threading.Lock()
+
+    def add_payloads(self, payloads, idempotency_keys=None):
+        with self.lock:
+            self.idempotency_keys.update(key for key in idempotency_keys or [] if key)
+            ids = []
+            for payload in payloads:
+                self.payloads.append(payload)
+                payload_id = len(self.payloads)
+                ids.append(payload_id)
+                for group in payload.get("article_groups", []):
+                    key = group.get("event_key")
+                    current = self.event_groups.get(key) if key else None
+                    if current and (current.get("revision") or 0) >= (group.get("revision") or 0):
+                        continue
+                    flattened = _flatten_group(len(self.groups) + 1, payload_id, payload["timestamp"], group)
+                    self.groups.append(flattened)
+                    if key:
+                        if current:
+                            self.superseded.add(current["id"])
+                        self.event_groups[key] = flattened
+            return ids
+
+    def has_idempotency_key(self, key):
+        return key in self.idempotency_keys
+
+    def latest_payload(self):
+        with self.lock:
+            return self.payloads[-1] if self.payloads else None
+
+    def list_payloads(self):
+        with self.lock:
+            return list(self.payloads)
+
+    def count_payloads(self):
+        return len(self.payloads)
+
+    def latest_group_id(self):
+        return len(self.groups)
+
+    def query_groups(self, before_id=None, limit=50, since=None, until=None, sentiment=None, ticker=None, source=None):
+        with self.lock:
+            end = min(before_id - 1, len(self.groups)) if before_id else len(self.groups)
+            matches = []
+            for group in reversed(self.groups[:max(end, 0)]):
+                if group["id"] in self.superseded:
+                    continue
+                if since and group["timestamp"] < since:
+                    continue
+                if until and group["timestamp"] > until:
+                    continue
+                if sentiment and str(group.get("sentiment", "")).lower() != sentiment.lower():
+                    continue
+                if ticker and ticker.upper() not in {
+                    rec.get("symbol", "").upper()
+                    for action in ("buy", "sell")
+                    for rec in (group.get("trading_recommendations") or {}).get(action, [])
+                }:
+                    continue
+                if source and source.lower() not in _group_sources(group):
+                    continue
+                matches.append(group)
+                if len(matches) >= limit:
+                    break
+            return matches
+
+
+class SQLiteNewsStorage(NewsStorage):
+    """SQLite backend (WAL mode) with indexed article groups and recommendations."""
+
+    def __init__(self, path: str, fsync: str = "normal"):
+        if fsync not in SQLITE_SYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()  # Serializes writes on self.conn
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={SQLITE_SYNC_POLICIES[fsync]}")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS payloads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                received_at REAL NOT NULL,
+                body TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_payloads_timestamp ON payloads(timestamp);
+
+            CREATE TABLE IF NOT EXISTS article_groups (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload_id INTEGER NOT NULL REFERENCES payloads(id),
+                position INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                sentiment TEXT NOT NULL,
+                body TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_groups_timestamp ON article_groups(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_groups_sentiment ON article_groups(sentiment, timestamp);
+
+            CREATE TABLE IF NOT EXISTS recommendations (
+                group_id INTEGER NOT NULL REFERENCES article_groups(id),
+                symbol TEXT NOT NULL,
+                action TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_recommendations_symbol ON recommendations(symbol, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_recommendations_group ON recommendations(group_id);
+
+            CREATE TABLE IF NOT EXISTS group_sources (
+                group_id INTEGER NOT NULL REFERENCES article_groups(id),
+                source TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_group_sources_source ON group_sources(source, group_id);
+
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key TEXT PRIMARY KEY,
+                payload_id INTEGER NOT NULL REFERENCES payloads(id),
+                received_at REAL NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+        self._add_event_columns()
+        self._backfill_group_sources()
+
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's read-only connection, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def _add_event_columns(self):
+        # Databases created before event revisions were tracked lack these columns
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(article_groups)")}
+        with self.conn:
+            if "event_key" not in columns:
+                self.conn.execute("ALTER TABLE article_groups ADD COLUMN event_key TEXT")
+            if "revision" not in columns:
+                self.conn.execute("ALTER TABLE article_groups ADD COLUMN revision INTEGER")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_groups_event_key ON article_groups(event_key)")
+
+    def _backfill_group_sources(self):
+        # Databases created before group_sources existed need it filled in once
+        if self.conn.execute("SELECT 1 FROM group_sources LIMIT 1").fetchone():
+            return
+        rows = self.conn.execute("SELECT id, body FROM article_groups").fetchall()
+        with self.conn:
+            for group_id, body in rows:
+                self.conn.executemany(
+                    "INSERT INTO group_sources (group_id, source) VALUES (?, ?)",
+                    [(group_id, source) for source in _group_sources(fast_json.loads(body))],
+                )
+
+    def add_payloads(self, payloads, idempotency_keys=None):
+        now = time.time()
+        keys = idempotency_keys or [None] * len(payloads)
+        ids = []
+        with self.lock:
+            with self.conn:  # One transaction for the whole batch
+                for payload, key in zip(payloads, keys):
+                    cursor = self.conn.execute(
+                        "INSERT INTO payloads (timestamp, received_at, body) VALUES (?, ?, ?)",
+                        (payload["timestamp"], now, fast_json.dumps_text(payload)),
+                    )
+                    payload_id = cursor.lastrowid
+                    ids.append(payload_id)
+                    self._insert_groups(payload_id, payload)
+                    if key:
+                        self.conn.execute(
+                            "INSERT OR IGNORE INTO idempotency_keys (key, payload_id, received_at) VALUES (?, ?, ?)",
+                            (key, payload_id, now),
+                        )
+        return ids
+
+    def has_idempotency_key(self, key):
+        return self._reader().execute("SELECT 1 FROM idempotency_keys WHERE key = ?", (key,)).fetchone() is not None
+
+    def _insert_groups(self, payload_id: int, payload: Dict[str, Any]):
+        timestamp = payload["timestamp"]
+        for position, group in enumerate(payload.get("article_groups", [])):
+            key = group.get("event_key")
+            revision = group.get("revision") or 0
+            if key and not self._replace_event_group(key, revision):
+                continue
+            cursor = self.conn.execute(
+                "INSERT INTO article_groups (payload_id, position, timestamp, sentiment, body, event_key, revision) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    payload_id,
+                    position,
+                    timestamp,
+                    str(group.get("sentiment", "")).lower(),
+                    fast_json.dumps_text(group),
+                    key,
+                    revision if key else None,
+                ),
+            )
+            group_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO group_sources (group_id, source) VALUES (?, ?)",
+                [(group_id, source) for source in _group_sources(group)],
+            )
+            recommendations = group.get("trading_recommendations") or {}
+            self.conn.executemany(
+                "INSERT INTO recommendations (group_id, symbol, action, reason, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (group_id, rec.get("symbol", "").upper(), action, rec.get("reason", ""), timestamp)
+                    for action in ("buy", "sell")
+                    for rec in recommendations.get(action, [])
+                ],
+            )
+
+    def _replace_event_group(self, key: str, revision: int) -> bool:
+        """Delete the stored group of an event before a newer revision is inserted; False if it is not newer."""
+        row = self.conn.execute(
+            "SELECT id, COALESCE(revision, 0) FROM article_groups WHERE event_key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return True
+        if row[1] >= revision:
+            return False
+        for table in ("recommendations", "group_sources"):
+            self.conn.execute(f"DELETE FROM {table} WHERE group_id = ?", (row[0],))
+        self.conn.execute("DELETE FROM article_groups WHERE id = ?", (row[0],))
+        return True
+
+    def latest_payload(self):
+        row = self._reader().execute("SELECT body FROM payloads ORDER BY id DESC LIMIT 1").fetchone()
+        return fast_json.loads(row[0]) if row else None
+
+    def list_payloads(self):
+        rows = self._reader().execute("SELECT body FROM payloads ORDER BY id").fetchall()
+        return [fast_json.loads(row[0]) for row in rows]
+
+    def count_payloads(self):
+        return self._reader().execute("SELECT COUNT(*) FROM payloads").fetchone()[0]
+
+    def latest_group_id(self):
+        return self._reader().execute("SELECT COALESCE(MAX(id), 0) FROM article_groups").fetchone()[0]
+
+    def query_groups(self, before_id=None, limit=50, since=None, until=None, sentiment=None, ticker=None, source=None):
+        # Keyset pagination on the primary key; every filter is served by an index
+        clauses = []
+        params = []
+        if before_id:
+            clauses.append("g.id < ?")
+            params.append(before_id)
+        if since:
+            clauses.append("g.timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("g.timestamp <= ?")
+            params.append(until)
+        if sentiment:
+            clauses.append("g.sentiment = ?")
+            params.append(sentiment.lower())
+        if ticker:
+            clauses.append("g.id IN (SELECT group_id FROM recommendations WHERE symbol = ?)")
+            params.append(ticker.upper())
+        if source:
+            clauses.append("g.id IN (SELECT group_id FROM group_sources WHERE source = ?)")
+            params.append(source.lower())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        rows = self._reader().execute(
+            f"SELECT g.id, g.payload_id, g.timestamp, g.body FROM article_groups g {where} ORDER BY g.id DESC LIMIT ?",
+            params + [limit],
+        ).fetchall()
+        return [_flatten_group(row[0], row[1], row[2], fast_json.loads(row[3])) for row in rows]
+
+    def close(self):
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        with self.lock:
+            self.conn.close()
+
+
+def create_storage(url: str, fsync: str = "normal") -> NewsStorage:
+    """
+    Create a storage backend from a URL such as "sqlite:///data/news.db" or "memory://".
+
+    `fsync` ("always", "normal" or "off") sets how often SQLite forces commits to disk.
+    """
+    if url.startswith("memory://"):
+        return MemoryNewsStorage()
+    if url.startswith("sqlite:///"):
+        return SQLiteNewsStorage(url[len("sqlite:///"):], fsync)
+    raise ValueError(f"Unsupported storage URL: {url}")
+
+
+def import_legacy_files(storage: NewsStorage, directory: str = "data") -> int:
+    """Load the data/news_*.json files written by earlier versions into an empty store."""
+    if storage.count_payloads() > 0:
+        return 0
+    payloads = []
+    for path in sorted(glob.glob(os.path.join(directory, "news_*.json"))):
+        try:
+            with open(path, "r") as f:
+                payloads.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Skipping unreadable legacy file {path}: {e}")
+    if payloads:
+        storage.add_payloads(payloads)
+    return len(payloads)
@@ -0,0 +1,155 @@
+"""
+Fan-out of newly received payloads to Server-Sent Events subscribers.
+
+Each published payload is serialized once into an SSE frame and given an increasing event id.
+The frame is pushed onto every subscriber's bounded queue. When a subscriber's queue is full,
+the slow-consumer policy decides what happens: "drop_oldest" discards that subscriber's oldest
+queued frame, and "disconnect" closes the subscription so the client can reconnect and resume.
+
+The most recent frames are kept in a ring buffer so a reconnecting client that sends
+Last-Event-ID gets the frames it missed. Event ids restart with the process. An id newer than
+anything buffered (from before a restart) resumes from the newest event, and an id older than
+the buffer replays everything still buffered.
+"""
+import asyncio
+from collections import deque
+from typing import Dict, Any, Optional, Set
+
+import fast_json
+
+DEFAULT_STREAM_CONFIG = {
+    "history_size": 1000,      # Frames kept for Last-Event-ID resume
+    "queue_size": 100,         # Frames buffered per subscriber
+    "slow_policy": "drop_oldest",
+    "keepalive": 15.0,         # Seconds between keep-alive comments
+}
+
+_CLOSED = None
+
+
+def stream_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the stream config from defaults plus NEWS_STREAM_* env var overrides."""
+    config = dict(DEFAULT_STREAM_CONFIG)
+    for key, default in DEFAULT_STREAM_CONFIG.items():
+        raw = env_vars.get(f"NEWS_STREAM_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+class Subscriber:
+    """One connected client: a bounded queue of SSE frames."""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+
+
+class NewsBroadcaster:
+    """Serializes each payload once and fans it out to all subscribers."""
+
+    def __init__(self, history_size: int = 1000, queue_size: int = 100, slow_policy: str = "drop_oldest"):
+        self.history = deque(maxlen=history_size)
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy
+        self.subscribers: Set[Subscriber] = set()
+        self.last_id = 0
+        self.published = 0
+        self.dropped = 0
+        self.disconnected = 0
+
+    def publish(self, payload: Dict[str, Any], event: str = "news") -> int:
+        """Push a payload to every subscriber without blocking; returns its event id."""
+        self.last_id += 1
+        frame = f"id: {self.last_id}\nevent: {event}\ndata: {fast_json.dumps_text(payload)}\n\n"
+        self.history.append((self.last_id, frame))
+        self.published += 1
+
+        for subscriber in list(self.subscribers):
+            self._offer(subscriber, frame)
+        return self.last_id
+
+    def _offer(self, subscriber: Subscriber, frame: str):
+        if subscriber.closed:
+            return
+        try:
+            subscriber.queue.put_nowait(frame)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.slow_policy == "disconnect":
+            self._close(subscriber)
+            return
+
+        # drop_oldest: make room by discarding this subscriber's oldest frame
+        try:
+            subscriber.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        subscriber.queue.put_nowait(frame)
+        subscriber.dropped += 1
+        self.dropped += 1
+
+    def _close(self, subscriber: Subscriber):
+        subscriber.closed = True
+        self.subscribers.discard(subscriber)
+        self.disconnected += 1
+        # Wake the reader so it ends the response
+        while True:
+            try:
+                subscriber.queue.put_nowait(_CLOSED)
+                return
+            except asyncio.QueueFull:
+                subscriber.queue.get_nowait()
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscriber:
+        """Register a subscriber, queueing any buffered frames after `last_event_id`."""
+        subscriber = Subscriber(self.queue_size)
+        if last_event_id is not None and last_event_id < self.last_id:
+            for event_id, frame in self.history:
+                if event_id > last_event_id:
+                    self._offer(subscriber, frame)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.closed = True
+        self.subscribers.discard(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "last_event_id": self.last_id,
+            "published": self.published,
+            "dropped_frames": self.dropped,
+            "disconnected_slow_consumers": self.disconnected,
+        }
+
+
+async def sse_frames(broadcaster: NewsBroadcaster, subscriber: Subscriber, is_disconnected, keepalive: float = 15.0):
+    """
+    Async generator of SSE frames for one subscriber. Sends a keep-alive comment when idle
+    and stops when the client disconnects or the subscription is closed.
+    """
+    try:
+        # Tell the client how long to wait before reconnecting
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscriber.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            if frame is _CLOSED:
+                return
+            yield frame
+    finally:
+        broadcaster.unsubscribe(subscriber)
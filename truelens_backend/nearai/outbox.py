@@ -0,0 +1,205 @@
+"""
+Durable outbox for delivering analyses to the API server.
+
+Results are written to a local SQLite file in batches of `batch_size` article groups before
+their article URIs are marked as processed, so an API outage no longer loses them. Each batch
+gets an idempotency key when it is created. The key is sent as the Idempotency-Key header on
+every attempt, which lets the server drop a batch it already stored if an earlier attempt's
+response got lost. Large batch bodies are gzip-compressed.
+
+A batch stays in the outbox until the server acknowledges it with a 2xx response. Failed
+attempts are retried with jittered exponential backoff on later deliveries, and a retryable
+failure ends the current delivery so later batches are not sent to a server that is down.
+A batch the server rejects outright (a 4xx other than 408/429) is kept but marked dead, so it
+can be inspected instead of being retried forever.
+"""
+import gzip
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Callable
+
+import fast_json
+
+DEFAULT_OUTBOX_CONFIG = {
+    "path": "outbox.sqlite",
+    "batch_size": 20,            # Article groups per delivered batch
+    "compress_min_bytes": 1024,  # Bodies at least this large are sent gzip-compressed
+    "backoff_base": 5.0,         # Seconds; attempt n waits up to base * 2**n
+    "backoff_max": 600.0,
+}
+
+# 4xx responses that are worth retrying; 409 means an earlier delivery of the batch is still being stored
+RETRY_CLIENT_ERRORS = {408, 409, 429}
+
+
+def outbox_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the outbox config from defaults plus OUTBOX_* env var overrides."""
+    config = dict(DEFAULT_OUTBOX_CONFIG)
+    for key, default in DEFAULT_OUTBOX_CONFIG.items():
+        raw = env_vars.get(f"OUTBOX_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+def encode_body(payload: Dict[str, Any], compress_min_bytes: int):
+    """Serialize a payload; returns (body bytes, extra headers)."""
+    body = fast_json.dumps(payload)
+    headers = {"Content-Type": "application/json"}
+    if len(body) >= compress_min_bytes:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+class Outbox:
+    """SQLite-backed queue of payload batches waiting to be acknowledged by the API server."""
+
+    def __init__(self, path: str, batch_size: int = 20, compress_min_bytes: int = 1024,
+                 backoff_base: float = 5.0, backoff_max: float = 600.0):
+        self.path = path
+        self.batch_size = max(batch_size, 1)
+        self.compress_min_bytes = compress_min_bytes
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lock = threading.Lock()
+        self.deliver_lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS batches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                group_count INTEGER NOT NULL,
+                created REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                dead INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_batches_due ON batches(dead, next_attempt);
+            """
+        )
+        self.conn.commit()
+
+    def enqueue(self, results: List[Dict[str, Any]]) -> int:
+        """Store results as batches in one transaction; returns the number of batches."""
+        now = time.time()
+        timestamp = datetime.utcnow().isoformat()
+        chunks = [results[i:i + self.batch_size] for i in range(0, len(results), self.batch_size)]
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO batches (idempotency_key, payload, group_count, created) VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            uuid.uuid4().hex,
+                            fast_json.dumps_text({"timestamp": timestamp, "article_groups": chunk}),
+                            len(chunk),
+                            now,
+                        )
+                        for chunk in chunks
+                    ],
+                )
+        return len(chunks)
+
+    def deliver(self, send_fn: Callable, log: Callable = print) -> Dict[str, int]:
+        """
+        Try every due batch, oldest first.
+
+        `send_fn(body, headers)` posts one batch and returns the HTTP status code; it may
+        raise on connection errors. Returns counts of delivered, failed and dead batches.
+        Returns straight away if another thread is already delivering.
+        """
+        counts = {"delivered": 0, "failed": 0, "dead": 0}
+        if not self.deliver_lock.acquire(blocking=False):
+            return counts
+        try:
+            self._deliver_due(send_fn, log, counts)
+        finally:
+            self.deliver_lock.release()
+        return counts
+
+    def _deliver_due(self, send_fn: Callable, log: Callable, counts: Dict[str, int]):
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, idempotency_key, payload, group_count, attempts FROM batches "
+                "WHERE dead = 0 AND next_attempt <= ? ORDER BY id",
+                (now,),
+            ).fetchall()
+
+        for batch_id, key, payload, group_count, attempts in rows:
+            body, headers = encode_body(fast_json.loads(payload), self.compress_min_bytes)
+            headers["Idempotency-Key"] = key
+            try:
+                status = send_fn(body, headers)
+                error = None if 200 <= status < 300 else f"HTTP {status}"
+            except Exception as e:
+                status = None
+                error = str(e)
+
+            if error is None:
+                with self.lock:
+                    with self.conn:
+                        self.conn.execute("DELETE FROM batches WHERE id = ?", (batch_id,))
+                counts["delivered"] += 1
+                continue
+
+            dead = status is not None and 400 <= status < 500 and status not in RETRY_CLIENT_ERRORS
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempts)))
+            with self.lock:
+                with self.conn:
+                    self.conn.execute(
+                        "UPDATE batches SET attempts = attempts + 1, next_attempt = ?, last_error = ?, dead = ? WHERE id = ?",
+                        (time.time() + delay, error, int(dead), batch_id),
+                    )
+            if dead:
+                counts["dead"] += 1
+                log(f"Outbox: batch {key} of {group_count} groups was rejected ({error}), keeping it as dead")
+            else:
+                counts["failed"] += 1
+                log(f"Outbox: batch {key} of {group_count} groups failed ({error}), retrying in {delay:.0f}s")
+                # The server is unreachable or unhealthy, leave the later batches for the next delivery
+                break
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            pending, dead = self.conn.execute(
+                "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM batches"
+            ).fetchone()
+        return {"pending": pending, "dead": dead}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_outboxes: Dict[str, Outbox] = {}
+_outboxes_lock = threading.Lock()
+
+
+def get_outbox(config: Dict[str, Any]) -> Outbox:
+    """Return the process-wide outbox for a config's path."""
+    with _outboxes_lock:
+        outbox = _outboxes.get(config["path"])
+        if outbox is None:
+            outbox = _outboxes[config["path"]] = Outbox(
+                config["path"],
+                batch_size=config["batch_size"],
+                compress_min_bytes=config["compress_min_bytes"],
+                backoff_base=config["backoff_base"],
+                backoff_max=config["backoff_max"],
+            )
+        return outbox
@@ -0,0 +1,488 @@
+"""
+Offline replay benchmark for the full agent pipeline.
+
+Runs the real `agent.run` against local stand-ins, so no network or model is needed:
+
+- A local HTTP server replays recorded EventRegistry responses as the minute stream
+  (JSONP, paged by `recentActivityArticlesUpdatesAfterTm` like the real API) and plays the
+  API server's `POST /api/news`, decompressing and counting the delivered groups.
+- The corpus is scaled up from the recorded articles: every extra copy gets new URIs and
+  event URIs, and a consistent share of its words is rewritten, so copies form their own
+  events instead of merging with the originals.
+- The LLM is a `MockEnvironment` completion with configurable latency, exceptions and
+  unparseable replies.
+- With `--feeds N`, N feeds are declared; they all stream the same corpus, which exercises the
+  concurrent fan-out and the cross-feed de-duplication.
+
+Every stage function of the agent is timed (fetch, dedup, grouping, analysis, queue, send),
+along with peak memory and articles per second. Groups whose analysis failed or timed out are
+counted, and an exception that aborts the run is reported instead of ending the benchmark. Results can be saved as a baseline and later
+runs compared against it; the exit code is 1 when a metric regressed beyond the tolerance.
+
+Usage:
+    python pipeline_bench.py --articles 2000 --llm-latency 0.05 --save-baseline bench_baseline.json
+    python pipeline_bench.py --articles 2000 --llm-latency 0.05 --baseline bench_baseline.json
+    python pipeline_bench.py --articles 2000 --llm-failure-rate 0.2 --llm-garbage-rate 0.1
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any
+from urllib.parse import urlsplit, parse_qs
+
+import agent
+from debug_agent import MockEnvironment
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "newsapi", "trump_tariff_articles.json")
+
+# Agent functions timed as pipeline stages; nested stages are subtracted from their parent
+STAGES = {
+    "fetch": "iter_feed_articles",
+    "dedup": "split_event_groups",
+    "grouping": "group_similar_articles",
+    "analysis": "process_concurrently",
+    "queue": "queue_results",
+    "send": "deliver_outbox",
+}
+
+# Seconds a stage may grow by before its relative change counts as a regression
+NOISE_FLOOR = 0.05
+
+
+def load_recorded_articles(paths: List[str]) -> List[Dict]:
+    """Articles of recorded EventRegistry responses: article search results or minute stream pages."""
+    articles = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            text = f.read().strip()
+        if text.startswith("JSON_CALLBACK(") and text.endswith(")"):
+            text = text[len("JSON_CALLBACK("):-1]
+        data = json.loads(text)
+        if "recentActivityArticles" in data:
+            articles.extend(data["recentActivityArticles"].get("activity", []))
+        else:
+            articles.extend(data.get("articles", {}).get("results", []))
+    return [article for article in articles if article.get("title") and article.get("body") and article.get("uri")]
+
+
+def _rewrite(text: str, copy: int, mutation: float) -> str:
+    """Rewrite a consistent share of the words for one copy of the corpus."""
+    words = text.split(" ")
+    for i, word in enumerate(words):
+        if word and zlib.crc32(f"{copy}:{word.lower()}".encode("utf-8")) % 1000 < mutation * 1000:
+            words[i] = f"{word}{copy}"
+    return " ".join(words)
+
+
+def scale_corpus(base: List[Dict], count: int, mutation: float) -> List[Dict]:
+    """Derive `count` articles from `base`, with unique, increasing timestamps."""
+    start = datetime.utcnow() - timedelta(seconds=count)
+    articles = []
+    for i in range(count):
+        copy, original = divmod(i, len(base))
+        article = dict(base[original])
+        if copy:
+            article["uri"] = f"{article['uri']}-{copy}"
+            if article.get("eventUri"):
+                article["eventUri"] = f"{article['eventUri']}-{copy}"
+            article["title"] = _rewrite(article["title"], copy, mutation)
+            article["body"] = _rewrite(article["body"], copy, mutation)
+        article["dateTime"] = (start + timedelta(seconds=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        articles.append(article)
+    return articles
+
+
+class StandIn:
+    """Local HTTP server playing EventRegistry's minute stream and the API server's /api/news."""
+
+    def __init__(self, articles: List[Dict], api_failure_rate: float = 0.0, seed: int = 0):
+        self.articles = articles
+        self.times = [article["dateTime"] for article in articles]
+        self.api_failure_rate = api_failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.pages_served = 0
+        self.batches = 0
+        self.groups = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.bytes_received = 0
+        self.keys = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def page(self, query: Dict[str, List[str]]) -> bytes:
+        after = query.get("recentActivityArticlesUpdatesAfterTm", [""])[0]
+        count = int(query.get("recentActivityArticlesMaxArticleCount", ["100"])[0])
+        start = bisect_right(self.times, after) if after else 0
+        with self.lock:
+            self.pages_served += 1
+        body = json.dumps({"recentActivityArticles": {"activity": self.articles[start:start + count]}})
+        return f"JSON_CALLBACK({body})".encode("utf-8")
+
+    def receive(self, body: bytes, headers) -> int:
+        if headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        payload = json.loads(body)
+        with self.lock:
+            if self.rng.random() < self.api_failure_rate:
+                self.rejected += 1
+                return 503
+            key = headers.get("Idempotency-Key")
+            if key in self.keys:
+                self.duplicates += 1
+                return 200
+            self.keys.add(key)
+            self.batches += 1
+            self.groups += len(payload.get("article_groups", []))
+            self.bytes_received += len(body)
+        return 200
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if not url.path.endswith("/minuteStreamArticles"):
+                    self.send_error(404)
+                    return
+                body = stand_in.page(parse_qs(url.query))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/javascript")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status = stand_in.receive(body, self.headers)
+                reply = json.dumps({"status": "success" if status == 200 else "error"}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class BenchEnvironment(MockEnvironment):
+    """Quiet MockEnvironment whose completions sleep, fail or return garbage on demand."""
+
+    def __init__(self, llm_latency: float, llm_failure_rate: float, llm_garbage_rate: float,
+                 seed: int, verbose: bool = False):
+        super().__init__()
+        self.llm_latency = llm_latency
+        self.llm_failure_rate = llm_failure_rate
+        self.llm_garbage_rate = llm_garbage_rate
+        self.rng = random.Random(seed)
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.completions = 0
+        self.failures = 0
+        self.garbage = 0
+
+    def add_system_log(self, message):
+        if self.verbose:
+            print(f"SYSTEM LOG: {message}")
+
+    def add_reply(self, message):
+        self.replies.append(message)
+
+    def request_user_input(self):
+        pass
+
+    def write_file(self, filename, content):
+        self.files[filename] = content
+
+    def completion(self, messages):
+        with self.lock:
+            self.completions += 1
+            roll = self.rng.random()
+            latency = self.llm_latency * self.rng.uniform(0.5, 1.5)
+        time.sleep(latency)
+        if roll < self.llm_failure_rate:
+            with self.lock:
+                self.failures += 1
+            raise RuntimeError("injected completion failure")
+        if roll < self.llm_failure_rate + self.llm_garbage_rate:
+            with self.lock:
+                self.garbage += 1
+            return "I am unable to produce JSON for this request."
+
+        prompt = messages[-1]["content"]
+        if "Group these news articles by similarity" in prompt:
+            return "[[0, 1]]"
+        symbol = "ABCDEFGHIJ"[zlib.crc32(prompt.encode("utf-8")) % 10] * 3
+        return json.dumps({
+            "summary": "Benchmark summary of the articles. " * 5,
+            "sentiment": "positive" if zlib.crc32(prompt[:200].encode("utf-8")) % 2 else "negative",
+            "sentiment_explanation": "Benchmark sentiment.",
+            "trading_recommendations": {"buy": [{"symbol": symbol, "reason": "Benchmark"}], "sell": []},
+            "sources": ["Benchmark"],
+        })
+
+
+class StageTimer:
+    """Wall time (exclusive of nested stages) and optional traced peak memory per stage."""
+
+    def __init__(self, trace_memory: bool):
+        self.trace_memory = trace_memory
+        self.seconds: Dict[str, float] = {}
+        self.peak_mb: Dict[str, float] = {}
+        self.stack: List[List] = []  # [stage, start, seconds spent in nested stages]
+
+    @contextmanager
+    def measure(self, stage: str):
+        if self.trace_memory and not self.stack:
+            tracemalloc.reset_peak()
+        frame = [stage, time.perf_counter(), 0.0]
+        self.stack.append(frame)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed - frame[2]
+            if self.stack:
+                self.stack[-1][2] += elapsed
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                self.peak_mb[stage] = max(self.peak_mb.get(stage, 0.0), peak)
+
+    def wrap(self, stage: str, fn):
+        """Time calls made from the main thread (nested calls from worker threads are part of their stage)."""
+        def timed(*args, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                return fn(*args, **kwargs)
+            with self.measure(stage):
+                return fn(*args, **kwargs)
+        return timed
+
+    def wrap_iter(self, stage: str, fn):
+        """Time the work done inside a generator, one item at a time."""
+        def timed(*args, **kwargs):
+            iterator = fn(*args, **kwargs)
+            while True:
+                with self.measure(stage):
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                yield item
+        return timed
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    base = load_recorded_articles(args.corpus)
+    if not base:
+        raise SystemExit("The corpus contains no articles with a title, body and uri")
+    articles = scale_corpus(base, args.articles, args.mutation)
+
+    workdir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    env = BenchEnvironment(args.llm_latency, args.llm_failure_rate, args.llm_garbage_rate, args.seed, args.verbose)
+    timer = StageTimer(args.tracemalloc)
+    originals = {name: getattr(agent, name) for name in STAGES.values()}
+    groups = {"analyzed": 0, "failed": 0}
+    error = None
+
+    def count_groups(fn):
+        # Group analysis runs from the main thread; map-reduce chunks from worker threads are not groups
+        def counted(*args, **kwargs):
+            outcomes = fn(*args, **kwargs)
+            if threading.current_thread() is threading.main_thread():
+                groups["analyzed"] += len(outcomes)
+                groups["failed"] += sum(1 for outcome in outcomes if not outcome["ok"])
+            return outcomes
+        return counted
+
+    with StandIn(articles, args.api_failure_rate, args.seed) as stand_in:
+        env.env_vars.update({
+            "EVENT_REGISTRY_BASE_URL": stand_in.url,
+            "API_ENDPOINT": f"{stand_in.url}/api/news",
+            "FETCH_MODE": "incremental",
+            "STREAM_PAGE_SIZE": str(args.page_size),
+            "STREAM_MAX_PAGES": str(len(articles) // args.page_size + 2),
+            "LLM_CONCURRENCY": str(args.workers),
+            "HTTP_BACKOFF_BASE": "0.01",
+            "SEEN_INDEX_PATH": os.path.join(workdir, "processed_articles.log"),
+            "OUTBOX_PATH": os.path.join(workdir, "outbox.sqlite"),
+            "VECTOR_INDEX_PATH": os.path.join(workdir, "vector_index.npz"),
+            "EVENT_STORE_PATH": os.path.join(workdir, "event_store.sqlite"),
+            "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite"),
+        })
+        if args.feeds > 1:
+            # The stand-in ignores the query, so every feed streams the same articles
+            env.env_vars["FEEDS"] = json.dumps([
+                dict(agent.DEFAULT_FEED, name=f"feed-{i}") for i in range(args.feeds)
+            ])
+        env.env_vars.update(dict(pair.split("=", 1) for pair in args.env))
+
+        for stage, name in STAGES.items():
+            wrap = timer.wrap_iter if stage == "fetch" else timer.wrap
+            fn = count_groups(originals[name]) if stage == "analysis" else originals[name]
+            setattr(agent, name, wrap(stage, fn))
+        if args.tracemalloc:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            agent.run(env)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            total = time.perf_counter() - start
+            for name, fn in originals.items():
+                setattr(agent, name, fn)
+            if args.tracemalloc:
+                tracemalloc.stop()
+
+        return {
+            "scenario": {
+                "articles": len(articles),
+                "corpus_articles": len(base),
+                "llm_latency": args.llm_latency,
+                "llm_failure_rate": args.llm_failure_rate,
+                "llm_garbage_rate": args.llm_garbage_rate,
+                "api_failure_rate": args.api_failure_rate,
+                "workers": args.workers,
+                "feeds": args.feeds,
+                "seed": args.seed,
+            },
+            "stages": {stage: round(timer.seconds.get(stage, 0.0), 4) for stage in STAGES},
+            "stage_peak_mb": {stage: round(mb, 1) for stage, mb in timer.peak_mb.items()},
+            "total_seconds": round(total, 4),
+            "articles_per_sec": round(len(articles) / total, 1) if total else 0.0,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "llm": {"completions": env.completions, "failures": env.failures, "garbage": env.garbage},
+            "groups": groups,
+            "error": error,
+            "api": {
+                "pages_served": stand_in.pages_served,
+                "batches": stand_in.batches,
+                "groups": stand_in.groups,
+                "duplicates": stand_in.duplicates,
+                "rejected": stand_in.rejected,
+                "bytes": stand_in.bytes_received,
+            },
+            "workdir": workdir,
+        }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every metric that is more than `tolerance` worse than the baseline."""
+    regressions = []
+    for stage, seconds in result["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if before is not None and seconds > before * (1 + tolerance) and seconds - before > NOISE_FLOOR:
+            regressions.append(f"{stage}: {before:.3f}s -> {seconds:.3f}s")
+    before = baseline.get("articles_per_sec")
+    if before and result["articles_per_sec"] < before * (1 - tolerance):
+        regressions.append(f"articles/sec: {before} -> {result['articles_per_sec']}")
+    before = baseline.get("peak_rss_mb")
+    if before and result["peak_rss_mb"] > before * (1 + tolerance):
+        regressions.append(f"peak RSS: {before} MB -> {result['peak_rss_mb']} MB")
+    return regressions
+
+
+def print_report(result: Dict[str, Any], baseline: Dict[str, Any] = None):
+    scenario = result["scenario"]
+    print(f"Articles: {scenario['articles']} (from {scenario['corpus_articles']} recorded), "
+          f"LLM latency {scenario['llm_latency']}s, {scenario['workers']} workers")
+    print(f"{'stage':<10} {'seconds':>9} {'share':>7} {'baseline':>9} {'peak MB':>8}")
+    total = result["total_seconds"] or 1.0
+    for stage, seconds in result["stages"].items():
+        before = (baseline or {}).get("stages", {}).get(stage)
+        peak = result["stage_peak_mb"].get(stage)
+        print(f"{stage:<10} {seconds:>9.3f} {seconds / total:>7.1%} "
+              f"{before if before is not None else '-':>9} {peak if peak is not None else '-':>8}")
+    print(f"Total: {result['total_seconds']:.3f}s, {result['articles_per_sec']} articles/sec, "
+          f"peak RSS {result['peak_rss_mb']} MB")
+    print(f"LLM: {result['llm']}")
+    print(f"Groups: {result['groups']['analyzed']} analyzed, {result['groups']['failed']} failed")
+    print(f"API: {result['api']}")
+    if result["error"]:
+        print(f"The run was aborted: {result['error']}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--corpus", action="append", help="Recorded EventRegistry response (repeatable)")
+    parser.add_argument("--articles", type=int, default=1000, help="Articles in the scaled corpus")
+    parser.add_argument("--mutation", type=float, default=0.5, help="Share of words rewritten per corpus copy")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4, help="LLM_CONCURRENCY")
+    parser.add_argument("--feeds", type=int, default=1, help="Feeds polled concurrently, all serving the corpus")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Mean seconds per completion")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="Share of completions that raise")
+    parser.add_argument("--llm-garbage-rate", type=float, default=0.0, help="Share of completions without JSON")
+    parser.add_argument("--api-failure-rate", type=float, default=0.0, help="Share of deliveries answered with 503")
+    parser.add_argument("--env", action="append", default=[], help="Extra agent env var, KEY=VALUE (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="Trace peak memory per stage (slower)")
+    parser.add_argument("--baseline", help="Compare against this baseline file")
+    parser.add_argument("--save-baseline", help="Write the result to this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="Print the agent's system log")
+    args = parser.parse_args(argv)
+    args.corpus = args.corpus or [DEFAULT_CORPUS]
+
+    result = run_benchmark(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scenario") != result["scenario"]:
+            print("Warning: the baseline was recorded with a different scenario")
+    print_report(result, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({key: value for key, value in result.items() if key != "workdir"}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if result["error"]:
+        return 1
+    if baseline:
+        regressions = compare(result, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+Token-budget-aware packing of article bodies into the group analysis prompt.
+
+Large event groups used to send every body in full, and wire copy syndicated by several
+sources was sent once per source. Bodies are now split into paragraphs and packed in three
+steps:
+
+1. Near-identical paragraphs (word-shingle Jaccard similarity at or above
+   `duplicate_threshold`) are sent only once, from the first source that has them.
+2. If the rest still exceeds `max_tokens`, paragraphs are picked greedily by novelty: the
+   number of their shingles not yet covered by the picked paragraphs, per token, with a
+   bonus for paragraphs near the top of an article. Each pick lowers the novelty of
+   paragraphs that repeat it.
+3. The picked paragraphs are put back in their article's original order.
+
+Tokens are counted with `tiktoken` when it is installed, otherwise estimated from the
+character count. Totals of the tokens saved are kept per process (`packing_totals`).
+
+Groups too large even after de-duplication are split into chunks (`chunk_bodies`) for
+map-reduce summarization instead of being cut down to one prompt.
+"""
+import heapq
+import re
+import threading
+import zlib
+from typing import List, Dict, Any, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_PROMPT_BUDGET_CONFIG = {
+    "enabled": True,
+    "max_tokens": 6000,            # Tokens of article titles and bodies per prompt
+    "duplicate_threshold": 0.8,    # Shingle Jaccard at which two paragraphs are the same
+    "shingle_size": 3,             # Words per shingle
+    "position_decay": 0.15,        # Novelty bonus of early paragraphs: 1 / (1 + decay * position)
+    "encoding": "cl100k_base",     # tiktoken encoding used for counting
+}
+
+CHARS_PER_TOKEN = 4  # Estimate used when tiktoken is not installed
+
+_WORD_RE = re.compile(r"\w+")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n|\n")
+
+_encoders: Dict[str, Any] = {}
+_totals = {"groups": 0, "tokens_full": 0, "tokens_packed": 0, "duplicate_paragraphs": 0, "dropped_paragraphs": 0}
+_totals_lock = threading.Lock()
+
+
+def prompt_budget_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the packing config from defaults plus PROMPT_BUDGET_* env var overrides."""
+    config = dict(DEFAULT_PROMPT_BUDGET_CONFIG)
+    for key, default in DEFAULT_PROMPT_BUDGET_CONFIG.items():
+        raw = env_vars.get(f"PROMPT_BUDGET_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            if isinstance(default, bool):
+                config[key] = str(raw).lower() in ("1", "true", "yes", "on")
+            else:
+                config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+def count_tokens(text: str, encoding: str = "cl100k_base") -> int:
+    """Tokens in `text` with tiktoken, or an estimate from its length without it."""
+    if tiktoken is not None:
+        encoder = _encoders.get(encoding)
+        if encoder is None:
+            try:
+                encoder = _encoders[encoding] = tiktoken.get_encoding(encoding)
+            except Exception:
+                # Unknown encoding or no way to fetch it, fall back to the estimate from now on
+                encoder = _encoders[encoding] = False
+        if encoder:
+            return len(encoder.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_paragraphs(body: str) -> List[str]:
+    return [paragraph.strip() for paragraph in _PARAGRAPH_RE.split(body) if paragraph.strip()]
+
+
+def paragraph_shingles(text: str, shingle_size: int) -> set:
+    """Hashed word shingles of a paragraph; short paragraphs are one shingle of all their words."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= shingle_size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + shingle_size]).encode("utf-8"))
+        for i in range(len(words) - shingle_size + 1)
+    }
+
+
+class _Paragraph:
+    __slots__ = ("article", "position", "text", "shingles", "tokens")
+
+    def __init__(self, article: int, position: int, text: str, shingles: set, tokens: int):
+        self.article = article
+        self.position = position
+        self.text = text
+        self.shingles = shingles
+        self.tokens = tokens
+
+
+def _unique_paragraphs(bodies: List[str], config: Dict[str, Any]) -> Tuple[List[_Paragraph], int]:
+    """Paragraphs of all bodies with near-duplicates of earlier ones removed; returns (kept, duplicates)."""
+    threshold = config["duplicate_threshold"]
+    kept: List[_Paragraph] = []
+    postings: Dict[int, List[int]] = {}  # shingle -> indexes of kept paragraphs containing it
+    duplicates = 0
+    for article, body in enumerate(bodies):
+        for position, text in enumerate(split_paragraphs(body)):
+            shingles = paragraph_shingles(text, config["shingle_size"])
+            overlaps: Dict[int, int] = {}
+            for shingle in shingles:
+                for idx in postings.get(shingle, ()):
+                    overlaps[idx] = overlaps.get(idx, 0) + 1
+            if any(
+                count / (len(shingles) + len(kept[idx].shingles) - count) >= threshold
+                for idx, count in overlaps.items()
+            ):
+                duplicates += 1
+                continue
+            for shingle in shingles:
+                postings.setdefault(shingle, []).append(len(kept))
+            kept.append(_Paragraph(article, position, text, shingles, count_tokens(text, config["encoding"])))
+    return kept, duplicates
+
+
+def _select_novel(paragraphs: List[_Paragraph], budget: int, position_decay: float) -> List[_Paragraph]:
+    """Greedily pick the paragraphs adding the most uncovered shingles per token within the budget."""
+    def score(paragraph: _Paragraph, covered: set) -> float:
+        novel = len(paragraph.shingles - covered)
+        return novel / max(paragraph.tokens, 1) / (1 + position_decay * paragraph.position)
+
+    covered: set = set()
+    # Scores only go down as coverage grows, so a stale heap entry is an upper bound (lazy greedy)
+    heap = [(-score(p, covered), idx) for idx, p in enumerate(paragraphs)]
+    heapq.heapify(heap)
+    selected = []
+    remaining = budget
+    while heap and remaining > 0:
+        _, idx = heapq.heappop(heap)
+        paragraph = paragraphs[idx]
+        if paragraph.tokens > remaining:
+            continue
+        current = score(paragraph, covered)
+        if heap and current < -heap[0][0]:
+            heapq.heappush(heap, (-current, idx))
+            continue
+        if current <= 0:
+            break
+        selected.append(paragraph)
+        covered |= paragraph.shingles
+        remaining -= paragraph.tokens
+    return selected
+
+
+def pack_bodies(titles: List[str], bodies: List[str], config: Dict[str, Any]) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Shrink article bodies to fit the token budget of one prompt.
+
+    Returns the packed bodies (same order as `bodies`, possibly empty strings) and stats with
+    the token counts before and after packing.
+    """
+    encoding = config["encoding"]
+    title_tokens = sum(count_tokens(title, encoding) for title in titles)
+    tokens_full = title_tokens + sum(count_tokens(body, encoding) for body in bodies)
+
+    paragraphs, duplicates = _unique_paragraphs(bodies, config)
+    budget = max(config["max_tokens"] - title_tokens, 0)
+    selected = paragraphs
+    if sum(paragraph.tokens for paragraph in paragraphs) > budget:
+        selected = _select_novel(paragraphs, budget, config["position_decay"])
+
+    stats = _packing_stats(tokens_full, title_tokens, paragraphs, selected, duplicates)
+    stats["tokens_unique"] = title_tokens + sum(paragraph.tokens for paragraph in paragraphs)
+    return _join_bodies(len(bodies), selected), stats
+
+
+def chunk_bodies(titles: List[str], bodies: List[str], config: Dict[str, Any],
+                 chunk_tokens: int) -> Tuple[List[Tuple[List[int], List[str]]], Dict[str, int]]:
+    """
+    Split a group too large for one prompt into chunks of at most `chunk_tokens` tokens.
+
+    Near-duplicate paragraphs are removed across the whole group first, then whole articles are
+    put into chunks in order; an article that alone exceeds a chunk is cut down by novelty.
+    Returns [(article indexes, their packed bodies)] per chunk, plus packing stats.
+    """
+    encoding = config["encoding"]
+    title_tokens = [count_tokens(title, encoding) for title in titles]
+    tokens_full = sum(title_tokens) + sum(count_tokens(body, encoding) for body in bodies)
+
+    paragraphs, duplicates = _unique_paragraphs(bodies, config)
+    by_article: List[List[_Paragraph]] = [[] for _ in bodies]
+    for paragraph in paragraphs:
+        by_article[paragraph.article].append(paragraph)
+
+    chunks: List[List[int]] = []
+    chunk_size = chunk_tokens  # Forces a new chunk for the first article
+    selected: List[_Paragraph] = []
+    for article, article_paragraphs in enumerate(by_article):
+        budget = max(chunk_tokens - title_tokens[article], 0)
+        if sum(paragraph.tokens for paragraph in article_paragraphs) > budget:
+            article_paragraphs = _select_novel(article_paragraphs, budget, config["position_decay"])
+        size = title_tokens[article] + sum(paragraph.tokens for paragraph in article_paragraphs)
+        if chunk_size + size > chunk_tokens:
+            chunks.append([])
+            chunk_size = 0
+        chunks[-1].append(article)
+        chunk_size += size
+        selected.extend(article_paragraphs)
+
+    packed_bodies = _join_bodies(len(bodies), selected)
+    stats = _packing_stats(tokens_full, sum(title_tokens), paragraphs, selected, duplicates)
+    stats["chunks"] = len(chunks)
+    return [(chunk, [packed_bodies[article] for article in chunk]) for chunk in chunks], stats
+
+
+def _join_bodies(count: int, selected: List[_Paragraph]) -> List[str]:
+    """Rebuild each article's body from its selected paragraphs, in their original order."""
+    packed = [[] for _ in range(count)]
+    for paragraph in sorted(selected, key=lambda paragraph: (paragraph.article, paragraph.position)):
+        packed[paragraph.article].append(paragraph.text)
+    return ["\n\n".join(texts) for texts in packed]
+
+
+def _packing_stats(tokens_full: int, title_tokens: int, paragraphs: List[_Paragraph],
+                   selected: List[_Paragraph], duplicates: int) -> Dict[str, int]:
+    stats = {
+        "tokens_full": tokens_full,
+        "tokens_packed": title_tokens + sum(paragraph.tokens for paragraph in selected),
+        "duplicate_paragraphs": duplicates,
+        "dropped_paragraphs": len(paragraphs) - len(selected),
+    }
+    stats["tokens_saved"] = stats["tokens_full"] - stats["tokens_packed"]
+    return stats
+
+
+def record_packing(stats: Dict[str, int]):
+    """Add the stats of the packing a group was sent with to the process totals."""
+    with _totals_lock:
+        _totals["groups"] += 1
+        for key in ("tokens_full", "tokens_packed", "duplicate_paragraphs", "dropped_paragraphs"):
+            _totals[key] += stats[key]
+
+
+def packing_totals() -> Dict[str, int]:
+    """Packing counters summed over every group of this process."""
+    with _totals_lock:
+        totals = dict(_totals)
+    totals["tokens_saved"] = totals["tokens_full"] - totals["tokens_packed"]
+    return totals
@@ -0,0 +1,225 @@
+"""
+Index of article URIs the agent has already processed.
+
+Recent URIs live in a dict (URI -> last seen timestamp) for O(1) membership and expire after a
+configurable TTL rather than a fixed count. Expired URIs can be handed to an optional Bloom
+filter tier, which remembers millions of URIs in a few MB at a small false-positive rate.
+
+On disk the exact tier is an append-only log with one "<timestamp>\t<uri>" line per addition.
+Each run only appends its new URIs, and the log is compacted (rewritten with live entries only)
+once it holds too many stale lines. A last line torn by a crash is ignored on load and cut off
+before the next append, so it cannot swallow the first URI written after it.
+"""
+import hashlib
+import math
+import os
+import time
+from typing import Iterable, Dict, Any
+
+DEFAULT_SEEN_INDEX_CONFIG = {
+    "path": "processed_articles.log",
+    "ttl_days": 14.0,               # Exact-tier retention
+    "bloom_capacity": 1000000,      # URIs the Bloom tier is sized for, 0 disables it
+    "bloom_error_rate": 0.001,
+    "compact_ratio": 2.0,           # Compact when log lines exceed live entries by this factor
+}
+
+
+def seen_index_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the seen-index config from defaults plus SEEN_INDEX_* env var overrides."""
+    config = dict(DEFAULT_SEEN_INDEX_CONFIG)
+    for key, default in DEFAULT_SEEN_INDEX_CONFIG.items():
+        raw = env_vars.get(f"SEEN_INDEX_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over a blake2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.num_bits = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.num_hashes = max(int(round(self.num_bits / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.num_bits.to_bytes(8, "little"))
+            f.write(self.num_hashes.to_bytes(4, "little"))
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """Load saved bits if the file matches this filter's layout."""
+        try:
+            with open(path, "rb") as f:
+                num_bits = int.from_bytes(f.read(8), "little")
+                num_hashes = int.from_bytes(f.read(4), "little")
+                bits = f.read()
+        except OSError:
+            return False
+        if num_bits != self.num_bits or num_hashes != self.num_hashes or len(bits) != len(self.bits):
+            return False
+        self.bits = bytearray(bits)
+        return True
+
+
+class SeenIndex:
+    """Set of processed article URIs with time-based expiry and incremental persistence."""
+
+    def __init__(self, path: str, ttl_days: float = 14.0, bloom_capacity: int = 0,
+                 bloom_error_rate: float = 0.001, compact_ratio: float = 2.0):
+        self.path = path
+        self.bloom_path = path + ".bloom"
+        self.ttl = ttl_days * 86400
+        self.compact_ratio = compact_ratio
+        self.entries: Dict[str, float] = {}
+        self.pending: Dict[str, float] = {}
+        self.log_lines = 0
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate) if bloom_capacity > 0 else None
+        self.bloom_dirty = False
+
+    def __contains__(self, uri: str) -> bool:
+        if uri in self.entries:
+            return True
+        return self.bloom is not None and uri in self.bloom
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, uri: str, timestamp: float = None):
+        """Mark a URI as processed. It is written to disk on the next `flush`."""
+        if not uri:
+            return
+        timestamp = timestamp or time.time()
+        self.entries[uri] = timestamp
+        self.pending[uri] = timestamp
+
+    def update(self, uris: Iterable[str]):
+        now = time.time()
+        for uri in uris:
+            self.add(uri, now)
+
+    def load(self) -> "SeenIndex":
+        """Read the log and Bloom tier from disk, expiring old entries."""
+        if self.bloom is not None:
+            self.bloom.load(self.bloom_path)
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self.log_lines += 1
+                    if not line.endswith("\n"):
+                        continue  # Torn write from a crash; cut off by the next flush
+                    timestamp, _, uri = line.rstrip("\n").partition("\t")
+                    try:
+                        self.entries[uri] = max(float(timestamp), self.entries.get(uri, 0.0))
+                    except ValueError:
+                        continue  # Torn write from a crash; skip the line
+        except FileNotFoundError:
+            pass
+
+        self.expire()
+        if self.needs_compaction():
+            self.compact()
+        return self
+
+    def expire(self, now: float = None) -> int:
+        """Move entries older than the TTL out of the exact tier (into the Bloom tier if enabled)."""
+        cutoff = (now or time.time()) - self.ttl
+        expired = [uri for uri, timestamp in self.entries.items() if timestamp < cutoff]
+        for uri in expired:
+            del self.entries[uri]
+            self.pending.pop(uri, None)
+            if self.bloom is not None:
+                self.bloom.add(uri)
+                self.bloom_dirty = True
+        return len(expired)
+
+    def needs_compaction(self) -> bool:
+        return self.log_lines > max(len(self.entries), 1) * self.compact_ratio
+
+    def repair_tail(self):
+        """Truncate the log back to its last newline, dropping a line torn by a crash."""
+        try:
+            with open(self.path, "r+b") as f:
+                end = f.seek(0, os.SEEK_END)
+                position = end
+                while position > 0:
+                    start = max(position - 4096, 0)
+                    f.seek(start)
+                    chunk = f.read(position - start)
+                    newline = chunk.rfind(b"\n")
+                    if newline >= 0:
+                        position = start + newline + 1
+                        break
+                    position = start
+                if position < end:
+                    f.truncate(position)
+                    f.flush()
+                    os.fsync(f.fileno())
+        except FileNotFoundError:
+            pass
+
+    def flush(self):
+        """Append the URIs added since the last flush, compacting the log when it is bloated."""
+        if self.pending:
+            self.repair_tail()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(f"{timestamp:.0f}\t{uri}\n" for uri, timestamp in self.pending.items())
+                f.flush()
+                os.fsync(f.fileno())
+            self.log_lines += len(self.pending)
+            self.pending = {}
+
+        if self.needs_compaction():
+            self.compact()
+        elif self.bloom_dirty:
+            self.bloom.save(self.bloom_path)
+            self.bloom_dirty = False
+
+    def compact(self):
+        """Rewrite the log with only the live entries."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{timestamp:.0f}\t{uri}\n" for uri, timestamp in self.entries.items())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.log_lines = len(self.entries)
+        self.pending = {}
+
+        if self.bloom is not None and self.bloom_dirty:
+            self.bloom.save(self.bloom_path)
+            self.bloom_dirty = False
+
+
+def open_seen_index(config: Dict[str, Any]) -> SeenIndex:
+    """Create a SeenIndex from a config dict and load it from disk."""
+    return SeenIndex(
+        config["path"],
+        config["ttl_days"],
+        config["bloom_capacity"],
+        config["bloom_error_rate"],
+        config["compact_ratio"],
+    ).load()
@@ -0,0 +1,95 @@
+"""
+Load test for the /api/news/stream fan-out.
+
+Runs the broadcaster in-process with many simulated subscribers, publishes a series of
+payloads, and reports how long each payload took to reach every subscriber.
+
+Usage:
+    python stream_loadtest.py [subscribers] [events] [slow_fraction]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from news_stream import NewsBroadcaster, sse_frames
+
+SAMPLE_PAYLOAD = {
+    "timestamp": "2025-01-01T00:00:00",
+    "article_groups": [
+        {
+            "summary": "Load test summary " * 20,
+            "sentiment": "neutral",
+            "sentiment_explanation": "Load test",
+            "trading_recommendations": {"buy": [{"symbol": "AAPL", "reason": "test"}], "sell": []},
+            "sources": ["https://example.com/a", "https://example.com/b"],
+            "original_titles": ["Title A", "Title B"],
+        }
+    ],
+}
+
+
+async def subscriber_task(broadcaster, received, slow, expected):
+    subscriber = broadcaster.subscribe()
+
+    async def never_disconnected():
+        return False
+
+    count = 0
+    async for frame in sse_frames(broadcaster, subscriber, never_disconnected, keepalive=5.0):
+        if not frame.startswith("id: "):
+            continue
+        event_id = int(frame[4:frame.index("\n")])
+        count += 1
+        if slow:
+            await asyncio.sleep(0.05)
+        else:
+            received.setdefault(event_id, []).append(time.perf_counter())
+        if count >= expected:
+            return
+
+
+async def run_load_test(subscribers: int, events: int, slow_fraction: float):
+    broadcaster = NewsBroadcaster(history_size=events, queue_size=max(events // 4, 1))
+    received = {}
+    slow_count = int(subscribers * slow_fraction)
+    tasks = [
+        asyncio.create_task(subscriber_task(broadcaster, received, i < slow_count, events))
+        for i in range(subscribers)
+    ]
+    await asyncio.sleep(0.1)  # Let every subscriber register
+
+    published_at = {}
+    for _ in range(events):
+        start = time.perf_counter()
+        event_id = broadcaster.publish(SAMPLE_PAYLOAD)
+        published_at[event_id] = start
+        await asyncio.sleep(0.01)
+
+    fast_tasks = tasks[slow_count:]
+    await asyncio.wait(fast_tasks, timeout=30)
+    for task in tasks:
+        task.cancel()
+
+    # Fan-out latency: publish until the last fast subscriber received the event
+    latencies = []
+    for event_id, start in published_at.items():
+        times = received.get(event_id, [])
+        if times:
+            latencies.append((max(times) - start) * 1000)
+    latencies.sort()
+
+    print(f"Subscribers: {subscribers} ({slow_count} slow), events: {events}")
+    if latencies:
+        print(f"Fan-out latency to all fast subscribers (ms): "
+              f"p50={statistics.median(latencies):.2f} "
+              f"p95={latencies[int(len(latencies) * 0.95) - 1]:.2f} "
+              f"max={latencies[-1]:.2f}")
+    print(f"Stream stats: {broadcaster.stats()}")
+
+
+if __name__ == "__main__":
+    subscriber_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    event_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    slow = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+    asyncio.run(run_load_test(subscriber_count, event_count, slow))
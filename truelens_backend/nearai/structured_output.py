@@ -0,0 +1,195 @@
+"""
+Extraction and validation of the JSON values the agent asks the LLM for.
+
+`extract_json` finds the first balanced JSON object or array in a response with a linear scan
+of the text (repeated for at most MAX_CANDIDATES opening brackets) that skips brackets inside
+strings, so prose or code fences around the JSON (or prose
+with braces of its own) no longer break parsing the way the greedy `({.*})` regex did.
+Candidates that do not parse are repaired (trailing commas, Python literals, raw control
+characters inside strings) before they are given up on.
+
+Parsed values are checked with a validator (`validate_analysis` mirrors the API server's
+`ArticleGroup` model, `validate_groups` the borderline grouping reply). The agent re-asks the
+model with a short correction prompt only when validation fails, and every outcome is counted
+per model and kind of reply (`parse_stats`).
+"""
+import json
+import re
+import threading
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+MAX_CANDIDATES = 16       # Opening brackets tried before giving up on a response
+REASK_RESPONSE_CHARS = 4000  # Characters of the invalid response quoted in a re-ask
+
+_OPENERS = {"{": "}", "[": "]"}
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_PY_LITERAL_RE = re.compile(r"\b(True|False|None)\b")
+_STRING_RE = re.compile(r'("(?:[^"\\]|\\.)*")', re.DOTALL)
+
+OUTCOMES = ("ok", "repaired", "reasked", "failed")
+_stats: Dict[Tuple[str, str], Dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+def _balanced_end(text: str, start: int) -> int:
+    """Index just past the bracket closing the one at `start`, or -1 if it is never closed."""
+    stack = [_OPENERS[text[start]]]
+    in_string = False
+    escaped = False
+    for i in range(start + 1, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _OPENERS:
+            stack.append(_OPENERS[char])
+        elif char in "}]":
+            if char != stack.pop():
+                return -1
+            if not stack:
+                return i + 1
+    return -1
+
+
+def repair_json(candidate: str) -> str:
+    """Fix common LLM JSON defects outside of strings: trailing commas and Python literals."""
+    parts = _STRING_RE.split(candidate)
+    for i in range(0, len(parts), 2):  # Even parts are outside strings
+        part = _PY_LITERAL_RE.sub(lambda m: _PY_LITERALS[m.group(1)], parts[i])
+        parts[i] = _TRAILING_COMMA_RE.sub(r"\1", part)
+    return "".join(parts)
+
+
+def extract_json(text: str, expect: str = None) -> Tuple[Any, bool]:
+    """
+    Return (the first JSON value in `text`, whether it needed repairs), or (None, False).
+
+    `expect` limits the search to objects ("{") or arrays ("[").
+    """
+    if not text:
+        return None, False
+    openers = expect or "{["
+    position = 0
+    for _ in range(MAX_CANDIDATES):
+        starts = [i for i in (text.find(opener, position) for opener in openers) if i >= 0]
+        if not starts:
+            break
+        start = min(starts)
+        end = _balanced_end(text, start)
+        if end < 0:
+            position = start + 1
+            continue
+        candidate = text[start:end]
+        try:
+            return json.loads(candidate, strict=False), False
+        except ValueError:
+            pass
+        try:
+            return json.loads(repair_json(candidate), strict=False), True
+        except ValueError:
+            # Balanced but not JSON (e.g. "{like this}" in prose): look after it
+            position = start + 1
+    return None, False
+
+
+def validate_analysis(value: Any) -> List[str]:
+    """
+    Check a group analysis against the fields of the API's ArticleGroup model.
+
+    Normalizes in place: the sentiment is lower-cased, missing explanation and recommendation
+    lists get empty defaults and recommendations without a symbol are dropped. Returns the
+    problems that cannot be fixed, empty when the analysis is usable.
+    """
+    if not isinstance(value, dict):
+        return [f"expected a JSON object, got {type(value).__name__}"]
+    errors = []
+    if not isinstance(value.get("summary"), str) or not value["summary"].strip():
+        errors.append('"summary" must be a non-empty string')
+    if not isinstance(value.get("sentiment"), str) or not value["sentiment"].strip():
+        errors.append('"sentiment" must be a string')
+    else:
+        value["sentiment"] = value["sentiment"].strip().lower()
+    if not isinstance(value.get("sentiment_explanation", ""), str):
+        errors.append('"sentiment_explanation" must be a string')
+    value.setdefault("sentiment_explanation", "")
+
+    recommendations = value.setdefault("trading_recommendations", {"buy": [], "sell": []})
+    if not isinstance(recommendations, dict):
+        errors.append('"trading_recommendations" must be an object with "buy" and "sell" lists')
+    else:
+        for action in ("buy", "sell"):
+            recs = recommendations.setdefault(action, [])
+            if not isinstance(recs, list):
+                errors.append(f'"trading_recommendations.{action}" must be a list')
+                continue
+            recommendations[action] = [
+                {"symbol": rec["symbol"].strip().upper(), "reason": str(rec.get("reason", ""))}
+                for rec in recs
+                if isinstance(rec, dict) and isinstance(rec.get("symbol"), str) and rec["symbol"].strip()
+            ]
+    sources = value.get("sources")
+    if sources is not None and not (isinstance(sources, list) and all(isinstance(s, str) for s in sources)):
+        errors.append('"sources" must be a list of strings')
+    return errors
+
+
+def validate_groups(value: Any) -> List[str]:
+    """Check a grouping reply: a list of lists of integer article ids."""
+    if not isinstance(value, list):
+        return [f"expected a JSON array, got {type(value).__name__}"]
+    if not all(isinstance(group, list) and all(isinstance(idx, int) for idx in group) for group in value):
+        return ["every element must be an array of integer article IDs"]
+    return []
+
+
+def parse_and_validate(text: str, validate: Callable[[Any], List[str]],
+                       expect: str = None) -> Tuple[Optional[Any], List[str], bool]:
+    """Extract and validate a value; returns (value, errors, repaired)."""
+    value, repaired = extract_json(text, expect)
+    if value is None:
+        return None, ["the response contains no valid JSON " + ("object" if expect == "{" else "value")], False
+    errors = validate(value)
+    return (None if errors else value), errors, repaired
+
+
+def reask_messages(response: str, errors: List[str], schema_hint: str) -> List[Dict[str, str]]:
+    """A short prompt asking the model to fix its own invalid reply, without resending the articles."""
+    prompt = {
+        "role": "system",
+        "content": "You fix malformed JSON. Reply with ONLY the corrected JSON, keeping the original "
+                   "content wherever it is valid.\n" + schema_hint,
+    }
+    user_prompt = (
+        "This reply could not be used:\n\n"
+        + response[:REASK_RESPONSE_CHARS]
+        + "\n\nProblems:\n"
+        + "\n".join(f"- {error}" for error in errors)
+    )
+    return [prompt, {"role": "user", "content": user_prompt}]
+
+
+def record_parse(model: str, kind: str, outcome: str):
+    with _stats_lock:
+        counts = _stats.setdefault((model, kind), dict.fromkeys(OUTCOMES, 0))
+        counts[outcome] += 1
+
+
+def parse_stats() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Parse outcomes per model and kind, with the share of replies that needed a re-ask or failed."""
+    stats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    with _stats_lock:
+        for (model, kind), counts in _stats.items():
+            total = sum(counts.values())
+            stats.setdefault(model, {})[kind] = dict(
+                counts,
+                total=total,
+                failure_rate=round((counts["reasked"] + counts["failed"]) / total, 4) if total else 0.0,
+            )
+    return stats
@@ -0,0 +1,258 @@
+"""
+In-memory inverted index from ticker symbol to trading recommendations.
+
+Every recommendation in a received payload is added once, as an event with its symbol, action
+(buy/sell) and a sentiment-weighted score contribution. For
+each configured window (e.g. 1h, 24h, 7d) the index keeps running per-symbol totals plus a
+time-ordered queue of the events inside the window. Expired events are popped off the front
+of the queue and subtracted from the totals, so each event is added and removed exactly once
+and history is never rescanned.
+
+A buy counts +1 and a sell -1, scaled by the group's sentiment: recommendations from groups
+with a clear positive or negative sentiment weigh more than those from neutral ones.
+
+A group with an `event_key` is a revision of an event's analysis. A newer revision retires the
+recommendations of the previous one (they are subtracted from the totals at once and skipped
+when they expire), and a revision that is not newer is ignored, so an event that keeps being
+updated is counted once.
+
+Events are timed by their payload's timestamp (the agent sends naive UTC timestamps), never
+later than the time they are indexed, so a live payload and the same payload indexed again
+when the index is rebuilt from storage on startup fall into the same windows.
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import List, Dict, Any
+
+DEFAULT_TICKER_WINDOWS = "1h,24h,7d"
+
+SENTIMENT_WEIGHTS = {
+    "positive": 1.0,
+    "negative": 1.0,
+    "mixed": 0.5,
+    "neutral": 0.5,
+}
+DEFAULT_SENTIMENT_WEIGHT = 0.5
+
+RECENT_PER_SYMBOL = 20  # Recommendations kept per symbol for the ticker endpoint
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_window(spec: str) -> int:
+    """Parse a window such as "90m", "24h" or "7d" into seconds."""
+    spec = spec.strip().lower()
+    if spec[-1:] in _UNITS:
+        return int(float(spec[:-1]) * _UNITS[spec[-1]])
+    return int(spec)
+
+
+def parse_windows(specs: str) -> Dict[str, int]:
+    """Parse a comma-separated window list ("1h,24h,7d") into {name: seconds}."""
+    windows = {}
+    for spec in specs.split(","):
+        if spec.strip():
+            windows[spec.strip().lower()] = parse_window(spec)
+    return windows
+
+
+def payload_time(timestamp: str, default: float) -> float:
+    """Epoch seconds of a payload's ISO timestamp (UTC if naive), or `default` if it cannot be parsed."""
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return default
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class _Window:
+    """Running per-symbol totals over the last `seconds` seconds."""
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.events = deque()  # [time, symbol, action, score, counted]
+        self.totals: Dict[str, List[float]] = {}  # symbol -> [buy, sell, score]
+
+    def add(self, event_time: float, symbol: str, action: str, score: float) -> list:
+        event = [event_time, symbol, action, score, True]
+        self.events.append(event)
+        totals = self.totals.setdefault(symbol, [0, 0, 0.0])
+        totals[0 if action == "buy" else 1] += 1
+        totals[2] += score
+        return event
+
+    def _subtract(self, event: list):
+        _, symbol, action, score, _ = event
+        event[4] = False
+        totals = self.totals[symbol]
+        totals[0 if action == "buy" else 1] -= 1
+        totals[2] -= score
+        if totals[0] + totals[1] == 0:
+            del self.totals[symbol]
+
+    def retire(self, event: list):
+        """Stop counting an event before it expires."""
+        if event[4]:
+            self._subtract(event)
+
+    def expire(self, now: float) -> bool:
+        cutoff = now - self.seconds
+        changed = False
+        while self.events and self.events[0][0] < cutoff:
+            event = self.events.popleft()
+            if event[4]:
+                self._subtract(event)
+            changed = True
+        return changed
+
+
+class TickerIndex:
+    """
+    Rolling buy/sell counts and sentiment-weighted scores per ticker.
+
+    Args:
+        windows: {name: seconds} of the rolling windows to maintain.
+    """
+
+    def __init__(self, windows: Dict[str, int]):
+        self.windows = {name: _Window(seconds) for name, seconds in windows.items()}
+        self.recent: Dict[str, deque] = {}
+        # event key -> (revision, time, [(window, event)]) of its indexed revision, oldest first
+        self.event_revisions: "OrderedDict[str, tuple]" = OrderedDict()
+        self.last_time = 0.0
+        self.version = 0
+        self.lock = threading.Lock()
+        self._movers_cache: Dict[tuple, tuple] = {}  # (window, limit, direction) -> (version, result)
+
+    def add_payload(self, payload: Dict[str, Any], event_time: float = None):
+        """Index every recommendation in a payload, at `event_time` or else its timestamp."""
+        if event_time is None:
+            now = time.time()
+            event_time = min(payload_time(payload.get("timestamp"), now), now)
+        with self.lock:
+            # Keep events in time order so expiry can pop from the front of each window
+            event_time = max(event_time, self.last_time)
+            self.last_time = event_time
+            for group in payload.get("article_groups", []):
+                self._add_group(group, payload.get("timestamp"), event_time)
+            self.version += 1
+
+    def _add_group(self, group: Dict[str, Any], timestamp: str, event_time: float):
+        key = group.get("event_key")
+        revision = group.get("revision") or 0
+        if key:
+            if key in self.event_revisions:
+                if self.event_revisions[key][0] >= revision:
+                    return
+                self._retire_event(key)
+            self.event_revisions[key] = (revision, event_time, [])
+        sentiment = str(group.get("sentiment", "")).lower()
+        weight = SENTIMENT_WEIGHTS.get(sentiment, DEFAULT_SENTIMENT_WEIGHT)
+        recommendations = group.get("trading_recommendations") or {}
+        for action, direction in (("buy", 1), ("sell", -1)):
+            for rec in recommendations.get(action, []):
+                symbol = rec.get("symbol", "").upper()
+                if not symbol:
+                    continue
+                for window in self.windows.values():
+                    event = window.add(event_time, symbol, action, direction * weight)
+                    if key:
+                        self.event_revisions[key][2].append((window, event))
+                self.recent.setdefault(symbol, deque(maxlen=RECENT_PER_SYMBOL)).appendleft({
+                    "action": action,
+                    "reason": rec.get("reason", ""),
+                    "sentiment": sentiment,
+                    "summary": group.get("summary", ""),
+                    "timestamp": timestamp,
+                    "event_key": key,
+                })
+
+    def _retire_event(self, key: str):
+        _, _, events = self.event_revisions.pop(key)
+        symbols = set()
+        for window, event in events:
+            window.retire(event)
+            symbols.add(event[1])
+        for symbol in symbols:
+            recent = self.recent[symbol]
+            kept = [item for item in recent if item["event_key"] != key]
+            if len(kept) < len(recent):
+                self.recent[symbol] = deque(kept, maxlen=RECENT_PER_SYMBOL)
+
+    def _expire(self, now: float):
+        changed = False
+        for window in self.windows.values():
+            changed = window.expire(now) or changed
+        # Revisions older than the longest window have nothing left to retire
+        if self.windows:
+            cutoff = now - max(window.seconds for window in self.windows.values())
+            while self.event_revisions and next(iter(self.event_revisions.values()))[1] < cutoff:
+                self.event_revisions.popitem(last=False)
+        if changed:
+            self.version += 1
+
+    def ticker(self, symbol: str, now: float = None) -> Dict[str, Any]:
+        """Per-window counts and score for one symbol, plus its most recent recommendations."""
+        symbol = symbol.upper()
+        with self.lock:
+            self._expire(now or time.time())
+            windows = {}
+            for name, window in self.windows.items():
+                buy, sell, score = window.totals.get(symbol, [0, 0, 0.0])
+                windows[name] = {"buy": buy, "sell": sell, "score": round(score, 4)}
+            return {"symbol": symbol, "windows": windows, "recent": list(self.recent.get(symbol, []))}
+
+    def movers(self, window: str, limit: int = 10, direction: str = "abs", now: float = None) -> List[Dict[str, Any]]:
+        """
+        Top symbols of a window by score: "up" (most bullish), "down" (most bearish) or "abs".
+
+        The ranking is cached until the index changes (a new payload or an expired event).
+        """
+        with self.lock:
+            self._expire(now or time.time())
+            cache_key = (window, limit, direction)
+            cached = self._movers_cache.get(cache_key)
+            if cached and cached[0] == self.version:
+                return cached[1]
+
+            totals = self.windows[window].totals
+            keys = {"up": lambda item: item[1][2], "down": lambda item: -item[1][2], "abs": lambda item: abs(item[1][2])}
+            top = heapq.nlargest(limit, totals.items(), key=keys[direction])
+            result = [
+                {"symbol": symbol, "buy": buy, "sell": sell, "score": round(score, 4)}
+                for symbol, (buy, sell, score) in top
+            ]
+            self._movers_cache[cache_key] = (self.version, result)
+            return result
+
+    def symbols(self) -> int:
+        return len(self.recent)
+
+
+def rebuild_from_storage(index: TickerIndex, storage, page_size: int = 1000) -> int:
+    """Fill the index with the groups stored within its longest window; returns the group count."""
+    if not index.windows:
+        return 0
+    now = time.time()
+    longest = max(window.seconds for window in index.windows.values())
+    # Stored timestamps are naive UTC, so compare against the same form
+    since = datetime.fromtimestamp(now - longest, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+    # query_groups pages newest first; collect, then index oldest first
+    groups = []
+    before_id = None
+    while True:
+        page = storage.query_groups(before_id=before_id, limit=page_size, since=since)
+        groups.extend(page)
+        if len(page) < page_size:
+            break
+        before_id = page[-1]["id"]
+
+    for group in reversed(groups):
+        index.add_payload({"timestamp": group["timestamp"], "article_groups": [group]})
+    return len(groups)
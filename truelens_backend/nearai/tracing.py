@@ -0,0 +1,195 @@
+"""
+Structured tracing spans for the agent and the API server.
+
+`span(name, **attributes)` times a block as a span nested under the current one (tracked with
+contextvars, and carried into worker threads by `concurrency.process_concurrently`), so one
+agent run becomes one trace: fetch pages, grouping, every group analysis with its LLM calls,
+and delivery. Code inside a span adds attributes with `set_attributes` and counters with
+`increment` (tokens, bytes, cache hits).
+
+Finished spans are buffered and appended to `path` as OpenTelemetry OTLP/JSON export requests,
+one per line (the format of the OpenTelemetry Collector file exporter), so the file can be
+loaded into any OTLP-compatible tool. Tracing is off unless TRACING_ENABLED is set; disabled
+spans cost one context manager call.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional
+
+DEFAULT_TRACING_CONFIG = {
+    "enabled": False,
+    "path": "traces.jsonl",
+    "service_name": "truelens-agent",
+    "flush_spans": 512,     # Buffered spans that trigger a write
+}
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_increment_lock = threading.Lock()
+
+
+def tracing_config_from_env(env_vars: Dict[str, str], service_name: str = "truelens-agent") -> Dict[str, Any]:
+    """Build the tracing config from defaults plus TRACING_* env var overrides."""
+    config = dict(DEFAULT_TRACING_CONFIG, service_name=service_name)
+    for key, default in DEFAULT_TRACING_CONFIG.items():
+        raw = env_vars.get(f"TRACING_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            if isinstance(default, bool):
+                config[key] = str(raw).lower() in ("1", "true", "yes", "on")
+            else:
+                config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, kind: int, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else ""
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error = None
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Buffers finished spans and appends them to a file as OTLP/JSON."""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.enabled = config["enabled"]
+        self.buffer: List[Span] = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.exported = 0
+
+    def finish(self, span: Span):
+        span.end_ns = time.time_ns()
+        with self.lock:
+            self.buffer.append(span)
+            full = len(self.buffer) >= self.config["flush_spans"]
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            spans, self.buffer = self.buffer, []
+        if not spans:
+            return
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.config["service_name"]}},
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "truelens"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+        line = json.dumps(request, separators=(",", ":")) + "\n"
+        with self.write_lock:
+            with open(self.config["path"], "a", encoding="utf-8") as f:
+                f.write(line)
+            self.exported += len(spans)
+
+
+_tracer = Tracer(DEFAULT_TRACING_CONFIG)
+_atexit_registered = False
+
+
+def configure(config: Dict[str, Any]):
+    """Replace the process tracer, flushing the spans of the previous one."""
+    global _tracer, _atexit_registered
+    if config == _tracer.config:
+        return
+    _tracer.flush()
+    _tracer = Tracer(config)
+    if not _atexit_registered:
+        atexit.register(flush)
+        _atexit_registered = True
+
+
+def flush():
+    _tracer.flush()
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Time the enclosed block as a child of the current span; yields the span (None when disabled)."""
+    tracer = _tracer
+    if not tracer.enabled:
+        yield None
+        return
+    current = Span(name, kind, _current.get(), attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        tracer.finish(current)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def set_attributes(**attributes):
+    """Set attributes on the current span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def increment(key: str, amount: float = 1):
+    """Add to a numeric attribute of the current span, if any."""
+    current = _current.get()
+    if current is not None:
+        # Map-reduce chunks share their group's span across worker threads
+        with _increment_lock:
+            current.attributes[key] = current.attributes.get(key, 0) + amount
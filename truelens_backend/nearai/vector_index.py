@@ -0,0 +1,367 @@
+"""
+Semantic article grouping with hashed TF-IDF vectors and a persistent index of recent articles.
+
+MinHash only finds near-duplicate wording. Here each article becomes a TF-IDF vector over
+stemmed title and body words plus title word pairs, so rewordings of the same story still
+match: "Trump places 30% tariffs on China" and "USA placed 30% tariffs on China" share most
+of their weighted terms. The title counts twice, since headlines carry the event.
+
+Terms are hashed into a fixed number of dimensions with a random sign per term (the hashing
+trick), which keeps vectors small and lets the vocabulary grow without a refit. Document
+frequencies over every article seen are kept in the same hashed space.
+
+The index (vectors, cluster ids and insertion times of recent articles) is saved to an .npz
+file. New articles are compared with every indexed article and with each other in blocks of
+matrix products. An article joins the cluster of its most similar indexed article when that
+similarity clears the threshold, so clusters grow across runs instead of being rebuilt.
+Articles are indexed with the IDF known at the time; older vectors are not re-weighted.
+
+The hashed column of every word and term seen is memoized. Codes only depend on the term, so
+the memo is simply reset once it holds `max_cached_terms` entries, which keeps a long-running
+daemon's memory bounded as the vocabulary grows.
+"""
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+from article import Article
+
+DEFAULT_VECTOR_INDEX_CONFIG = {
+    "enabled": True,
+    "path": "vector_index.npz",
+    "dim": 1024,                   # Hashed feature dimensions
+    "body_chars": 1500,            # Only the lead of the body is vectorized
+    "similarity_threshold": 0.5,   # Cosine similarity needed to join a cluster
+    "borderline_threshold": 0.3,   # Pairs between this and the threshold are "ambiguous"
+    "retention_hours": 72.0,       # How long articles stay in the index
+    "max_articles": 20000,         # Oldest articles are dropped beyond this
+    "block_size": 2048,            # Rows per similarity block
+    "max_cached_terms": 200000,    # Word and term codes memoized before the caches are reset
+    "llm_borderline": True,        # Ask the LLM about ambiguous clusters
+    "max_llm_clusters": 5,         # Upper bound on LLM calls per run
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be been but by for from has have he her his in is it its of on or "
+    "that the their this to was were will with after over says said new".split()
+)
+
+
+def vector_index_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the vector index config from defaults plus VECTOR_INDEX_* env var overrides."""
+    config = dict(DEFAULT_VECTOR_INDEX_CONFIG)
+    for key, default in DEFAULT_VECTOR_INDEX_CONFIG.items():
+        raw = env_vars.get(f"VECTOR_INDEX_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            if isinstance(default, bool):
+                config[key] = str(raw).lower() in ("1", "true", "yes", "on")
+            else:
+                config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+def stem(word: str) -> str:
+    """Crude suffix stripping so "places", "placed" and "placing" share a term."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+@lru_cache(maxsize=1 << 18)
+def normalize_word(word: str) -> str:
+    """Stemmed form of a word, or "" for a stopword."""
+    return "" if word in STOPWORDS else stem(word)
+
+
+class _TermCodes(dict):
+    """Term -> signed column code: (bucket + 1), negated for terms hashed to a negative sign."""
+
+    def __init__(self, dim: int):
+        super().__init__()
+        self.dim = dim
+
+    def __missing__(self, term: str) -> int:
+        h = zlib.crc32(term.encode())
+        code = self[term] = (h % self.dim + 1) * (1 if (h >> 31) & 1 else -1)
+        return code
+
+
+class _WordCodes(dict):
+    """Raw word -> code of its stemmed term, 0 for stopwords."""
+
+    def __init__(self, term_codes: _TermCodes):
+        super().__init__()
+        self.term_codes = term_codes
+
+    def __missing__(self, word: str) -> int:
+        term = normalize_word(word)
+        code = self[word] = self.term_codes[term] if term else 0
+        return code
+
+
+class VectorIndex:
+    """
+    Hashed TF-IDF vectors of recent articles with their cluster ids.
+
+    Args:
+        path: .npz file the index is loaded from and saved to.
+        config: Vector index config (see DEFAULT_VECTOR_INDEX_CONFIG).
+    """
+
+    def __init__(self, path: str, config: Dict[str, Any]):
+        self.path = path
+        self.config = config
+        self.dim = config["dim"]
+        self.lock = threading.Lock()
+        self._term_codes = _TermCodes(self.dim)
+        self._word_codes = _WordCodes(self._term_codes)
+
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.clusters = np.zeros(0, dtype=np.int64)
+        self.added = np.zeros(0, dtype=np.float64)
+        self.uris: List[str] = []
+        self.df = np.zeros(self.dim, dtype=np.float64)
+        self.doc_count = 0
+        self.next_cluster = 1
+        self._row_of: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.uris)
+
+    def load(self) -> "VectorIndex":
+        """Load the saved index, if there is one with matching dimensions."""
+        try:
+            with np.load(self.path) as data:
+                if data["vectors"].shape[1] != self.dim:
+                    return self
+                self.vectors = data["vectors"]
+                self.clusters = data["clusters"]
+                self.added = data["added"]
+                self.uris = data["uris"].tolist()
+                self.df = data["df"]
+                self.doc_count = int(data["doc_count"])
+                self.next_cluster = int(data["next_cluster"])
+        except (OSError, KeyError, ValueError):
+            pass
+        self._row_of = {uri: row for row, uri in enumerate(self.uris)}
+        return self
+
+    def save(self):
+        """Write the index atomically."""
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            vectors=self.vectors,
+            clusters=self.clusters,
+            added=self.added,
+            uris=np.array(self.uris, dtype=str),
+            df=self.df,
+            doc_count=np.int64(self.doc_count),
+            next_cluster=np.int64(self.next_cluster),
+        )
+        os.replace(tmp_path, self.path)
+
+    def _article_codes(self, article: Article) -> Tuple[List[int], List[int]]:
+        # Title words count twice and title word pairs once; body words count as they occur
+        title = [term for term in map(normalize_word, _WORD_RE.findall(article.title.lower())) if term]
+        title_terms = Counter(title)
+        for term in title_terms:
+            title_terms[term] *= 2
+        title_terms.update(f"{a} {b}" for a, b in zip(title, title[1:]))
+        body_words = Counter(_WORD_RE.findall(article.body[:self.config["body_chars"]].lower()))
+
+        codes = list(map(self._term_codes.__getitem__, title_terms))
+        codes.extend(map(self._word_codes.__getitem__, body_words))
+        counts = list(title_terms.values())
+        counts.extend(body_words.values())
+        return codes, counts
+
+    def vectorize(self, articles: List[Article], update_df: bool = True) -> np.ndarray:
+        """Unit-length hashed TF-IDF vectors, one row per article."""
+        codes, counts, lengths = [], [], []
+        for article in articles:
+            article_codes, article_counts = self._article_codes(article)
+            codes.extend(article_codes)
+            counts.extend(article_counts)
+            lengths.append(len(article_codes))
+        codes = np.asarray(codes, dtype=np.int64)
+        rows = np.repeat(np.arange(len(articles)), lengths)
+        kept = codes != 0  # Stopwords
+        rows, codes = rows[kept], codes[kept]
+        values = np.sign(codes) * (1.0 + np.log(np.asarray(counts, dtype=np.float64)[kept]))
+
+        vectors = np.zeros((len(articles), self.dim), dtype=np.float64)
+        np.add.at(vectors, (rows, np.abs(codes) - 1), values)
+
+        if update_df:
+            # Each article counts once per bucket
+            self.df += np.count_nonzero(vectors, axis=0)
+            self.doc_count += len(articles)
+        vectors *= np.log((1 + self.doc_count) / (1 + self.df)) + 1.0
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def expire(self, now: float = None):
+        """Drop articles past the retention period or beyond `max_articles`, and reset full code caches."""
+        if len(self._word_codes) + len(self._term_codes) > self.config["max_cached_terms"]:
+            self._word_codes.clear()
+            self._term_codes.clear()
+        now = now or time.time()
+        keep = self.added >= now - self.config["retention_hours"] * 3600
+        if keep.sum() > self.config["max_articles"]:
+            keep &= np.arange(len(keep)) >= len(keep) - self.config["max_articles"]
+        if keep.all():
+            return
+        self.vectors = self.vectors[keep]
+        self.clusters = self.clusters[keep]
+        self.added = self.added[keep]
+        self.uris = [uri for uri, kept in zip(self.uris, keep) if kept]
+        self._row_of = {uri: row for row, uri in enumerate(self.uris)}
+
+    def assign(self, articles: List[Article]) -> Tuple[List[int], List[List[int]]]:
+        """
+        Give every article a cluster id and add the new ones to the index.
+
+        Articles already in the index keep their cluster. Returns (cluster id per article,
+        borderline groups of article indexes that only have ambiguous matches).
+        """
+        with self.lock:
+            self.expire()
+            threshold = self.config["similarity_threshold"]
+            borderline_threshold = self.config["borderline_threshold"]
+            block_size = max(self.config["block_size"], 1)
+
+            clusters = [0] * len(articles)
+            new_rows = []
+            for i, article in enumerate(articles):
+                row = self._row_of.get(article.uri)
+                if row is None:
+                    new_rows.append(i)
+                else:
+                    clusters[i] = int(self.clusters[row])
+            if not new_rows:
+                return clusters, []
+
+            vectors = self.vectorize([articles[i] for i in new_rows])
+            count = len(new_rows)
+
+            # Best indexed match of each new article
+            best_sim = np.full(count, -1.0, dtype=np.float32)
+            best_cluster = np.zeros(count, dtype=np.int64)
+            for start in range(0, count, block_size):
+                block = vectors[start:start + block_size]
+                for old_start in range(0, len(self.uris), block_size):
+                    sims = block @ self.vectors[old_start:old_start + block_size].T
+                    idx = sims.argmax(axis=1)
+                    top = sims[np.arange(len(block)), idx]
+                    better = top > best_sim[start:start + len(block)]
+                    best_sim[start:start + len(block)][better] = top[better]
+                    best_cluster[start:start + len(block)][better] = self.clusters[old_start + idx[better]]
+
+            # Links between the new articles themselves
+            confident_edges, ambiguous_edges = [], []
+            for start in range(0, count, block_size):
+                block = vectors[start:start + block_size]
+                sims = block @ vectors[start:].T
+                # Only pairs (a, b) with a < b: clear the diagonal block's lower triangle
+                sims[:, :len(block)][np.tril_indices(len(block))] = 0
+                a, b = np.nonzero(sims >= threshold)
+                confident_edges.append((a + start, b + start))
+                a, b = np.nonzero((sims >= borderline_threshold) & (sims < threshold))
+                ambiguous_edges.append((a + start, b + start))
+            labels = connected_labels(count, *_stack_edges(confident_edges))
+
+            # A component joins the indexed cluster of its best-matching member, if good enough
+            order = np.lexsort((-best_sim, labels))
+            sorted_labels = labels[order]
+            best_members = order[np.r_[True, sorted_labels[1:] != sorted_labels[:-1]]]
+            joins = best_sim[best_members] >= threshold
+            component_clusters = np.where(joins, best_cluster[best_members], 0)
+            fresh = int((~joins).sum())
+            component_clusters[~joins] = np.arange(self.next_cluster, self.next_cluster + fresh)
+            self.next_cluster += fresh
+            cluster_of_label = np.zeros(count, dtype=np.int64)
+            cluster_of_label[labels[best_members]] = component_clusters
+            new_clusters = cluster_of_label[labels]
+            for position, i in enumerate(new_rows):
+                clusters[i] = int(new_clusters[position])
+
+            self._add(articles, new_rows, vectors, new_clusters)
+
+            # Ambiguous links only matter between articles that are still on their own
+            joined = np.zeros(count, dtype=bool)
+            joined[best_members[joins]] = True
+            alone = (np.bincount(labels, minlength=count)[labels] == 1) & ~joined[labels]
+            a, b = _stack_edges(ambiguous_edges)
+            keep = alone[a] & alone[b]
+            border_labels = connected_labels(count, a[keep], b[keep])
+            border_groups: Dict[int, List[int]] = {}
+            for position in np.nonzero(alone)[0]:
+                border_groups.setdefault(int(border_labels[position]), []).append(new_rows[position])
+            borderline = [members for members in border_groups.values() if len(members) >= 2]
+            return clusters, borderline
+
+    def _add(self, articles: List[Article], rows: List[int], vectors: np.ndarray, clusters: np.ndarray):
+        now = time.time()
+        self.vectors = np.vstack([self.vectors, vectors])
+        self.clusters = np.concatenate([self.clusters, clusters])
+        self.added = np.concatenate([self.added, np.full(len(rows), now)])
+        for i in rows:
+            self._row_of[articles[i].uri] = len(self.uris)
+            self.uris.append(articles[i].uri)
+
+
+def _stack_edges(edges: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    if not edges:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate([a for a, _ in edges]), np.concatenate([b for _, b in edges])
+
+
+def connected_labels(count: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Label every node with the smallest node of its connected component, given edges a[i]-b[i].
+
+    Vectorized min-label propagation with pointer jumping, so millions of edges between
+    duplicate articles do not need a Python loop.
+    """
+    labels = np.arange(count)
+    if len(a) == 0:
+        return labels
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+_indexes: Dict[str, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def open_vector_index(config: Dict[str, Any]) -> VectorIndex:
+    """Return the process-wide vector index for a config's path, loading it on first use."""
+    with _indexes_lock:
+        index = _indexes.get(config["path"])
+        if index is None:
+            index = _indexes[config["path"]] = VectorIndex(config["path"], config).load()
+        return index
@@ -0,0 +1,179 @@
+"""
+Write-behind queue that keeps storage writes off the API request path.
+
+`receive_news` only validates a payload and puts it on a bounded asyncio queue. A background
+task drains the queue, groups whatever has arrived (up to `batch_size` payloads, waiting at
+most `max_wait` seconds for a batch to fill) and stores each batch in one transaction on a
+worker thread, so the event loop never waits on the disk. A full queue makes new requests
+wait for room instead of growing memory without bound. On shutdown the queue is drained
+before storage is closed.
+
+Failed batches are retried with backoff and then dropped with an error log, since their
+requests were already answered.
+
+Payloads can carry an idempotency key. `claim` reports whether a key is new, already stored or
+still waiting in the queue, so a retried delivery is only written once, and a retry that
+arrives while the first write may still fail is not acknowledged as stored. A caller that must not
+acknowledge a payload before it is stored can wait for the write with `put(..., wait=True)`.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional
+
+DEFAULT_WRITER_CONFIG = {
+    "batch_size": 100,       # Payloads stored per transaction
+    "max_wait": 0.05,        # Seconds a partial batch waits for more payloads
+    "queue_size": 10000,     # Payloads waiting to be written before requests have to wait
+    "max_retries": 3,
+    "fsync": "normal",       # always | normal | off, see news_storage.SQLITE_SYNC_POLICIES
+}
+
+_STOP = object()
+
+
+def writer_config_from_env(env_vars: Dict[str, str]) -> Dict[str, Any]:
+    """Build the writer config from defaults plus NEWS_WRITE_* env var overrides."""
+    config = dict(DEFAULT_WRITER_CONFIG)
+    for key, default in DEFAULT_WRITER_CONFIG.items():
+        raw = env_vars.get(f"NEWS_WRITE_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+class WriteBehindQueue:
+    """
+    Batches payloads into `storage.add_payloads` calls from a background task.
+
+    Args:
+        storage: A news_storage.NewsStorage backend.
+        config: Writer config (see DEFAULT_WRITER_CONFIG).
+    """
+
+    def __init__(self, storage, config: Dict[str, Any]):
+        self.storage = storage
+        self.config = config
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(config["queue_size"], 1))
+        self.task = None
+        self.pending_keys = set()
+
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.latencies = deque(maxlen=1000)  # Seconds per batch write, most recent last
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def claim(self, idempotency_key: str) -> str:
+        """
+        Reserve an idempotency key.
+
+        Returns "claimed" for a new key, "stored" if a payload with this key was written, or
+        "pending" if one is still queued; its key is released again if that write fails.
+        """
+        if idempotency_key in self.pending_keys:
+            return "pending"
+        stored = await asyncio.get_running_loop().run_in_executor(
+            None, self.storage.has_idempotency_key, idempotency_key
+        )
+        if stored:
+            return "stored"
+        # Another request may have claimed the key while storage was checked
+        if idempotency_key in self.pending_keys:
+            return "pending"
+        self.pending_keys.add(idempotency_key)
+        return "claimed"
+
+    async def put(self, payload: Dict[str, Any], idempotency_key: Optional[str] = None, wait: bool = False) -> bool:
+        """
+        Queue a payload for writing; waits only when the queue is full.
+
+        With `wait`, also waits until the payload's batch has been written and returns False
+        if the write failed.
+        """
+        written = asyncio.get_running_loop().create_future() if wait else None
+        await self.queue.put((payload, idempotency_key, written))
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return await written if written else True
+
+    async def _next_batch(self) -> List:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.config["max_wait"]
+        while len(batch) < self.config["batch_size"] and batch[-1] is not _STOP:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            stopping = batch[-1] is _STOP
+            entries = [entry for entry in batch if entry is not _STOP]
+            if entries:
+                ok = await self._write(loop, entries)
+                self.pending_keys.difference_update(key for _, key, _ in entries)
+                for _, _, written in entries:
+                    if written and not written.done():
+                        written.set_result(ok)
+            if stopping:
+                return
+
+    async def _write(self, loop, entries: List[tuple]) -> bool:
+        payloads = [payload for payload, _, _ in entries]
+        keys = [key for _, key, _ in entries]
+        for attempt in range(self.config["max_retries"] + 1):
+            start = time.monotonic()
+            try:
+                await loop.run_in_executor(None, self.storage.add_payloads, payloads, keys)
+            except Exception as e:
+                print(f"Error saving batch of {len(payloads)} payloads (attempt {attempt + 1}): {e}")
+                if attempt < self.config["max_retries"]:
+                    await asyncio.sleep(0.5 * (2 ** attempt))
+                continue
+            self.latencies.append(time.monotonic() - start)
+            self.written += len(payloads)
+            self.batches += 1
+            return True
+        self.dropped += len(payloads)
+        print(f"Dropped {len(payloads)} payloads after {self.config['max_retries'] + 1} failed writes")
+        return False
+
+    async def close(self):
+        """Write everything still queued, then stop the background task."""
+        if self.task is None:
+            return
+        await self.queue.put(_STOP)
+        await self.task
+        self.task = None
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "mean_batch_size": self.written / self.batches if self.batches else 0.0,
+            "write_latency": {
+                "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+                "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+                "max": latencies[-1] if latencies else 0.0,
+            },
+        }
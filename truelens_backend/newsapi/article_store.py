@@ -0,0 +1,307 @@
+"""
+Append-only, newline-delimited article store
+
+Articles are written as JSON lines in blocks of `block_size` records. Each block is written as
+its own gzip member / zstd frame (or as plain text), and a sidecar index (`<path>.idx`, one JSON
+line per block) records where the block starts in the file, how many articles it holds, its
+date range and its source URIs. Readers use the index to skip whole blocks when filtering by
+date or source, and to seek straight to the block holding a given record, so only one block
+is decompressed and held in memory at a time.
+
+Usage:
+    python article_store.py convert trump_tariff_articles.json trump_tariff_articles.jsonl.gz
+    python article_store.py stats trump_tariff_articles.jsonl.gz
+"""
+import gzip
+import json
+import os
+import sys
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_BLOCK_SIZE = 1000
+
+
+def compression_for_path(path):
+    """
+    Pick the compression from the file extension
+
+    Args:
+        path (str): Store path
+
+    Returns:
+        str: "gzip", "zstd" or None
+    """
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def _compress(data, compression):
+    if compression == "gzip":
+        return gzip.compress(data)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def _decompress(data, compression):
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+class ArticleStoreWriter:
+    """
+    Appends articles to a store, one block at a time
+
+    Args:
+        path (str): Store path; the extension picks the compression (.gz, .zst or none)
+        block_size (int): Articles per block
+    """
+
+    def __init__(self, path, block_size=DEFAULT_BLOCK_SIZE):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.compression = compression_for_path(path)
+        self.block_size = block_size
+        self.buffer = []
+        self.block_dates = []
+        self.block_sources = set()
+
+        # Continue numbering after any existing blocks; a line torn by a crash is dropped first,
+        # or the next line appended would be glued to it and its block lost
+        self.count = sum(block["count"] for block in repair_index(self.index_path))
+        self.file = open(path, "ab")
+        self.index_file = open(self.index_path, "a", encoding="utf-8")
+
+    def write(self, article):
+        """Buffer one article; a full block is written to disk"""
+        self.buffer.append(json.dumps(article, ensure_ascii=False, separators=(",", ":")))
+        date = article.get("dateTime") or article.get("date")
+        if date:
+            self.block_dates.append(date)
+        source_uri = (article.get("source") or {}).get("uri")
+        if source_uri:
+            self.block_sources.add(source_uri)
+        if len(self.buffer) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered articles as one block and record it in the index"""
+        if not self.buffer:
+            return
+        data = _compress(("\n".join(self.buffer) + "\n").encode("utf-8"), self.compression)
+
+        offset = self.file.seek(0, os.SEEK_END)
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        # The index line is only written once the block is on disk
+        block = {
+            "offset": offset,
+            "length": len(data),
+            "first": self.count,
+            "count": len(self.buffer),
+            "date_min": min(self.block_dates) if self.block_dates else None,
+            "date_max": max(self.block_dates) if self.block_dates else None,
+            "sources": sorted(self.block_sources),
+        }
+        self.index_file.write(json.dumps(block) + "\n")
+        self.index_file.flush()
+        os.fsync(self.index_file.fileno())
+
+        self.count += len(self.buffer)
+        self.buffer = []
+        self.block_dates = []
+        self.block_sources = set()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _parse_index_line(line):
+    try:
+        block = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return block if isinstance(block, dict) and "offset" in block and "count" in block else None
+
+
+def read_index(index_path):
+    """
+    Read a store's block index
+
+    Args:
+        index_path (str): Path of the .idx sidecar file
+
+    Returns:
+        list: Block entries, in file order
+    """
+    blocks = []
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                block = _parse_index_line(line)
+                if block is not None:  # Skip lines torn by a crash
+                    blocks.append(block)
+    except FileNotFoundError:
+        pass
+    return blocks
+
+
+def repair_index(index_path):
+    """
+    Drop torn or invalid lines from a store's block index, so lines appended later stay readable
+
+    The blocks those lines described stay in the store file but are no longer referenced.
+
+    Args:
+        index_path (str): Path of the .idx sidecar file
+
+    Returns:
+        list: The valid block entries, in file order
+    """
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+    blocks = [block for block in map(_parse_index_line, lines) if block is not None]
+    if len(blocks) == len(lines) and (not lines or lines[-1].endswith("\n")):
+        return blocks
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(block) + "\n" for block in blocks)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, index_path)
+    return blocks
+
+
+class ArticleStoreReader:
+    """
+    Reads articles back from a store
+
+    Args:
+        path (str): Store path
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.compression = compression_for_path(path)
+        self.blocks = read_index(path + ".idx")
+
+    def __len__(self):
+        return sum(block["count"] for block in self.blocks)
+
+    def _block_lines(self, f, block):
+        f.seek(block["offset"])
+        data = _decompress(f.read(block["length"]), self.compression)
+        return data.decode("utf-8").splitlines()
+
+    def iter_articles(self, date_from=None, date_to=None, sources=None):
+        """
+        Iterate over articles, optionally filtered
+
+        Args:
+            date_from (str): Earliest dateTime/date to include (ISO format, inclusive)
+            date_to (str): Latest dateTime/date to include (ISO format, inclusive)
+            sources (list): Source URIs to include (e.g. "reuters.com")
+
+        Yields:
+            dict: Articles in the order they were written
+        """
+        sources = set(sources) if sources else None
+        with open(self.path, "rb") as f:
+            for block in self.blocks:
+                # Skip whole blocks that cannot contain a match
+                if date_from and block["date_max"] and block["date_max"] < date_from:
+                    continue
+                if date_to and block["date_min"] and block["date_min"][:len(date_to)] > date_to:
+                    continue
+                if sources and not sources.intersection(block["sources"]):
+                    continue
+
+                for line in self._block_lines(f, block):
+                    article = json.loads(line)
+                    date = article.get("dateTime") or article.get("date") or ""
+                    if date_from and date < date_from:
+                        continue
+                    if date_to and date[:len(date_to)] > date_to:
+                        continue
+                    if sources and (article.get("source") or {}).get("uri") not in sources:
+                        continue
+                    yield article
+
+    def get(self, position):
+        """
+        Read the article at a position without decoding the rest of the store
+
+        Args:
+            position (int): Zero-based record number
+
+        Returns:
+            dict: The article
+        """
+        for block in self.blocks:
+            if block["first"] <= position < block["first"] + block["count"]:
+                with open(self.path, "rb") as f:
+                    return json.loads(self._block_lines(f, block)[position - block["first"]])
+        raise IndexError(f"No article at position {position}")
+
+
+def convert_json_to_store(json_path, store_path, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Convert a saved getArticles response (e.g. trump_tariff_articles.json) into a store
+
+    Args:
+        json_path (str): Saved API response with an "articles.results" list
+        store_path (str): Store to append to
+        block_size (int): Articles per block
+
+    Returns:
+        int: Number of articles written
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        articles = json.load(f).get("articles", {}).get("results", [])
+
+    with ArticleStoreWriter(store_path, block_size) as writer:
+        for article in articles:
+            writer.write(article)
+    return len(articles)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "convert":
+        written = convert_json_to_store(sys.argv[2], sys.argv[3])
+        print(f"Wrote {written} articles to {sys.argv[3]}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "stats":
+        reader = ArticleStoreReader(sys.argv[2])
+        print(f"{len(reader)} articles in {len(reader.blocks)} blocks")
+        dates = [date for block in reader.blocks for date in (block["date_min"], block["date_max"]) if date]
+        if dates:
+            print(f"Dates: {min(dates)} .. {max(dates)}")
+    else:
+        print(__doc__)
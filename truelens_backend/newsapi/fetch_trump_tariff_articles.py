@@ -1,49 +1,68 @@
-import requests
+import argparse
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
-def fetch_trump_tariff_articles(api_key, days_back=31):
+import http_session
+from http_session import TokenBucket
+from article_store import ArticleStoreWriter
+
+# EventRegistry article search endpoint
+ARTICLES_URL = "https://eventregistry.org/api/v1/article/getArticles"
+
+# Query spec for Trump's tariffs on China. A query spec holds any getArticles search
+# parameters (see README.md) and overrides the defaults in build_articles_payload.
+TRUMP_TARIFF_QUERY = {
+    "keyword": ["Trump", "tariffs", "China"],  # Individual keywords
+    "keywordOper": "and",  # Require ALL keywords to be present
+    "keywordLoc": "title",  # Search only in the title
+    "conceptUri": [
+        "http://en.wikipedia.org/wiki/Donald_Trump",
+        "http://en.wikipedia.org/wiki/China",
+        "http://en.wikipedia.org/wiki/Tariff"
+    ],
+    "conceptOper": "and",
+    "lang": "eng",
+    "startSourceRankPercentile": 0,  # Start from the top sources
+    "endSourceRankPercentile": 10,   # Only include top 10% sources
+}
+
+def date_range(days_back=31):
     """
-    Fetch articles related to Trump's tariffs on China from EventRegistry API
+    Date range of the last N days, formatted as the API requires
     
     Args:
-        api_key (str): Your EventRegistry API key
         days_back (int): Number of days to look back for articles
         
     Returns:
-        dict: API response with articles
+        tuple: (dateStart, dateEnd) strings
     """
-    # Calculate date range (last N days)
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days_back)
+    return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+
+def build_articles_payload(api_key, query_spec, page=1, days_back=31, dates=None):
+    """
+    Build a getArticles request payload for one page of results
     
-    # Format dates as required by API
-    date_start = start_date.strftime("%Y-%m-%d")
-    date_end = end_date.strftime("%Y-%m-%d")
-    
-    # API endpoint
-    url = "https://eventregistry.org/api/v1/article/getArticles"
-    
-    # Request headers
-    headers = {
-        "Content-Type": "application/json"
-    }
+    Args:
+        api_key (str): Your EventRegistry API key
+        query_spec (dict): Search parameters, merged over the defaults
+        page (int): Results page to request (starting from 1)
+        days_back (int): Number of days to look back for articles
+        dates (tuple): (dateStart, dateEnd) to use instead of the last `days_back` days
+        
+    Returns:
+        dict: Request payload
+    """
+    start_date, end_date = dates or date_range(days_back)
     
     # Request payload
     payload = {
         "action": "getArticles",
-        "keyword": ["Trump", "tariffs", "China"],  # Individual keywords
-        "keywordOper": "and",  # Require ALL keywords to be present
-        "keywordLoc": "title",  # Search only in the title
-        "conceptUri": [
-            "http://en.wikipedia.org/wiki/Donald_Trump",
-            "http://en.wikipedia.org/wiki/China",
-            "http://en.wikipedia.org/wiki/Tariff"
-        ],
-        "conceptOper": "and",
-        "dateStart": date_start,
-        "dateEnd": date_end,
-        "articlesPage": 1,
+        "dateStart": start_date,
+        "dateEnd": end_date,
         "articlesCount": 100,
         "articlesSortBy": "date",
         "articlesSortByAsc": False,
@@ -51,14 +70,34 @@ def fetch_trump_tariff_articles(api_key, days_back=31):
         "resultType": "articles",
         "dataType": ["news", "pr"],
         "forceMaxDataTimeWindow": 31,
-        "lang": "eng",
-        "startSourceRankPercentile": 0,  # Start from the top sources
-        "endSourceRankPercentile": 10,   # Only include top 10% sources
-        "apiKey": api_key
+    }
+    payload.update(query_spec)
+    payload["articlesPage"] = page
+    payload["apiKey"] = api_key
+    return payload
+
+def fetch_articles_page(api_key, query_spec, page=1, days_back=31, dates=None):
+    """
+    Fetch one page of articles matching a query spec
+    
+    Args:
+        api_key (str): Your EventRegistry API key
+        query_spec (dict): Search parameters
+        page (int): Results page to request (starting from 1)
+        days_back (int): Number of days to look back for articles
+        dates (tuple): (dateStart, dateEnd) to use instead of the last `days_back` days
+        
+    Returns:
+        dict: API response with articles, or None if the request failed
+    """
+    # Request headers
+    headers = {
+        "Content-Type": "application/json"
     }
     
     # Make the API request
-    response = requests.post(url, headers=headers, json=payload)
+    payload = build_articles_payload(api_key, query_spec, page, days_back, dates)
+    response = http_session.post(ARTICLES_URL, headers=headers, json=payload)
     
     # Check if request was successful
     if response.status_code == 200:
@@ -68,6 +107,96 @@ def fetch_trump_tariff_articles(api_key, days_back=31):
         print(response.text)
         return None
 
+def fetch_trump_tariff_articles(api_key, days_back=31):
+    """
+    Fetch articles related to Trump's tariffs on China from EventRegistry API
+    
+    Args:
+        api_key (str): Your EventRegistry API key
+        days_back (int): Number of days to look back for articles
+        
+    Returns:
+        dict: API response with articles
+    """
+    return fetch_articles_page(api_key, TRUMP_TARIFF_QUERY, 1, days_back)
+
+def bulk_fetch_articles(api_key, query_spec, output_path, days_back=31, max_pages=None,
+                        concurrency=4, requests_per_second=2.0):
+    """
+    Fetch every results page for a query and stream the articles into an article store
+    
+    The first page tells us how many pages there are; the remaining pages are fetched
+    concurrently within the concurrency and rate limits. Articles are de-duplicated by URI
+    and written as each page arrives, so memory does not grow with the number of pages.
+    
+    Args:
+        api_key (str): Your EventRegistry API key
+        query_spec (dict): Search parameters
+        output_path (str): Article store to append to (.jsonl, .jsonl.gz or .jsonl.zst)
+        days_back (int): Number of days to look back for articles
+        max_pages (int): Stop after this many pages (None for all)
+        concurrency (int): Pages fetched at the same time
+        requests_per_second (float): Request rate limit (0 for unlimited)
+        
+    Returns:
+        dict: Summary with page, article and duplicate counts
+    """
+    limiter = TokenBucket(requests_per_second, max(concurrency, 1)) if requests_per_second > 0 else None
+    
+    # Every page must use the same date range, or page numbers would refer to different result
+    # sets when the fetch runs past midnight
+    dates = date_range(days_back)
+    
+    def fetch_page(page):
+        if limiter:
+            limiter.acquire()
+        try:
+            return fetch_articles_page(api_key, query_spec, page, days_back, dates)
+        except Exception as e:
+            print(f"Page {page} failed: {e}")
+            return None
+    
+    summary = {"pages": 0, "fetched_pages": 0, "failed_pages": [], "articles": 0, "duplicates": 0}
+    seen_uris = set()
+    
+    with ArticleStoreWriter(output_path) as out:
+        def write_page(data):
+            for article in data.get("articles", {}).get("results", []):
+                uri = article.get("uri")
+                if uri in seen_uris:
+                    summary["duplicates"] += 1
+                    continue
+                seen_uris.add(uri)
+                out.write(article)
+                summary["articles"] += 1
+            summary["fetched_pages"] += 1
+        
+        # The first page tells us how many pages there are
+        first = fetch_page(1)
+        if not first:
+            summary["failed_pages"].append(1)
+            return summary
+        total_pages = first.get("articles", {}).get("pages", 1)
+        if max_pages:
+            total_pages = min(total_pages, max_pages)
+        summary["pages"] = total_pages
+        write_page(first)
+        del first
+        print(f"Page 1/{total_pages} fetched")
+        
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            futures = {executor.submit(fetch_page, page): page for page in range(2, total_pages + 1)}
+            for future in as_completed(futures):
+                page = futures[future]
+                data = future.result()
+                if not data:
+                    summary["failed_pages"].append(page)
+                    continue
+                write_page(data)
+                print(f"Page {page}/{total_pages} fetched")
+    
+    return summary
+
 def save_articles_to_file(articles, filename="trump_tariff_articles.json"):
     """
     Save articles to a JSON file
@@ -105,19 +234,45 @@ def display_article_summaries(articles_data):
         print()
 
 if __name__ == "__main__":
-    # Use the provided API key
-    API_KEY = "b379ca7a-9d5c-45ab-8f5a-e561c7f06597"
+    parser = argparse.ArgumentParser(description="Fetch articles from EventRegistry")
+    parser.add_argument("--bulk", action="store_true", help="Fetch every results page into an article store")
+    parser.add_argument("--query", help="JSON file with a query spec (default: Trump's tariffs on China)")
+    parser.add_argument("--output", default="articles.jsonl.gz", help="Article store for --bulk (.jsonl, .jsonl.gz or .jsonl.zst)")
+    parser.add_argument("--days-back", type=int, default=31)
+    parser.add_argument("--max-pages", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=2.0, help="Requests per second for --bulk")
+    args = parser.parse_args()
     
-    print("Fetching articles about Trump's tariffs on China from top 10% sources...")
-    articles_data = fetch_trump_tariff_articles(API_KEY)
+    # Use the provided API key
+    API_KEY = os.environ.get("EVENT_REGISTRY_API_KEY", "b379ca7a-9d5c-45ab-8f5a-e561c7f06597")
     
-    if articles_data:
-        # Display article summaries
-        display_article_summaries(articles_data)
-        
-        # Save complete results to file
-        save_articles_to_file(articles_data)
+    if args.bulk:
+        query_spec = TRUMP_TARIFF_QUERY
+        if args.query:
+            with open(args.query, "r", encoding="utf-8") as f:
+                query_spec = json.load(f)
         
-        print("\nTo use a different API key or customize search parameters, edit this script.")
+        print(f"Bulk fetching articles into {args.output}...")
+        summary = bulk_fetch_articles(
+            API_KEY, query_spec, args.output,
+            days_back=args.days_back, max_pages=args.max_pages,
+            concurrency=args.concurrency, requests_per_second=args.rate
+        )
+        print(f"Done: {summary}")
     else:
-        print("Failed to fetch articles. Please check your API key and try again.") 
\ No newline at end of file
+        print("Fetching articles about Trump's tariffs on China from top 10% sources...")
+        articles_data = fetch_trump_tariff_articles(API_KEY, days_back=args.days_back)
+        
+        if articles_data:
+            # Display article summaries
+            display_article_summaries(articles_data)
+            
+            # Save complete results to file
+            save_articles_to_file(articles_data)
+            
+            print("\nTo use a different API key or customize search parameters, edit this script.")
+        else:
+            print("Failed to fetch articles. Please check your API key and try again.")
+    
+    print(f"HTTP latency by endpoint: {http_session.latency_stats()}")
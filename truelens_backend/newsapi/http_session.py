@@ -0,0 +1,265 @@
+"""
+Pooled, retrying HTTP session and rate limiter for the EventRegistry scripts
+
+All requests go through one `requests.Session`, so connections are kept alive between pages,
+with gzip (and brotli, when the `brotli` package is installed) response compression, separate
+connect/read timeouts and retries with jittered exponential backoff on connection errors,
+timeouts, 429 and 5xx responses. Per-endpoint latency histograms are kept in memory.
+
+This module is a deliberate copy of the NEAR AI agent's `nearai/http_client.py` (without its
+tracing spans) plus the `TokenBucket` of `nearai/concurrency.py`. The agent is uploaded as the
+nearai directory alone, so the two projects cannot import a shared module. Keep the copies in
+step: the same HTTP_* settings, retry policy, histogram buckets and `latency_stats()` format.
+"""
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import brotli  # noqa: F401  (lets urllib3 decode "br" responses)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+DEFAULT_HTTP_CONFIG = {
+    "connect_timeout": 5.0,
+    "read_timeout": 60.0,
+    "max_retries": 3,
+    "backoff_base": 0.5,     # Seconds; attempt n waits up to base * 2**n
+    "backoff_max": 30.0,
+    "pool_size": 20,         # Connections kept per host
+}
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def http_config_from_env(env_vars):
+    """
+    Build the HTTP config from defaults plus HTTP_* env var overrides
+
+    Args:
+        env_vars (dict): Environment variables
+
+    Returns:
+        dict: Config with the keys of DEFAULT_HTTP_CONFIG
+    """
+    config = dict(DEFAULT_HTTP_CONFIG)
+    for key, default in DEFAULT_HTTP_CONFIG.items():
+        raw = env_vars.get(f"HTTP_{key.upper()}")
+        if raw is None:
+            continue
+        try:
+            config[key] = type(default)(raw)
+        except ValueError:
+            pass
+    return config
+
+
+_config = http_config_from_env(os.environ)
+
+
+def configure(config):
+    """
+    Apply a new config; the pooled session is rebuilt if the pool size changed
+
+    Args:
+        config (dict): Config with the keys of DEFAULT_HTTP_CONFIG
+    """
+    global _session
+    with _session_lock:
+        if _session is not None and config["pool_size"] != _config["pool_size"]:
+            _session.close()
+            _session = None
+        _config.update(config)
+
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=_config["pool_size"], pool_maxsize=_config["pool_size"])
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            _session = session
+        return _session
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram for one endpoint"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+
+    def observe(self, seconds, error=False):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, q):
+        """Approximate quantile: the upper bound of the bucket holding it"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.buckets)),
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def endpoint_key(method, url):
+    """Histogram key: method, host and path, without the query string (which holds API keys)"""
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.netloc}{parts.path}"
+
+
+def _observe(key, seconds, error):
+    with _histograms_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = LatencyHistogram()
+        histogram.observe(seconds, error)
+
+
+def latency_stats():
+    """
+    Snapshot of the per-endpoint latency histograms
+
+    Returns:
+        dict: {endpoint: {"count", "errors", "mean", "p50", "p95", "buckets"}}
+    """
+    with _histograms_lock:
+        return {key: histogram.snapshot() for key, histogram in _histograms.items()}
+
+
+def _backoff_delay(attempt, response):
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        return min(float(response.headers["Retry-After"]), _config["backoff_max"])
+    # "Full jitter": a random wait between 0 and the exponential cap
+    return random.uniform(0, min(_config["backoff_max"], _config["backoff_base"] * (2 ** attempt)))
+
+
+def request(method, url, max_retries=None, **kwargs):
+    """
+    Send a request over the pooled session, retrying transient failures
+
+    Args:
+        method (str): HTTP method
+        url (str): Request URL
+        max_retries (int): Retries for this request, defaults to HTTP_MAX_RETRIES
+        **kwargs: Keyword arguments of `requests.request`
+
+    Returns:
+        requests.Response: The final response, which may still carry an error status once
+        retries are exhausted; the last connection or timeout error is raised
+    """
+    kwargs.setdefault("timeout", (_config["connect_timeout"], _config["read_timeout"]))
+    retries = _config["max_retries"] if max_retries is None else max_retries
+    key = endpoint_key(method, url)
+    session = get_session()
+
+    for attempt in range(retries + 1):
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            _observe(key, time.monotonic() - start, error=True)
+            if attempt >= retries:
+                raise
+            time.sleep(_backoff_delay(attempt, None))
+            continue
+
+        _observe(key, time.monotonic() - start, error=response.status_code >= 400)
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+            return response
+        delay = _backoff_delay(attempt, response)
+        response.close()
+        time.sleep(delay)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket; `acquire` blocks until a token is available
+
+    Args:
+        rate_per_sec (float): Tokens added per second
+        capacity (float): Largest burst
+    """
+
+    def __init__(self, rate_per_sec, capacity):
+        self.rate = rate_per_sec
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1.0):
+        """Take tokens if available; returns 0 on success, otherwise the seconds to wait"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1.0):
+        """Block until `tokens` can be taken from the bucket"""
+        if self.rate <= 0:
+            return
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay <= 0:
+                return
+            time.sleep(delay)